@@ -1,279 +1,372 @@
-import customtkinter as ctk
-from config import DATA_FILE, PLACEHOLDER_COLOR, get_default_font
-from ui_components import create_note_popup, toggle_collapse, make_draggable,delete_note_safe
-from notes_manager import NotesManager
-from ui_components import create_note_popup, toggle_collapse
-from pdf_utils import open_pdf
-from PIL import Image, ImageTk  # For search icon
-
-class WorkNotesApp(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-        self.title("Interactive Work Notes")
-        self.geometry("1000x650")
-
-        # Create font AFTER root exists
-        self.default_font = get_default_font()
-
-        self.notes_manager = NotesManager(DATA_FILE)
-        self.drag_data = {"widget": None, "y": 0, "note_id": None}
-
-        saved_theme = self.notes_manager.load_theme()
-        ctk.set_appearance_mode(saved_theme)
-
-        self.setup_ui()
-        self.render_notes()
-
-    def setup_ui(self):
-        self.sidebar = ctk.CTkFrame(self, width=220)
-        self.sidebar.pack(side="left", fill="y", padx=10, pady=10)
-
-        self.main_frame = ctk.CTkFrame(self)
-        self.main_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
-
-        # ---------- Search Bar with Icon in Frame ----------
-        self.search_var = ctk.StringVar()
-
-        search_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        search_frame.pack(pady=10, padx=10, fill="x")
-
-        # ---------- Load Magnifying Glass Images ----------
-        from PIL import Image
-        from customtkinter import CTkImage
-
-        search_icon_light = Image.open("icons/magnifying_glass.png").resize((20, 20), Image.Resampling.LANCZOS)
-        search_icon_light_ctk = CTkImage(light_image=search_icon_light, dark_image=search_icon_light, size=(20, 20))
-
-        search_icon_dark = Image.open("icons/magnifying_glassDARKMODE.png").resize((20, 20), Image.Resampling.LANCZOS)
-        search_icon_dark_ctk = CTkImage(light_image=search_icon_dark, dark_image=search_icon_dark, size=(20, 20))
-
-        icon_label = ctk.CTkLabel(search_frame, image=search_icon_light_ctk, text="")
-        icon_label.pack(side="left", padx=(0, 5))
-
-        self.search_entry = ctk.CTkEntry(
-            search_frame,
-            textvariable=self.search_var,
-            placeholder_text="Search notes... e.g., Project A",
-            placeholder_text_color=PLACEHOLDER_COLOR,
-            font=self.default_font
-        )
-        self.search_entry.pack(side="left", fill="x", expand=True)
-        self.search_entry.bind("<KeyRelease>", lambda e: self.render_notes())
-
-        # ---------- Add Section / Add Note Buttons ----------
-        self.add_section_btn = ctk.CTkButton(
-            self.sidebar,
-            text="Add Section",
-            font=self.default_font,
-            command=lambda: create_note_popup(self, self.notes_manager, self.default_font)
-        )
-        self.add_section_btn.pack(pady=(5, 5), padx=10, fill="x")
-
-        self.add_note_btn = ctk.CTkButton(
-            self.sidebar,
-            text="Add Note",
-            font=self.default_font,
-            command=lambda: create_note_popup(self, self.notes_manager, self.default_font)
-        )
-        self.add_note_btn.pack(pady=(0, 15), padx=10, fill="x")
-
-        # ---------- Scrollable Frame for Main Content ----------
-        self.scroll_frame = ctk.CTkScrollableFrame(self.main_frame)
-        self.scroll_frame.pack(fill="both", expand=True)
-
-        # ---------- Theme Toggle (Light/Dark) ----------
-        bottom_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        bottom_frame.pack(side="bottom", fill="x", pady=10, padx=10)
-
-        # Load saved theme from notes_manager
-        saved_theme = self.notes_manager.load_theme()
-        ctk.set_appearance_mode(saved_theme)
-        initial_text = "Dark Mode" if saved_theme == "Dark" else "Light Mode"
-
-        theme_var = ctk.StringVar(value=saved_theme)
-
-        def toggle_theme():
-            if theme_var.get() == "Dark":
-                ctk.set_appearance_mode("Dark")
-                icon_label.configure(image=search_icon_dark_ctk)
-                theme_switch.configure(text="Dark Mode")
-                self.notes_manager.save_theme("Dark")
-            else:
-                ctk.set_appearance_mode("Light")
-                icon_label.configure(image=search_icon_light_ctk)
-                theme_switch.configure(text="Light Mode")
-                self.notes_manager.save_theme("Light")
-
-        theme_switch = ctk.CTkSwitch(
-            bottom_frame,
-            text=initial_text,
-            variable=theme_var,
-            onvalue="Dark",
-            offvalue="Light",
-            command=toggle_theme,
-            font=self.default_font
-        )
-        theme_switch.pack(fill="x")
-
-        # Keep references to prevent garbage collection
-        self.search_icon_light_ctk = search_icon_light_ctk
-        self.search_icon_dark_ctk = search_icon_dark_ctk
-
-    def render_notes(self):
-        # Clear the scroll area first
-        for widget in self.scroll_frame.winfo_children():
-            widget.destroy()
-
-        # Sort notes: sections first, then children under them
-        for note in self.notes_manager.notes:
-            if not note.get("parent_section_id"):
-                self.render_section(note)
-
-    def render_section(self, sec):
-        frame = ctk.CTkFrame(self.scroll_frame, corner_radius=5)
-        frame.pack(fill="x", pady=(5, 2), padx=10)
-
-        # Section header
-        arrow_text = "▼" if not sec.get("collapsed", False) else "▶"
-        collapse_btn = ctk.CTkButton(
-            frame,
-            text=arrow_text,
-            width=30,
-            command=lambda s=sec: self.toggle_section_dropdown(s),
-            font=self.default_font
-        )
-        collapse_btn.pack(side="left", padx=(5, 2))
-
-        sec_label = ctk.CTkLabel(frame, text=sec["text"], font=self.default_font)
-        sec_label.pack(side="left", padx=5, pady=5)
-
-        # Make draggable
-        make_draggable(frame, sec["id"], self, is_section=True)
-
-        # If expanded, render buttons and children
-        if not sec.get("collapsed", False):
-            btn_frame = ctk.CTkFrame(frame)
-            btn_frame.pack(side="right", padx=5)
-
-            add_btn = ctk.CTkButton(
-                btn_frame,
-                text="+ Note",
-                font=self.default_font,
-                width=70,
-                command=lambda s=sec: create_note_popup(self, self.notes_manager, self.default_font, parent_id=s["id"])
-            )
-            edit_btn = ctk.CTkButton(
-                btn_frame,
-                text="Edit",
-                font=self.default_font,
-                width=50,
-                command=lambda s=sec: create_note_popup(self, self.notes_manager, self.default_font, note_to_edit=s)
-            )
-            del_btn = ctk.CTkButton(
-                btn_frame,
-                text="Del",
-                font=self.default_font,
-                width=50,
-                command=lambda n=sec: delete_note_safe(n, self)
-            )
-
-            for btn in [add_btn, edit_btn, del_btn]:
-                btn.pack(side="left", padx=2)
-
-            # Render children notes
-            children = [n for n in self.notes_manager.notes if n.get("parent_section_id") == sec["id"]]
-            for note in children:
-                self.render_note(note, indent=30, app=self)
-
-    def render_note(self, note, indent=0, app=None):
-        frame = ctk.CTkFrame(self.scroll_frame, corner_radius=5)
-        frame.pack(fill="x", pady=(2, 2), padx=(indent + 10, 10))
-
-        text_label = ctk.CTkLabel(
-            frame,
-            text=note["text"],
-            font=self.default_font,
-            wraplength=500,
-            justify="left",
-        )
-        text_label.pack(side="left", padx=5, pady=5)
-
-        # PDF hyperlink
-        if note.get("pdf_path"):
-            pdf_btn = ctk.CTkButton(
-                frame,
-                text="Open PDF",
-                font=self.default_font,
-                command=lambda path=note["pdf_path"]: open_pdf(path),
-            )
-            pdf_btn.pack(side="right", padx=5)
-
-        # Control buttons
-        btn_frame = ctk.CTkFrame(frame)
-        btn_frame.pack(side="right", padx=5)
-
-        edit_btn = ctk.CTkButton(
-            btn_frame,
-            text="Edit",
-            font=self.default_font,
-            width=50,
-            command=lambda n=note: create_note_popup(app, app.notes_manager, app.default_font, note_to_edit=n),
-        )
-
-        del_btn = ctk.CTkButton(
-            btn_frame,
-            text="Del",
-            font=self.default_font,
-            width=50,
-            command=lambda n=note: delete_note_safe(n, app)
-        )
-
-        for btn in [edit_btn, del_btn]:
-            btn.pack(side="left", padx=2)
-
-        # Make draggable
-        make_draggable(frame, note["id"], app, is_section=False)
-
-    def toggle_section_dropdown(self, sec):
-        # Toggle collapsed state
-        sec["collapsed"] = not sec.get("collapsed", True)
-        self.notes_manager.save_notes()
-        self.render_notes()
-
-        if not sec.get("collapsed"):
-            # Add contextual buttons inside section frame
-            frame_widgets = self.scroll_frame.winfo_children()
-            for frame in frame_widgets:
-                label = frame.winfo_children()[0]  # first child = label
-                if label.cget("text") == sec["text"]:
-                    # Add buttons only for this section
-                    add_btn = ctk.CTkButton(
-                        frame,
-                        text="+ Note",
-                        font=self.default_font,
-                        command=lambda s=sec: create_note_popup(self, self.notes_manager, self.default_font,
-                                                                parent_id=s["id"])
-                    )
-                    edit_btn = ctk.CTkButton(
-                        frame,
-                        text="Edit",
-                        font=self.default_font,
-                        command=lambda s=sec: create_note_popup(self, self.notes_manager, self.default_font,
-                                                                note_to_edit=s)
-                    )
-                    del_btn = ctk.CTkButton(
-                        frame,
-                        text="Delete",
-                        font=self.default_font,
-                        command=lambda s=sec: self.delete_section(s)
-                    )
-                    # Pack buttons to the right
-                    for btn in [del_btn, edit_btn, add_btn]:
-                        btn.pack(side="right", padx=3)
-
-    def delete_section(self, sec):
-        self.notes_manager.delete_note(sec["id"])
-        self.render_notes()
-if __name__ == "__main__":
-    app = WorkNotesApp()
-    app.mainloop()
+import os
+import sys
+import tkinter
+
+import customtkinter as ctk
+from customtkinter import CTkImage
+from config import (DATA_FILE, STORAGE_BACKEND, WRITE_DELAY, WATCH_INTERVAL, UNDO_BUDGET, PERF_OUTPUT,
+                    PLACEHOLDER_COLOR, COLOR_THEME, ICON_DIR, get_default_font)
+from ui_components import create_note_popup
+from notes_manager import NotesManager
+from storage import open_storage
+from settings import Settings, settings_path_for
+from pdf_index import PdfIndex, pdf_cache_path_for
+from thumbnails import ThumbnailCache, thumb_cache_dir_for
+from attachments import AttachmentStore, attachments_dir_for
+from virtual_list import VirtualNoteList
+from search_pipeline import SearchPipeline
+from watcher import ChangeWatcher
+from assets import load_icon
+from perf import FrameMonitor, output_modes, timed
+
+APP_TITLE = "Interactive Work Notes"
+
+class WorkNotesApp(ctk.CTk):
+    def __init__(self, data_file=DATA_FILE):
+        ctk.set_default_color_theme(COLOR_THEME)
+        super().__init__()
+        self.title(APP_TITLE)
+
+        # Create font AFTER root exists
+        self.default_font = get_default_font()
+
+        # Attached PDFs are read in worker processes and searched alongside the notes
+        self.pdf_index = PdfIndex(pdf_cache_path_for(data_file))
+        self.notes_manager = NotesManager(data_file, storage=open_storage(STORAGE_BACKEND, data_file),
+                                          write_delay=WRITE_DELAY, lazy=True, pdf_index=self.pdf_index,
+                                          undo_budget=UNDO_BUDGET)
+        # Preferences are read once here; themes etc. used to live in the notes file
+        self.settings = Settings(settings_path_for(data_file), legacy=self.notes_manager.legacy_settings)
+        self.settings.apply_collapsed(self.notes_manager, prune=not self.notes_manager.loading)
+        self.geometry(self.settings["geometry"])
+        self.settings_job = None   # pending write of collapse states
+        self.drag_data = {"widget": None, "y": 0, "note_id": None}
+        self.search_matches = None   # note ids of the current search, None = no filter
+        self.write_error = None      # failed background write shown in the title
+        self.search_pipeline = SearchPipeline(self, self.notes_manager.match_ids, self.apply_search_results)
+        self.thumbnails = ThumbnailCache(self, thumb_cache_dir_for(data_file))
+        self.attachments = AttachmentStore(attachments_dir_for(data_file))
+
+        ctk.set_appearance_mode(self.settings["theme"])
+
+        self.setup_ui()
+        # Per-frame cost of the hot paths, when asked for (see perf.py)
+        modes = output_modes(PERF_OUTPUT)
+        self.frame_monitor = FrameMonitor(self, modes) if modes else None
+        self.render_notes()
+        if self.settings["last_search"]:
+            self.search_var.set(self.settings["last_search"])
+            self.search_pipeline.submit(self.search_var.get())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.bind("<Control-z>", self.undo)
+        self.bind("<Control-y>", self.redo)
+        self.bind("<Control-Z>", self.redo)   # Ctrl+Shift+Z
+        # PDFs may have been edited while we were in the background
+        self.bind("<FocusIn>", lambda e: self.pdf_index.refresh() if e.widget is self else None)
+        # Icons and the theme switch can wait until the first frame is on screen
+        self.after_idle(lambda: self.after(0, self.setup_chrome))
+        if self.notes_manager.loading:
+            # First screen is up; read the rest of the notebook between events
+            self.after(1, self.load_next_chunk)
+        # Another window may be editing the same notes
+        self.watcher = ChangeWatcher(self.notes_manager.watch_paths(), WATCH_INTERVAL)
+        self.after(int(WATCH_INTERVAL * 1000), self.check_external)
+
+    def load_next_chunk(self):
+        done = self.notes_manager.load_more()
+        self.settings.apply_collapsed(self.notes_manager, prune=done)
+        if done:
+            self.settings.adopt_legacy(self.notes_manager.legacy_settings)
+        else:
+            self.after(1, self.load_next_chunk)
+        self.render_notes()
+
+    def setup_ui(self):
+        self.sidebar = ctk.CTkFrame(self, width=220)
+        self.sidebar.pack(side="left", fill="y", padx=10, pady=10)
+
+        self.main_frame = ctk.CTkFrame(self)
+        self.main_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
+
+        # ---------- Search Bar with Icon in Frame ----------
+        self.search_var = ctk.StringVar()
+
+        self.search_frame = search_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
+        search_frame.pack(pady=10, padx=10, fill="x")
+
+        self.search_entry = ctk.CTkEntry(
+            search_frame,
+            textvariable=self.search_var,
+            placeholder_text="Search notes... e.g., Project A",
+            placeholder_text_color=PLACEHOLDER_COLOR,
+            font=self.default_font
+        )
+        self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_entry.bind("<KeyRelease>", lambda e: self.search_pipeline.submit(self.search_var.get()))
+
+        # ---------- Add Section / Add Note Buttons ----------
+        self.add_section_btn = ctk.CTkButton(
+            self.sidebar,
+            text="Add Section",
+            font=self.default_font,
+            command=lambda: create_note_popup(self, self.notes_manager, self.default_font)
+        )
+        self.add_section_btn.pack(pady=(5, 5), padx=10, fill="x")
+
+        self.add_note_btn = ctk.CTkButton(
+            self.sidebar,
+            text="Add Note",
+            font=self.default_font,
+            command=lambda: create_note_popup(self, self.notes_manager, self.default_font)
+        )
+        self.add_note_btn.pack(pady=(0, 15), padx=10, fill="x")
+
+        # ---------- Virtualized List for Main Content ----------
+        self.note_list = VirtualNoteList(self.main_frame, self)
+        self.note_list.pack(fill="both", expand=True)
+
+    def setup_chrome(self):
+        # ---------- Load Magnifying Glass Images ----------
+        # Pre-scaled copies come from the icon cache
+        search_icon_light = load_icon(os.path.join(ICON_DIR, "magnifying_glass.png"), (20, 20))
+        search_icon_light_ctk = CTkImage(light_image=search_icon_light, dark_image=search_icon_light, size=(20, 20))
+
+        search_icon_dark = load_icon(os.path.join(ICON_DIR, "magnifying_glassDARKMODE.png"), (20, 20))
+        search_icon_dark_ctk = CTkImage(light_image=search_icon_dark, dark_image=search_icon_dark, size=(20, 20))
+
+        icon_label = ctk.CTkLabel(self.search_frame, image=search_icon_light_ctk, text="")
+        icon_label.pack(side="left", padx=(0, 5), before=self.search_entry)
+
+        # ---------- Theme Toggle (Light/Dark) ----------
+        bottom_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
+        bottom_frame.pack(side="bottom", fill="x", pady=10, padx=10)
+
+        saved_theme = self.settings["theme"]
+        if saved_theme == "Dark":
+            icon_label.configure(image=search_icon_dark_ctk)
+        initial_text = "Dark Mode" if saved_theme == "Dark" else "Light Mode"
+
+        theme_var = ctk.StringVar(value=saved_theme)
+
+        def toggle_theme():
+            if theme_var.get() == "Dark":
+                ctk.set_appearance_mode("Dark")
+                icon_label.configure(image=search_icon_dark_ctk)
+                theme_switch.configure(text="Dark Mode")
+                self.settings.set("theme", "Dark")
+            else:
+                ctk.set_appearance_mode("Light")
+                icon_label.configure(image=search_icon_light_ctk)
+                theme_switch.configure(text="Light Mode")
+                self.settings.set("theme", "Light")
+
+        theme_switch = ctk.CTkSwitch(
+            bottom_frame,
+            text=initial_text,
+            variable=theme_var,
+            onvalue="Dark",
+            offvalue="Light",
+            command=toggle_theme,
+            font=self.default_font
+        )
+        theme_switch.pack(fill="x")
+
+        # Keep references to prevent garbage collection
+        self.search_icon_light_ctk = search_icon_light_ctk
+        self.search_icon_dark_ctk = search_icon_dark_ctk
+
+    @timed("render")
+    def render_notes(self):
+        # Only the rows in view get widgets; the list recycles them as it scrolls
+        self.note_list.set_rows(self.visible_rows())
+        if self.search_matches is not None:
+            # Notes changed under an active search; refresh the hits in the background
+            self.search_pipeline.submit(self.search_var.get())
+
+    def apply_search_results(self, query, note_ids):
+        self.search_matches = None if note_ids is None else set(note_ids)
+        self.note_list.set_rows(self.visible_rows())
+
+    def visible_rows(self):
+        # Sections first, then children under expanded ones
+        manager = self.notes_manager
+        matches = self.search_matches
+
+        rows = []
+        for note in manager.get_children(None):
+            if matches is not None:
+                # While searching, show hits (and the sections holding them) regardless of collapse
+                children = [n for n in manager.get_children(note.id) if n.id in matches]
+                if note.id not in matches and not children:
+                    continue
+            elif not note.collapsed:
+                children = manager.get_children(note.id)
+            else:
+                children = []
+            rows.append((note, 0))
+            rows.extend((child, 30) for child in children)
+        return rows
+
+    @timed("toggle")
+    def toggle_section_dropdown(self, sec):
+        # Collapse state is a view preference: it goes to settings, not the notes file
+        sec.collapsed = not sec.collapsed
+        self.settings.set_collapsed(sec.id, sec.collapsed, save=False)
+        if self.settings_job is None:
+            self.settings_job = self.after(int(WRITE_DELAY * 1000), self.save_settings)
+        rows = self.note_list.rows
+        i = self.find_row(sec)
+        if self.search_matches is not None or i == len(rows) or rows[i][0] is not sec:
+            # Search results ignore collapse (only the arrow changes); a row not in view needs nothing
+            self.note_list.refresh()
+            return
+        # Only this section's child rows come or go; their widgets stay in the list's pool
+        if sec.collapsed:
+            count = 0
+            while i + 1 + count < len(rows) and rows[i + 1 + count][1]:
+                count += 1
+            self.note_list.splice_rows(i + 1, count, [])
+        else:
+            children = [(child, 30) for child in self.notes_manager.get_children(sec.id)]
+            self.note_list.splice_rows(i + 1, 0, children)
+
+    def save_settings(self):
+        self.settings_job = None
+        self.settings.save()
+
+    # ---------- Undo / Redo ----------
+    def undo(self, event=None):
+        return self.step_history(event, self.notes_manager.history.undo_ops(), self.notes_manager.undo)
+
+    def redo(self, event=None):
+        return self.step_history(event, self.notes_manager.history.redo_ops(), self.notes_manager.redo)
+
+    def step_history(self, event, ops, step):
+        if event is not None and isinstance(event.widget, (tkinter.Entry, tkinter.Text)):
+            return None   # text fields keep their own Ctrl+Z
+        if ops is not None:
+            self.patch_rows(ops, step)
+        return "break"
+
+    # ---------- Other Windows ----------
+    def check_external(self):
+        if self.watcher.changed.is_set() and not self.notes_manager.loading:
+            self.watcher.changed.clear()
+            self.merge_external()
+        self.show_write_error()
+        self.after(int(WATCH_INTERVAL * 1000), self.check_external)
+
+    def show_write_error(self):
+        # The writer keeps the changes and retries; until it succeeds, say so in the title
+        error = self.notes_manager.write_error
+        if error is self.write_error:
+            return
+        self.write_error = error
+        if error is None:
+            self.title(APP_TITLE)
+        else:
+            print(f"Notes could not be saved: {error!r}", file=sys.stderr)
+            self.title(f"{APP_TITLE} - NOT SAVED: {error}")
+
+    def merge_external(self):
+        manager = self.notes_manager
+        ops, token = manager.external_changes()
+        if not ops:
+            manager.merge(ops, token)
+            return
+        self.patch_rows(ops, lambda: manager.merge(ops, token))
+
+    # ---------- Row Patching ----------
+    @timed("patch")
+    def patch_rows(self, ops, step):
+        # Run `step` (which applies `ops`) and redo only the rows of the notes the records touch
+        if self.search_matches is not None:
+            step()
+            self.render_notes()
+            return
+        touched = [op["note"]["id"] if op["op"] == "add" else op.get("id") for op in ops]
+        for note_id in touched:
+            note = self.notes_manager.get_note(note_id)
+            if note is not None:
+                self.drop_rows(note)
+        step()
+        for note_id in touched:
+            note = self.notes_manager.get_note(note_id)
+            if note is not None:
+                self.show_rows(note)
+
+    def row_key(self, note):
+        # visible_rows() order: sections by key, each followed by its children by key
+        if note.parent is None:
+            return note.order, ""
+        return self.notes_manager.by_id[note.parent].order, note.order
+
+    def find_row(self, note):
+        # Binary search of the list rows; returns the row of `note` or where it would go
+        rows = self.note_list.rows
+        key = self.row_key(note)
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.row_key(rows[mid][0]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < len(rows) and rows[lo][0] is not note and self.row_key(rows[lo][0]) == key:
+            lo += 1
+        return lo
+
+    def drop_rows(self, note):
+        rows = self.note_list.rows
+        i = self.find_row(note)
+        if i == len(rows) or rows[i][0] is not note:
+            return
+        count = 1
+        if rows[i][1] == 0:
+            # A top-level row takes its children's rows with it
+            while i + count < len(rows) and rows[i + count][1]:
+                count += 1
+        self.note_list.splice_rows(i, count, [])
+
+    def show_rows(self, note):
+        rows = self.note_list.rows
+        if note.parent is None:
+            new = [(note, 0)]
+            if not note.collapsed:
+                new.extend((child, 30) for child in self.notes_manager.get_children(note.id))
+        else:
+            parent = self.notes_manager.get_note(note.parent)
+            if parent is None or parent.parent is not None or parent.collapsed:
+                return
+            j = self.find_row(parent)
+            if j == len(rows) or rows[j][0] is not parent:
+                return   # the section comes back later in this step, children included
+            new = [(note, 30)]
+        i = self.find_row(note)
+        if i < len(rows) and rows[i][0] is note:
+            return
+        self.note_list.splice_rows(i, 0, new)
+
+    def on_close(self):
+        if self.settings_job is not None:
+            self.after_cancel(self.settings_job)
+        # Also writes collapse states still waiting for save_settings
+        self.settings.update(geometry=self.geometry(), last_search=self.search_var.get())
+        self.watcher.stop()
+        if self.frame_monitor is not None:
+            self.frame_monitor.close()
+        self.search_pipeline.shutdown()
+        self.thumbnails.shutdown()
+        self.attachments.close()
+        # Only a fully loaded notebook knows every attachment still in use; the merge brings in
+        # what other windows attached (and blobs still in an open popup are within the grace period)
+        if not self.notes_manager.loading:
+            with self.notes_manager.synced():
+                self.attachments.collect_garbage(self.notes_manager.notes)
+        self.notes_manager.close()
+        self.destroy()
+
+
+if __name__ == "__main__":
+    app = WorkNotesApp()
+    app.mainloop()
@@ -0,0 +1,45 @@
+import os
+
+from PIL import Image
+from config import ICON_CACHE_DIR
+
+
+def cached_icon_path(source, size):
+    # Keyed by the source's mtime and byte size, so an edited icon gets a fresh copy
+    stat = os.stat(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(ICON_CACHE_DIR, f"{name}_{size[0]}x{size[1]}_{stat.st_mtime_ns}_{stat.st_size}.png")
+
+
+def load_icon(source, size):
+    """
+    The icon at `source` scaled to `size` (a PIL image).
+    The resize runs once; later starts read the scaled copy from ICON_CACHE_DIR.
+    """
+    cached = cached_icon_path(source, size)
+    if os.path.exists(cached):
+        try:
+            image = Image.open(cached)
+            image.load()
+            return image
+        except OSError:
+            pass   # damaged cache entry, rebuild it
+
+    image = Image.open(source).resize(size, Image.Resampling.LANCZOS)
+    try:
+        os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+        tmp_path = cached + ".tmp"
+        image.save(tmp_path, "PNG")
+        os.replace(tmp_path, cached)
+        drop_stale_icons(cached)
+    except OSError:
+        pass   # read-only data dir: still works, just without the cache
+    return image
+
+
+def drop_stale_icons(current):
+    # Older copies of the same icon at the same size
+    prefix = os.path.basename(current).rsplit("_", 2)[0] + "_"
+    for name in os.listdir(ICON_CACHE_DIR):
+        if name.startswith(prefix) and name != os.path.basename(current):
+            os.remove(os.path.join(ICON_CACHE_DIR, name))
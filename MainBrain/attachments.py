@@ -0,0 +1,99 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_CHUNK = 8 * 1024 * 1024   # bytes hashed per step of a large file
+GC_GRACE = 24 * 3600           # seconds an unreferenced blob is kept (another window may be attaching it)
+
+
+def attachments_dir_for(data_file):
+    # One folder per notebook: collect_garbage only knows the notes of its own
+    stem = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(os.path.dirname(data_file), "attachments", stem)
+
+
+def hash_file(path):
+    """SHA-256 of the file, read through mmap a chunk at a time."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()   # mmap refuses empty files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, HASH_CHUNK):
+                digest.update(mapped[start:start + HASH_CHUNK])
+    return digest.hexdigest()
+
+
+class AttachmentStore:
+    """
+    Attached files, copied into `root` and named by their content hash
+    (root/ab/abcdef....pdf). Attaching the same file to many notes stores it once,
+    and moving or deleting the original doesn't break the notes.
+    Blobs no note points at are removed by collect_garbage().
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.executor = None
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest + ext.lower())
+
+    def add(self, path):
+        """Copy `path` into the store (unless identical content is already there); returns the blob path."""
+        digest = hash_file(path)
+        blob = self.blob_path(digest, os.path.splitext(path)[1])
+        if os.path.exists(blob):
+            os.utime(blob)   # in use again: restart its grace period
+            return blob
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+                shutil.copyfileobj(src, out, HASH_CHUNK)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, blob)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob
+
+    def add_async(self, path):
+        # Hashing and copying a big file takes seconds; the popup polls the returned Future
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attachments")
+        return self.executor.submit(self.add, path)
+
+    def collect_garbage(self, notes, grace=GC_GRACE):
+        """
+        Delete blobs none of `notes` refers to and nobody touched for `grace` seconds.
+        `notes` must be all of the notebook's notes, as every process has them.
+        Returns how many were removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        used = {os.path.abspath(n.pdf_path) for n in notes if n.pdf_path}
+        cutoff = time.time() - grace
+        removed = 0
+        for folder in os.listdir(self.root):
+            folder_path = os.path.join(self.root, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                blob = os.path.join(folder_path, name)
+                if name.endswith(".tmp") or os.path.abspath(blob) in used or os.path.getmtime(blob) > cutoff:
+                    continue
+                os.remove(blob)
+                removed += 1
+        return removed
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,863 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Run from the project root, same as app.py:  python MainBrain/benchmarks.py render
+# Without a display, the window benchmarks re-run themselves under xvfb-run when it is installed.
+# Track a run over time:  python MainBrain/benchmarks.py suite --compare perf.jsonl --record perf.jsonl
+
+SIZES = [100, 1000, 10000]
+RESULTS = {}   # "name @ notes" -> value, for --record / --compare
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ---------- Synthetic Notebooks ----------
+def make_vocabulary(rng, size=5000):
+    # Real words the benchmark queries use, plus made-up ones so term frequencies look natural
+    words = ["alpha", "pump", "valve", "error", "manual", "guide", "reset", "sensor",
+             "panel", "light", "config", "report", "project", "install", "check", "motor"]
+    syllables = ["ka", "lo", "mi", "ten", "ro", "sa", "vex", "dor", "pi", "ul", "zan", "ber", "qu", "ti"]
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    rng.shuffle(words)
+    weights = [1 / (rank + 1) for rank in range(len(words))]  # Zipf-like
+    return words, weights
+
+
+def make_notes(count, per_section=20, seed=0):
+    rng = random.Random(seed)
+    words, weights = make_vocabulary(rng)
+    notes = []
+    next_id = 1
+    section_id = None
+    for i in range(count):
+        if i % (per_section + 1) == 0:
+            section_id = next_id
+            notes.append({"text": f"Section {section_id}", "id": next_id, "is_section": True,
+                          "parent_section_id": None, "collapsed": rng.random() < 0.5})
+        else:
+            text = " ".join(rng.choices(words, weights, k=rng.randint(3, 12)))
+            notes.append({"text": text, "id": next_id, "is_section": False,
+                          "parent_section_id": section_id})
+        next_id += 1
+    return notes
+
+
+def write_notebook(count, directory):
+    path = os.path.join(directory, f"notes_{count}.json")
+    with open(path, "w") as f:
+        json.dump({"notes": make_notes(count)}, f)
+    return path
+
+
+def timeit(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def report(name, count, ms):
+    RESULTS[f"{name} @ {count}"] = ms
+    print(f"{name:<40} {count:>7} notes  {ms:10.2f} ms")
+
+
+def report_count(name, count, value, unit=""):
+    RESULTS[f"{name} @ {count}"] = value
+    print(f"{name:<40} {count:>7} notes  {value:10.0f}{unit}")
+
+
+# ---------- Render ----------
+def open_app(path):
+    # Needs a display (main() re-runs itself under xvfb-run on a headless box)
+    from app import WorkNotesApp
+
+    app = WorkNotesApp(data_file=path)
+    app.update()
+    return app
+
+
+def bench_render(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            app = open_app(write_notebook(count, tmp))
+            note_list = app.note_list
+
+            def cold():
+                for row in note_list.pool:
+                    row.frame.destroy()
+                note_list.pool = []
+                app.render_notes()
+                app.update_idletasks()
+
+            def unchanged():
+                app.render_notes()
+                app.update_idletasks()
+
+            def one_edit():
+                note = app.notes_manager.notes[len(app.notes_manager.notes) // 2]
+                note.text = note.text + "!"
+                app.render_notes()
+                app.update_idletasks()
+
+            report("render (cold)", count, timeit(cold, repeat=1))
+            report("render (nothing changed)", count, timeit(unchanged))
+            report("render (one note edited)", count, timeit(one_edit))
+
+            section = app.notes_manager.get_children(None)[0]
+
+            def toggle():
+                app.toggle_section_dropdown(section)
+                app.update_idletasks()
+
+            report("expand/collapse one section", count, timeit(toggle, repeat=4))
+            app.destroy()
+
+
+def bench_scroll(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [50000]:
+            app = open_app(write_notebook(count, tmp))
+            canvas = app.note_list.canvas
+            steps = 50
+
+            def scroll_through():
+                for i in range(steps + 1):
+                    canvas.yview_moveto(i / steps)
+                    app.update_idletasks()
+
+            ms = timeit(scroll_through, repeat=1)
+            report("scroll (per step)", count, ms / (steps + 1))
+            report_count("pooled rows", count, len(app.note_list.pool))
+            app.destroy()
+
+
+# ---------- Drag and Drop ----------
+class PointerEvent:
+    def __init__(self, y_root):
+        self.y_root = y_root
+
+
+def bench_drag(sizes):
+    from ui_components import start_drag, drag_motion, update_drag, end_drag
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            app = open_app(write_notebook(count, tmp))
+            row = app.note_list.pool[1]
+            note = row.note
+            is_section = note.is_section
+            y0 = row.frame.winfo_rooty() + 5
+
+            start_drag(PointerEvent(y0), row.frame, note.id, app, is_section)
+
+            def motion():
+                for i in range(100):
+                    drag_motion(PointerEvent(y0 + i * 3), row.frame, app)
+                    update_drag(app)
+
+            report("drag motion (per event)", count, timeit(motion) / 100)
+            report("drop (one row moved)", count,
+                   timeit(lambda: end_drag(PointerEvent(y0 + 300), row.frame, note.id, app, is_section), repeat=1))
+            app.destroy()
+
+
+# ---------- Search ----------
+QUERIES = ["p", "pu", "pump", "val", "alve", "pump manual", "nsor", "project install check"]
+# Common syllable prefixes of the made-up words: tens of thousands of hits at 100k notes
+COMMON_QUERIES = ["ka", "lo", "lo mi", "ka lo", "ti ka ro", "sa ul ber"]
+
+
+def linear_search(notes, query):
+    terms = query.lower().split()
+    return [n.id for n in notes if all(t in n.text.lower() for t in terms)]
+
+
+def bench_search(sizes):
+    from notes import Note
+    from notes_manager import NotesManager
+    from search import SearchIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [100000]:
+            path = write_notebook(count, tmp)
+            manager = NotesManager(path, storage=NullStorage(path))
+            index = SearchIndex()
+            notes = [Note.from_dict(n) for n in make_notes(count)]
+            report("index build", count, timeit(lambda: index.rebuild(notes), repeat=1))
+            for query in QUERIES + COMMON_QUERIES:
+                # What the search box runs: every hit, unranked, as the list filters by them.
+                # Timed cold: the index's term cache would make repeats look cheaper than the first try
+                def app_search():
+                    manager.search_index.term_ids.clear()
+                    manager.match_ids(query)
+
+                report(f"search {query!r} (app)", count, timeit(app_search))
+                report(f"search {query!r} (ranked, top 200)", count, timeit(lambda: index.search(query, limit=200)))
+                report(f"search {query!r} (linear scan)", count, timeit(lambda: linear_search(notes, query)))
+            report("index add one note", count, timeit(lambda: index.update(-1, "new pump manual")))
+
+
+# ---------- Notes Manager ----------
+def linear_children(notes, parent_id):
+    return [n for n in notes if n.parent_section_id == parent_id]
+
+
+def linear_next_id(notes):
+    return max(n.id for n in notes) + 1
+
+
+def linear_find(notes, note_id):
+    return next((n for n in notes if n.id == note_id), None)
+
+
+class NullStorage:
+    # Loads a notebook but never writes, to time the in-memory work only
+    def __init__(self, data_file):
+        from storage import read_json
+        self.data = read_json(data_file)
+
+    def load(self):
+        return self.data, []
+
+    def append(self, op, manager):
+        pass
+
+    def batch(self):
+        return contextlib.nullcontext()
+
+    def save(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def bench_manager(sizes):
+    from notes_manager import NotesManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [10000, 50000, 100000]:
+            path = write_notebook(count, tmp)
+            manager = NotesManager(path, storage=NullStorage(path))
+            notes = manager.notes
+            last = notes[-1].id
+            sections = manager.get_children(None)
+
+            report("next id (max scan)", count, timeit(lambda: linear_next_id(notes)))
+            report("next id (counter)", count, timeit(manager.get_next_id))
+            report("find by id (scan)", count, timeit(lambda: linear_find(notes, last)))
+            report("find by id (dict)", count, timeit(lambda: manager.get_note(last)))
+            # Rendering asks this once per section, so the scan version is O(sections x notes)
+            report("children of 100 sections (scan)", count,
+                   timeit(lambda: [linear_children(notes, s.id) for s in sections[:100]], repeat=1))
+            report("children of 100 sections (index)", count,
+                   timeit(lambda: [manager.get_children(s.id) for s in sections[:100]]))
+
+            def add_and_delete():
+                note = manager.add_note("benchmark note", parent_id=sections[-1].id)
+                manager.delete_note(note.id)
+
+            report("add + delete one note", count, timeit(add_and_delete))
+            report("move one note", count,
+                   timeit(lambda: manager.move_note(last, parent_id=sections[0].id)))
+
+
+# ---------- Storage ----------
+def bench_storage(sizes):
+    from notes_manager import NotesManager
+    from storage import open_storage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            for kind in ["json", "journal", "sqlite"]:
+                path = write_notebook(count, tmp)
+                manager = NotesManager(path, storage=open_storage(kind, path))
+                note_id = manager.notes[-1].id
+                flip = [False]
+
+                def toggle():
+                    flip[0] = not flip[0]
+                    manager.update_note(note_id, collapsed=flip[0])
+
+                report(f"load ({kind})", count, timeit(lambda: manager.load_notes(), repeat=1))
+                report(f"one field change ({kind})", count, timeit(toggle, repeat=5))
+                report(f"add note ({kind})", count, timeit(lambda: manager.add_note("new note"), repeat=5))
+
+                def move_last_to_top():
+                    top = manager.get_children(None)
+                    manager.move_note(top[-1].id, before_id=top[0].id)
+
+                report(f"move section to top ({kind})", count, timeit(move_last_to_top, repeat=5))
+                manager.close()
+
+
+def bench_write_behind(sizes):
+    from notes_manager import NotesManager
+    from storage import open_storage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            path = write_notebook(count, tmp)
+            manager = NotesManager(path, storage=open_storage("json", path), write_delay=0.2)
+            note_id = manager.notes[-1].id
+
+            def burst():
+                for i in range(100):
+                    manager.update_note(note_id, text=f"edit {i}")
+
+            report("100 edits, UI thread (write-behind)", count, timeit(burst, repeat=1))
+            report("flush", count, timeit(manager.flush, repeat=1))
+            report_count("disk writes for 100 edits", count, manager.storage.write_count)
+            manager.close()
+
+
+# ---------- Startup ----------
+def first_screen(manager, rows=30):
+    # What the window needs before its first paint: the top rows, expanded sections opened
+    shown = []
+    for note in manager.get_children(None):
+        shown.append(note)
+        if not note.collapsed:
+            shown.extend(manager.get_children(note.id))
+        if len(shown) >= rows:
+            break
+    return shown
+
+
+def bench_startup(sizes):
+    from notes_manager import NotesManager
+    from storage import open_storage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [100000]:
+            path = write_notebook(count, tmp)
+
+            def eager():
+                manager = NotesManager(path, storage=open_storage("journal", path))
+                first_screen(manager)
+                manager.close()
+
+            def lazy():
+                manager = NotesManager(path, storage=open_storage("journal", path), lazy=True)
+                first_screen(manager)
+                manager.close()
+
+            def lazy_full():
+                manager = NotesManager(path, storage=open_storage("journal", path), lazy=True)
+                manager.finish_loading()
+                manager.close()
+
+            report("first screen (eager load)", count, timeit(eager))
+            report("first screen (lazy load)", count, timeit(lazy))
+            report("lazy load, all chunks", count, timeit(lazy_full))
+
+
+# ---------- PDF Text Index ----------
+def read_fake_pdf(path):
+    # Stand-in extractor (the benchmark's "PDFs" are plain text); must be picklable for the pool
+    with open(path) as f:
+        return f.read()
+
+
+def bench_pdf_index(sizes):
+    from notes_manager import NotesManager
+    from pdf_index import PdfIndex, pdf_cache_path_for
+
+    rng = random.Random(1)
+    words, weights = make_vocabulary(rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            notes = make_notes(count)
+            attached = [n for n in notes if not n["is_section"]][::10]
+            for note in attached:
+                note["pdf_path"] = os.path.join(tmp, f"doc_{count}_{note['id']}.pdf")
+                with open(note["pdf_path"], "w") as f:
+                    f.write(" ".join(rng.choices(words, weights, k=2000)))
+            path = os.path.join(tmp, f"notes_{count}.json")
+            with open(path, "w") as f:
+                json.dump({"notes": notes}, f)
+
+            def open_manager():
+                pdf_index = PdfIndex(pdf_cache_path_for(path), extract=read_fake_pdf)
+                return NotesManager(path, pdf_index=pdf_index)
+
+            def wait(manager):
+                while manager.pdf_index.pending:
+                    time.sleep(0.005)
+
+            for cache in ["cold", "warm"]:
+                start = time.perf_counter()
+                manager = open_manager()
+                report(f"load, {len(attached)} PDFs ({cache} cache)", count, (time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                wait(manager)
+                report("  background until indexed", count, (time.perf_counter() - start) * 1000)
+                report_count("  PDFs read", count, manager.pdf_index.extractions)
+                if cache == "warm":
+                    report("  search incl. attachments", count, timeit(lambda: manager.search("pump valve")))
+                    for note in attached[:5]:
+                        with open(note["pdf_path"], "a") as f:
+                            f.write(" changed")
+                    report("  refresh, 5 PDFs changed", count, timeit(manager.pdf_index.refresh, repeat=1))
+                    wait(manager)
+                    report_count("  PDFs read again", count, manager.pdf_index.extractions)
+                manager.close()
+
+
+# ---------- PDF Previews ----------
+def bench_thumbnails(sizes):
+    # Needs a display; the "PDFs" are placeholders, so this measures the UI side only
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [50, 200, 1000]:
+            notes = [{"text": "Attachments", "id": 1, "is_section": True, "parent_section_id": None,
+                      "collapsed": True}]
+            for i in range(count):
+                pdf_path = os.path.join(tmp, f"doc_{i}.pdf")
+                with open(pdf_path, "w") as f:
+                    f.write("%PDF-1.4")
+                notes.append({"text": f"Manual {i}", "id": i + 2, "is_section": False,
+                              "parent_section_id": 1, "pdf_path": pdf_path})
+            path = os.path.join(tmp, f"notes_{count}.json")
+            with open(path, "w") as f:
+                json.dump({"notes": notes}, f)
+
+            app = open_app(path)
+            section = app.notes_manager.get_note(1)
+
+            def expand():
+                app.toggle_section_dropdown(section)
+                app.update_idletasks()
+
+            report("expand section of attached PDFs", count, timeit(expand, repeat=1))
+            report_count("previews requested", count, len(app.thumbnails.waiters))
+            app.on_close()
+
+
+# ---------- Attachment Store ----------
+def bench_attachments(sizes):
+    from attachments import AttachmentStore, hash_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AttachmentStore(os.path.join(tmp, "attachments"))
+        for megabytes in [10, 50, 200]:
+            path = os.path.join(tmp, f"manual_{megabytes}.pdf")
+            with open(path, "wb") as f:
+                for _ in range(megabytes):
+                    f.write(os.urandom(1024 * 1024))
+            print(f"{f'hash (mmap), {megabytes} MB':<40} {timeit(lambda: hash_file(path), repeat=1):10.2f} ms")
+            print(f"{f'attach (new blob), {megabytes} MB':<40} {timeit(lambda: store.add(path), repeat=1):10.2f} ms")
+            print(f"{f'attach again (deduplicated), {megabytes} MB':<40} {timeit(lambda: store.add(path), repeat=1):10.2f} ms")
+            os.remove(path)
+        print(f"{'garbage collection, 3 blobs':<40} {timeit(lambda: store.collect_garbage([], grace=0), repeat=1):10.2f} ms")
+        store.close()
+
+
+# ---------- Bulk Import / Export ----------
+def bench_import(sizes):
+    import bulk_io
+    from notes_manager import NotesManager
+    from storage import open_storage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            source = NotesManager(write_notebook(count, tmp))
+            for fmt, name in [("jsonl", "notes.jsonl"), ("csv", "notes.csv"), ("markdown", "notes_md")]:
+                out = os.path.join(tmp, f"{count}_{name}")
+                report(f"export ({fmt})", count, timeit(lambda: bulk_io.export_notes(source, out, fmt), repeat=1))
+                for kind in ["json", "journal", "sqlite"]:
+                    path = os.path.join(tmp, f"import_{count}_{fmt}_{kind}.json")
+                    manager = NotesManager(path, storage=open_storage(kind, path))
+                    report(f"import {fmt} ({kind}, bulk)", count,
+                           timeit(lambda: bulk_io.import_notes(manager, out, fmt), repeat=1))
+                    manager.close()
+            source.close()
+
+            # The old way: one add_note (and one disk write) per note; the JSON backend is capped
+            for kind in ["json", "journal", "sqlite"]:
+                limit = min(count, 1000) if kind == "json" else count
+                path = os.path.join(tmp, f"one_by_one_{count}_{kind}.json")
+                manager = NotesManager(path, storage=open_storage(kind, path))
+
+                def one_by_one():
+                    for i in range(limit):
+                        manager.add_note(f"imported note {i}")
+
+                report(f"add_note x{limit} ({kind})", count, timeit(one_by_one, repeat=1))
+                manager.close()
+
+
+# ---------- Memory ----------
+def traced_bytes(build):
+    # Bytes still allocated by build() once it returns (its result kept alive)
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def bench_memory(sizes):
+    from notes import Note
+    from notes_manager import NotesManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [100000, 300000]:
+            path = write_notebook(count, tmp)
+            with open(path) as f:
+                raw = f.read()
+            rows = [
+                ("note text alone", lambda: [n["text"] for n in json.loads(raw)["notes"]]),
+                ("notes as dicts (before)", lambda: json.loads(raw)["notes"]),
+                ("notes as Note objects", lambda: [Note.from_dict(n) for n in json.loads(raw)["notes"]]),
+                ("NotesManager incl. indexes", lambda: NotesManager(path)),
+            ]
+            for name, build in rows:
+                result, size = traced_bytes(build)
+                report_count(name, count, size / count, " bytes/note")
+                del result
+
+
+# ---------- Undo / Redo ----------
+def bench_undo(sizes):
+    from notes_manager import NotesManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [100000]:
+            path = write_notebook(count, tmp)
+            manager = NotesManager(path, storage=NullStorage(path), undo_budget=64 * 1024 * 1024)
+            rng = random.Random(2)
+            ids = [n.id for n in manager.notes if not n.is_section]
+            top = manager.get_children(None)
+
+            def actions():
+                for i in range(1000):
+                    note_id = rng.choice(ids)
+                    if i % 2:
+                        manager.update_note(note_id, text=f"edit {i}")
+                    else:
+                        manager.move_note(note_id, parent_id=rng.choice(top).id)
+
+            report("1000 actions (with history)", count, timeit(actions, repeat=1))
+            _, snapshot = traced_bytes(manager.snapshot)
+            report_count("history of 1000 actions", count, manager.history.size, " bytes")
+            report_count("one copy of the notes (per step before)", count, snapshot, " bytes")
+            report("undo one action", count, timeit(manager.undo, repeat=5))
+            report("redo one action", count, timeit(manager.redo, repeat=5))
+            report("undo all 1000", count, timeit(lambda: [manager.undo() for _ in range(1000)], repeat=1))
+
+            section = top[len(top) // 2]
+            report("delete a section", count, timeit(lambda: manager.delete_note(section.id), repeat=1))
+            report("undo the delete", count, timeit(manager.undo, repeat=1))
+
+
+# ---------- Several Processes ----------
+def open_shared(backend, path, **kwargs):
+    from notes_manager import NotesManager
+    from storage import JournalStorage, open_storage
+
+    if backend == "journal":
+        # Small threshold, so compactions by one process land under the other's feet too
+        storage = JournalStorage(path, compact_threshold=16 * 1024)
+    else:
+        storage = open_storage(backend, path)
+    return NotesManager(path, storage=storage, **kwargs)
+
+
+def concurrent_editor(backend, path, name, edits, seed, start, results):
+    # One window: adds, edits, moves and deletes its own notes, merging the others' like the UI does
+    from settings import Settings, settings_path_for
+
+    manager = open_shared(backend, path, write_delay=0.005)
+    settings = Settings(settings_path_for(path))
+    rng = random.Random(seed)
+    sections = [n.id for n in manager.get_children(None) if n.is_section]
+    mine = []
+    start.wait()
+    for i in range(edits):
+        manager.merge(*manager.external_changes())
+        roll = rng.random()
+        if mine and roll < 0.3:
+            manager.update_note(rng.choice(mine), text=f"{name} edit {i}")
+        elif mine and roll < 0.4:
+            manager.move_note(rng.choice(mine), parent_id=rng.choice(sections))
+        elif mine and roll < 0.5:
+            manager.delete_note(mine.pop(rng.randrange(len(mine))))
+        else:
+            mine.append(manager.add_note(f"{name} add {i}", parent_id=rng.choice(sections)).id)
+        if i % 10 == 0:
+            settings.set_collapsed(f"{name}-{i}", i % 20 == 0)
+        time.sleep(rng.random() * 0.002)
+    manager.flush()
+    expected = {note_id: [manager.get_note(note_id).text, manager.get_note(note_id).parent]
+                for note_id in mine}
+    collapsed = {k: v for k, v in settings["collapsed"].items() if k.startswith(name + "-")}
+    manager.close()
+    results.put((name, expected, collapsed))
+
+
+def bench_concurrency(sizes, processes=2, edits=300):
+    from settings import Settings, settings_path_for
+
+    context = multiprocessing.get_context("spawn")
+    failed = []
+    for backend in ["json", "journal", "sqlite"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            count = sizes[0]
+            path = write_notebook(count, tmp)
+            open_shared(backend, path).close()   # sqlite: migrate once, before the race
+
+            start, results = context.Event(), context.Queue()
+            workers = [context.Process(target=concurrent_editor,
+                                       args=(backend, path, f"p{i}", edits, i, start, results))
+                       for i in range(processes)]
+            for worker in workers:
+                worker.start()
+            began = time.perf_counter()
+            start.set()
+            outcomes = [results.get(timeout=120) for _ in workers]
+            for worker in workers:
+                worker.join()
+            ms = (time.perf_counter() - began) * 1000
+
+            manager = open_shared(backend, path)
+            manager.load_bodies()
+            settings = Settings(settings_path_for(path))
+            lost = 0
+            kept = set()
+            for name, expected, collapsed in outcomes:
+                for note_id, (text, parent) in expected.items():
+                    note = manager.get_note(note_id)
+                    if note is None or note.text != text or note.parent != parent:
+                        lost += 1
+                kept.update(expected)
+                lost += sum(settings["collapsed"].get(k) != v for k, v in collapsed.items())
+            # Deleted notes that came back, or copies under a second id
+            names = {name for name, _, _ in outcomes}
+            lost += sum(1 for n in manager.notes if n.text.split(" ")[0] in names and n.id not in kept)
+            manager.close()
+            report(f"{backend}: {processes} x {edits} edits", count, ms)
+            report_count(f"{backend}: lost edits", count, lost)
+            if lost:
+                failed.append(backend)
+    if failed:
+        # A harness, not only a timing: a lost edit must fail the run
+        sys.exit("edits lost with: " + ", ".join(failed))
+
+
+# ---------- Imports / Cold Start ----------
+# Modules that should stay off the startup path (imported on first use). PIL and
+# tkinter.filedialog aren't here: customtkinter imports both anyway.
+DEFERRED_MODULES = ["pdf_utils", "sqlite_storage"]
+
+FIRST_FRAME_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[2])
+from app import WorkNotesApp
+app = WorkNotesApp(data_file=sys.argv[1])
+app.update()
+print((time.perf_counter() - start) * 1000)
+app.destroy()
+"""
+
+
+def import_times(module):
+    # -X importtime writes "self [us] | cumulative | name" per import to stderr, nesting shown by indent
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=HERE, capture_output=True, text=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+    return result.returncode, times, result.stderr
+
+
+def bench_imports(sizes):
+    code, times, stderr = import_times("app")
+    if code != 0:
+        print("import app failed: " + stderr.strip().splitlines()[-1])
+        return
+    total = {name: cumulative for name, _, cumulative in times}
+    print(f"{'import app (cumulative)':<40} {total['app'] / 1000:10.2f} ms")
+    for name, own, _ in sorted(times, key=lambda t: -t[1])[:15]:
+        print(f"  {name:<38} {own / 1000:10.2f} ms")
+    for name in DEFERRED_MODULES:
+        if name in total:
+            print(f"WARNING: {name} is imported at startup")
+
+    # Whole cold start, one fresh interpreter per run; needs a display
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            path = write_notebook(count, tmp)
+            # Run from the project root like app.py, so icons/ and data/ resolve
+            result = subprocess.run([sys.executable, "-c", FIRST_FRAME_SCRIPT, path, HERE],
+                                    cwd=os.path.dirname(HERE), capture_output=True, text=True)
+            if result.returncode != 0:
+                print("first frame: app did not start: " + result.stderr.strip().splitlines()[-1])
+                return
+            report("import + first frame", count, float(result.stdout.split()[-1]))
+
+
+# ---------- Suite ----------
+def bench_suite(sizes):
+    # The user-facing latencies in one run, on the real window; the app's own perf hooks
+    # (perf.py) add what each path cost inside, worst call first
+    from perf import RECORDER, count_widgets
+    from ui_components import start_drag, drag_motion, update_drag, end_drag
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes + [100000]:
+            path = write_notebook(count, tmp)
+            RECORDER.reset()
+            began = time.perf_counter()
+            app = open_app(path)
+            report("startup: first frame", count, (time.perf_counter() - began) * 1000)
+            while app.notes_manager.loading:
+                app.load_next_chunk()
+            app.update_idletasks()
+            report("startup: fully loaded", count, (time.perf_counter() - began) * 1000)
+            manager = app.notes_manager
+
+            def render():
+                app.render_notes()
+                app.update_idletasks()
+
+            report("render", count, timeit(render))
+            section = manager.get_children(None)[0]
+
+            def toggle():
+                app.toggle_section_dropdown(section)
+                app.update_idletasks()
+
+            report("expand/collapse one section", count, timeit(toggle, repeat=4))
+            report("search (mean of queries)", count,
+                   sum(timeit(lambda: manager.search(query)) for query in QUERIES) / len(QUERIES))
+            note_id = manager.notes[-1].id
+
+            def edit():
+                manager.update_note(note_id, text=manager.get_note(note_id).text + "!")
+                manager.flush()
+
+            report("save: one edit written", count, timeit(edit))
+            report("save: whole notebook", count, timeit(manager.save_notes, repeat=1))
+
+            row = app.note_list.pool[1]
+            y0 = row.frame.winfo_rooty() + 5
+            start_drag(PointerEvent(y0), row.frame, row.note.id, app, row.note.is_section)
+
+            def motion():
+                for i in range(100):
+                    drag_motion(PointerEvent(y0 + i * 3), row.frame, app)
+                    update_drag(app)
+
+            report("drag: per motion event", count, timeit(motion) / 100)
+            report("drag: drop", count, timeit(
+                lambda: end_drag(PointerEvent(y0 + 300), row.frame, row.note.id, app, row.note.is_section),
+                repeat=1))
+            report_count("widgets alive", count, count_widgets(app))
+            for name, (calls, total, worst) in sorted(RECORDER.summary().items(), key=lambda i: -i[1][2]):
+                print(f"  {f'{name} ({calls} calls)':<38} {count:>7} notes  {worst:10.2f} ms worst")
+            app.on_close()
+
+
+BENCHMARKS = {
+    "render": bench_render,
+    "scroll": bench_scroll,
+    "drag": bench_drag,
+    "search": bench_search,
+    "manager": bench_manager,
+    "storage": bench_storage,
+    "write_behind": bench_write_behind,
+    "startup": bench_startup,
+    "pdf_index": bench_pdf_index,
+    "thumbnails": bench_thumbnails,
+    "attachments": bench_attachments,
+    "import": bench_import,
+    "memory": bench_memory,
+    "undo": bench_undo,
+    "concurrency": bench_concurrency,
+    "imports": bench_imports,
+    "suite": bench_suite,
+}
+
+
+# Benchmarks that open the real window
+DISPLAY_BENCHMARKS = {"render", "scroll", "drag", "thumbnails", "imports", "suite"}
+REGRESSION = 1.2   # --compare flags results this much worse than the recorded run
+
+
+def needs_xvfb(names):
+    # Headless Linux box with Xvfb installed: run the window benchmarks on a virtual display
+    return (sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+            and shutil.which("xvfb-run") is not None and bool(DISPLAY_BENCHMARKS.intersection(names)))
+
+
+def record_results(path):
+    # One JSON line per run, so a file of them tracks the numbers over time
+    revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip()
+    with open(path, "a") as f:
+        f.write(json.dumps({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "revision": revision,
+                            "results": RESULTS}) + "\n")
+
+
+def compare_results(path):
+    with open(path) as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    if not runs:
+        return
+    before = runs[-1]["results"]
+    print(f"---------- compared with {runs[-1]['revision'] or 'run'} of {runs[-1]['time']} ----------")
+    for key, value in RESULTS.items():
+        old = before.get(key)
+        if not old:
+            continue
+        # Small absolute numbers are mostly noise
+        worse = value > old * REGRESSION and value - old > 1
+        print(f"{key:<52} {old:10.2f} -> {value:10.2f}  {value / old:5.2f}x{'  WORSE' if worse else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work Notes benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--record", metavar="FILE", help="append the results to FILE (JSON lines)")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with the last run in FILE")
+    args = parser.parse_args()
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmark: " + ", ".join(unknown))
+    names = args.names or list(BENCHMARKS)
+    if needs_xvfb(names):
+        os.execvp("xvfb-run", ["xvfb-run", "-a", sys.executable] + sys.argv)
+    for name in names:
+        print(f"---------- {name} ----------")
+        BENCHMARKS[name](args.sizes)
+    if args.compare and os.path.exists(args.compare):
+        compare_results(args.compare)
+    if args.record:
+        record_results(args.record)
+
+if __name__ == "__main__":
+    main()
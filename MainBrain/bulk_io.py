@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import re
+
+from config import DATA_FILE, STORAGE_BACKEND
+
+# Bulk import/export of notes.
+#   Markdown folder: one file per section ("# Title" or the file name), notes separated by "---" lines;
+#                    notes outside any section go in TOP_LEVEL_FILE; a "---" line inside a note
+#                    is written as "\---" (and "\---" as "\\---") so it doesn't split the note.
+#                    Attachments are not exported.
+#   JSONL:           one note per line, as stored (parent_section_id refers to ids in the same file)
+#   CSV:             section,text,pdf_path  (a row with empty text is just a section)
+# Readers yield bulk_add records lazily; writers take notes one at a time, so neither
+# side holds the whole file in memory.
+
+NOTE_SEPARATOR = "---"
+TOP_LEVEL_FILE = "0000 Top level.md"   # sorts before the numbered section files
+CSV_FIELDS = ["section", "text", "pdf_path"]
+SEPARATOR_LIKE = re.compile(r"(\s*)(\\*---\s*)")   # "---" after any number of backslashes
+
+
+def detect_format(path):
+    if os.path.isdir(path) or not os.path.splitext(path)[1]:
+        return "markdown"
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    if ext == ".md":
+        return "markdown"
+    raise ValueError(f"can't tell the format of {path}; pass --format")
+
+
+# ---------- Readers ----------
+def unescape_line(line):
+    match = SEPARATOR_LIKE.fullmatch(line)
+    return match[1] + match[2][1:] if match else line
+
+
+def read_markdown(folder):
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".md"):
+            continue
+        title = os.path.splitext(name)[0]
+        ref = None if name == TOP_LEVEL_FILE else ("md", name)
+        opened = ref is None   # the top-level file opens no section
+        lines = []
+        with open(os.path.join(folder, name), encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not opened and not lines and line.startswith("# "):
+                    title = line[2:].strip()
+                    continue
+                if not opened:
+                    yield {"is_section": True, "text": title, "ref": ref}
+                    opened = True
+                if line.strip() == NOTE_SEPARATOR:
+                    text = "\n".join(lines).strip()
+                    if text:
+                        yield {"text": text, "section": ref}
+                    lines = []
+                else:
+                    lines.append(unescape_line(line))
+        if not opened:
+            yield {"is_section": True, "text": title, "ref": ref}
+        text = "\n".join(lines).strip()
+        if text:
+            yield {"text": text, "section": ref}
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            note = json.loads(line)
+            parent = note.pop("parent_section_id", None)
+            if note.get("is_section"):
+                note["ref"] = ("jsonl", note.get("id"))
+            elif parent is not None:
+                note["section"] = ("jsonl", parent)
+            yield note
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            section = (row.get("section") or "").strip() or None
+            text = (row.get("text") or "").strip()
+            if not text:
+                if section:
+                    yield {"is_section": True, "text": section, "ref": section}
+                continue
+            record = {"text": text, "section": section}
+            if row.get("pdf_path"):
+                record["pdf_path"] = row["pdf_path"]
+            yield record
+
+
+READERS = {"markdown": read_markdown, "jsonl": read_jsonl, "csv": read_csv}
+
+
+def import_notes(manager, path, fmt=None, orphans=None):
+    return manager.bulk_add(READERS[fmt or detect_format(path)](path), orphans)
+
+
+# ---------- Writers ----------
+def safe_file_name(title, index):
+    # Numbered so the folder sorts (and imports) in notebook order; the title is in the "# " line
+    name = "".join(c if c.isalnum() or c in " -_." else "_" for c in title).strip()[:60] or "Section"
+    return f"{index:04d} {name}.md"
+
+
+def escape_line(line):
+    # A line that reads as a separator gets one more backslash; unescape_line takes it off
+    match = SEPARATOR_LIKE.fullmatch(line)
+    return match[1] + "\\" + match[2] if match else line
+
+
+def write_note(out, text, first):
+    if not first:
+        out.write(f"\n{NOTE_SEPARATOR}\n")
+    out.write("\n" + "\n".join(map(escape_line, text.split("\n"))) + "\n")
+
+
+def write_markdown(notes, folder):
+    os.makedirs(folder, exist_ok=True)
+    files = 0
+    out = top = None     # current section's file, the top-level notes' file
+    first = top_first = True
+    count = 0
+    try:
+        for note in notes:
+            if note.is_section:
+                if out is not None:
+                    out.close()
+                files += 1
+                out = open(os.path.join(folder, safe_file_name(note.text, files)), "w", encoding="utf-8")
+                out.write(f"# {note.text}\n")
+                first = True
+            elif note.parent_section_id and out is not None:
+                write_note(out, note.text, first)
+                first = False
+            else:
+                # Wherever it sits between sections, a top-level note must not land in a section's file
+                if top is None:
+                    top = open(os.path.join(folder, TOP_LEVEL_FILE), "w", encoding="utf-8")
+                write_note(top, note.text, top_first)
+                top_first = False
+            count += 1
+    finally:
+        for f in (out, top):
+            if f is not None:
+                f.close()
+    return count
+
+
+def write_jsonl(notes, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for note in notes:
+            f.write(json.dumps(note.to_dict()) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(notes, path):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        section = None
+        empty = False
+        for note in notes:
+            if empty and (note.is_section or not note.parent_section_id):
+                # The section before had no notes: a row of its own, or it would be lost
+                writer.writerow({"section": section, "text": "", "pdf_path": ""})
+                empty = False
+            if note.is_section:
+                section, empty = note.text, True
+                count += 1
+                continue
+            if not note.parent_section_id:
+                section = None
+            writer.writerow({"section": section or "", "text": note.text, "pdf_path": note.pdf_path or ""})
+            empty = False
+            count += 1
+        if empty:
+            writer.writerow({"section": section, "text": "", "pdf_path": ""})
+    return count
+
+
+WRITERS = {"markdown": write_markdown, "jsonl": write_jsonl, "csv": write_csv}
+
+
+def export_notes(manager, path, fmt=None):
+    return WRITERS[fmt or detect_format(path)](manager.iter_notes(), path)
+
+
+def main():
+    from notes_manager import NotesManager
+    from storage import open_storage
+
+    parser = argparse.ArgumentParser(description="Import or export Work Notes in bulk")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="Markdown folder, .jsonl or .csv file")
+    parser.add_argument("--format", choices=sorted(READERS))
+    parser.add_argument("--data", default=DATA_FILE, help="notes file (default: %(default)s)")
+    parser.add_argument("--backend", default=STORAGE_BACKEND, choices=["json", "journal", "sqlite"])
+    args = parser.parse_args()
+
+    manager = NotesManager(args.data, storage=open_storage(args.backend, args.data))
+    try:
+        if args.action == "import":
+            orphans = []
+            count = import_notes(manager, args.path, args.format, orphans)
+            print(f"Imported {count} notes from {args.path}")
+            if orphans:
+                print(f"{len(orphans)} notes refer to a section not in the file; they were added at top level")
+        else:
+            fmt = args.format or detect_format(args.path)
+            count = export_notes(manager, args.path, fmt)
+            print(f"Exported {count} notes to {args.path}")
+            attached = sum(1 for note in manager.notes if note.pdf_path) if fmt == "markdown" else 0
+            if attached:
+                print(f"{attached} notes have an attached PDF; Markdown export leaves the attachments out")
+    finally:
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
-import customtkinter as ctk
-
-DATA_FILE = "data/notes_data.json"
-PLACEHOLDER_COLOR = "#A0A0A0"
-
-ctk.set_appearance_mode("light")
-ctk.set_default_color_theme("blue")
-
-# Factory function to create fonts after root exists
-def get_default_font(size=14, weight="normal"):
-    return ctk.CTkFont(size=size, weight=weight)
+DATA_FILE = "data/notes_data.json"
+STORAGE_BACKEND = "journal"   # "json" rewrites the whole file on every change, "sqlite" uses notes_data.db
+WRITE_DELAY = 0.3             # seconds of quiet before changes are written in the background
+WATCH_INTERVAL = 1.0          # seconds between checks for changes made by another window
+UNDO_BUDGET = 8 * 1024 * 1024 # bytes of undo/redo history; the oldest steps go first
+PERF_OUTPUT = ""              # per-frame timings: "overlay", "log" or "overlay,log" (or set WORKNOTES_PERF)
+PLACEHOLDER_COLOR = "#A0A0A0"
+COLOR_THEME = "blue"
+ICON_DIR = "icons"
+ICON_CACHE_DIR = "data/cache/icons"   # pre-scaled copies of the icons, rebuilt when a source changes
+
+# Factory function to create fonts after root exists
+def get_default_font(size=14, weight="normal"):
+    import customtkinter as ctk   # config is also read by the command-line tools
+    return ctk.CTkFont(size=size, weight=weight)
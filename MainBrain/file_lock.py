@@ -0,0 +1,117 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_OFFSET = 4096   # Windows locks a byte range; one past the counters, so rewriting them isn't blocked
+NEXT_ID, GENERATION, NEXT_SEQ = range(3)   # counters kept in the lock file
+
+
+def lock_path_for(data_file):
+    return data_file + ".lock"
+
+
+class FileLock:
+    """
+    Exclusive lock shared by every process using the same notes file.
+    The lock is taken on a separate small file, never on the data itself, so a crash
+    can't leave the notes locked (the OS drops the lock with the process).
+    Re-entrant; threads of one process take turns through an RLock.
+    The lock file also holds a few counters every process claims values from:
+    NEXT_ID     next free note id, so two processes never hand out the same one
+    GENERATION  bumped on every rewrite of the notes, so a process can tell its copy
+                is stale without trusting file timestamps
+    NEXT_SEQ    number of the next journal record, which must keep counting even
+                when a compaction leaves the journal empty
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        try:
+            if self.depth == 0:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    # Unbuffered: a buffered file may answer a read from what it read before
+                    self.file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), "r+b", buffering=0)
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.file.seek(LOCK_OFFSET)
+                    while True:
+                        try:
+                            # Blocks ~10 s, then raises; keep waiting like flock does
+                            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            pass
+        except BaseException:
+            self.thread_lock.release()
+            raise
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(LOCK_OFFSET)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.thread_lock.release()
+
+    def read(self):
+        # Call with the lock held
+        self.file.seek(0)
+        values = [int(f) for f in self.file.read(64).split() if f.isdigit()]
+        return (values + [0] * 3)[:3]
+
+    def write(self, values):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write((" ".join(map(str, values)) + "\n").encode())
+
+    def value(self, counter):
+        with self:
+            return self.read()[counter]
+
+    def take(self, counter, count=1, floor=0):
+        """Claim `count` values of a counter, starting at least at `floor`. Returns the first."""
+        with self:
+            values = self.read()
+            start = max(floor, values[counter])
+            values[counter] = start + count
+            self.write(values)
+        return start
+
+    def reserve(self, floor, count):
+        return self.take(NEXT_ID, count, floor)
+
+    def generation(self):
+        return self.value(GENERATION)
+
+    def bump(self):
+        """Record a rewrite of the notes; returns the new generation."""
+        return self.take(GENERATION) + 1
+
+    def close(self):
+        with self.thread_lock:
+            if self.file is not None and self.depth == 0:
+                self.file.close()
+                self.file = None
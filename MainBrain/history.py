@@ -0,0 +1,99 @@
+import json
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUDGET = 8 * 1024 * 1024   # bytes of operation records kept for undo/redo
+
+
+def op_size(op):
+    # Rough cost of keeping a record: its JSON size
+    return len(json.dumps(op))
+
+
+class History:
+    """
+    Undo/redo stacks of operation records.
+    An entry is one user action: the records it wrote, each paired with the records
+    that reverse it (see NotesManager.inverse). Only these deltas are kept, never copies
+    of the notes, and the oldest entries are dropped once the stacks pass `budget` bytes.
+    An action bigger than the whole budget (say a huge import) is not kept at all.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.undo_stack = deque()   # (steps, size), oldest first
+        self.redo_stack = []        # (steps, size), next redo last
+        self.size = 0
+        self.depth = 0
+        self.open = None            # steps of the action being recorded
+        self.open_size = 0
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+
+    @contextmanager
+    def group(self):
+        # Records written inside form one undo step
+        self.depth += 1
+        if self.depth == 1:
+            self.open, self.open_size = [], 0
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                steps, self.open = self.open, None
+                if steps:
+                    self.push(steps, self.open_size)
+
+    def add(self, op, inverse):
+        if self.depth == 0:
+            self.push([(op, inverse)], op_size(op) + sum(op_size(i) for i in inverse))
+            return
+        if self.open_size > self.budget:
+            return   # already too big to keep; stop paying for it
+        self.open.append((op, inverse))
+        self.open_size += op_size(op) + sum(op_size(i) for i in inverse)
+
+    def push(self, steps, size):
+        # A new action makes the redo stack meaningless
+        for _, dropped in self.redo_stack:
+            self.size -= dropped
+        self.redo_stack.clear()
+        if size > self.budget:
+            return
+        self.undo_stack.append((steps, size))
+        self.size += size
+        while self.size > self.budget:
+            _, dropped = self.undo_stack.popleft()
+            self.size -= dropped
+
+    # ---------- Stepping ----------
+    def undo_ops(self):
+        """Records that undo the last action, in the order to apply them (None if there is none)."""
+        if not self.undo_stack:
+            return None
+        steps, _ = self.undo_stack[-1]
+        return [inverse for _, inverses in reversed(steps) for inverse in inverses]
+
+    def redo_ops(self):
+        if not self.redo_stack:
+            return None
+        steps, _ = self.redo_stack[-1]
+        return [op for op, _ in steps]
+
+    def undone(self):
+        self.redo_stack.append(self.undo_stack.pop())
+
+    def redone(self):
+        self.undo_stack.append(self.redo_stack.pop())
@@ -0,0 +1,96 @@
+import json
+import re
+
+CHUNK_SIZE = 256 * 1024   # characters read from disk at a time
+
+NOTES_KEY_RE = re.compile(r'"notes"\s*:\s*\[')
+SKIP_RE = re.compile(r"[\s,]*")
+
+
+class NotesStream:
+    """
+    Reads a notes file ({"notes": [...], ...}) one note at a time.
+    Only CHUNK_SIZE characters are held beyond the note being parsed, so the
+    first notes are available long before the whole file has been read.
+    The other top-level keys (next_id, seq, ...) are in `extra` once the
+    stream is exhausted.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.file = open(path, "r")
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.header = ""
+        self.extra = {}
+        self.done = False
+        self.read_header()
+
+    def fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def read_header(self):
+        while True:
+            match = NOTES_KEY_RE.search(self.buffer)
+            if match:
+                self.header = self.buffer[:match.start()]
+                self.pos = match.end()
+                return
+            if not self.fill():
+                # No notes array at all
+                text = self.buffer.strip()
+                self.extra = json.loads(text) if text else {}
+                self.finish()
+                return
+
+    def finish(self):
+        self.done = True
+        self.file.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.done:
+            self.pos = SKIP_RE.match(self.buffer, self.pos).end()
+            if self.pos >= len(self.buffer):
+                if not self.fill():
+                    raise ValueError("notes file ends inside the notes array")
+                continue
+
+            if self.buffer[self.pos] == "]":
+                # End of the array: the rest of the file holds the remaining keys
+                tail = self.buffer[self.pos + 1:] + self.file.read()
+                self.extra = json.loads(self.header + '"notes": null' + tail)
+                self.extra.pop("notes", None)
+                self.finish()
+                break
+
+            try:
+                note, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Note continues in the next chunk
+                if not self.fill():
+                    raise
+                continue
+            self.pos = end
+            return note
+        raise StopIteration
+
+    def take(self, count):
+        notes = []
+        for note in self:
+            notes.append(note)
+            if len(notes) >= count:
+                break
+        return notes
+
+    def close(self):
+        if not self.done:
+            self.finish()
@@ -0,0 +1,63 @@
+FIELDS = ("id", "text", "is_section", "parent_section_id", "collapsed", "pdf_path", "order")
+
+
+class Note:
+    """
+    One note or section as NotesManager holds it.
+    Attributes in __slots__ rather than a dict per note: at hundreds of thousands
+    of notes the dicts, each with its own key table, were most of the process's memory.
+    On disk (and in operation records) a note is still the plain dict it always was;
+    from_dict/to_dict convert, and keys this version doesn't know survive in `extra`.
+    """
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, id, text="", is_section=False, parent_section_id=None,
+                 collapsed=None, pdf_path=None, order=None, extra=None):
+        self.id = id
+        self.text = text
+        self.is_section = is_section
+        self.parent_section_id = parent_section_id
+        self.collapsed = collapsed
+        self.pdf_path = pdf_path
+        self.order = order
+        self.extra = extra
+
+    @property
+    def parent(self):
+        # Top-level notes have no (or a falsy) parent_section_id
+        return self.parent_section_id or None
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {k: v for k, v in data.items() if k not in FIELDS} or None
+        return cls(data["id"], data.get("text", ""), bool(data.get("is_section")),
+                   data.get("parent_section_id"), data.get("collapsed"), data.get("pdf_path"),
+                   data.get("order"), extra)
+
+    def to_dict(self):
+        data = {"text": self.text, "id": self.id, "is_section": self.is_section,
+                "parent_section_id": self.parent_section_id}
+        if self.collapsed is not None:
+            data["collapsed"] = self.collapsed
+        if self.pdf_path:
+            data["pdf_path"] = self.pdf_path
+        if self.order is not None:
+            data["order"] = self.order
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def update(self, fields):
+        for name, value in fields.items():
+            if name in FIELDS:
+                setattr(self, name, value)
+            elif value is not None:
+                self.extra = dict(self.extra or {}, **{name: value})
+            elif self.extra and name in self.extra:
+                # None drops an unknown key again (undo of the update that added it)
+                self.extra = {k: v for k, v in self.extra.items() if k != name} or None
+
+    def __repr__(self):
+        kind = "Section" if self.is_section else "Note"
+        return f"<{kind} {self.id} {self.text[:30]!r}>"
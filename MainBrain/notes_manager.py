@@ -1,80 +1,637 @@
-import json
-import os
-
-class NotesManager:
-    def __init__(self, data_file):
-        self.data_file = data_file
-        self.notes = []
-        self.load_notes()
-
-    def load_notes(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, "r") as f:
-                    data = json.load(f)
-                    self.notes = data.get("notes", [])
-            except:
-                self.notes = []
-        else:
-            self.notes = []
-
-    def save_notes(self):
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, "w") as f:
-            json.dump({"notes": self.notes}, f, indent=2)
-
-    def add_note(self, text, is_section=False, parent_id=None, pdf_path=None):
-        note = {
-            "text": text,
-            "id": self.get_next_id(),
-            "is_section": is_section,
-            "parent_section_id": parent_id,
-        }
-        if is_section:
-            note["collapsed"] = True
-        if pdf_path:
-            note["pdf_path"] = pdf_path
-        self.notes.append(note)
-        self.save_notes()
-        return note
-
-    def delete_note(self, note_id):
-        note = next((n for n in self.notes if n["id"] == note_id), None)
-        if not note:
-            return
-        if note.get("is_section"):
-            # Remove children
-            self.notes = [n for n in self.notes if n.get("parent_section_id") != note_id]
-        self.notes = [n for n in self.notes if n["id"] != note_id]
-        self.save_notes()
-
-    def get_next_id(self):
-        if not self.notes:
-            return 1
-        return max(n["id"] for n in self.notes) + 1
-
-    def save_theme(self, theme):
-        # Load existing data if file exists
-        data = {}
-        if os.path.exists(self.data_file):
-            with open(self.data_file, "r") as f:
-                try:
-                    data = json.load(f)
-                except:
-                    data = {}
-
-        data["theme"] = theme
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, "w") as f:
-            json.dump(data, f, indent=2)
-
-    def load_theme(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, "r") as f:
-                try:
-                    data = json.load(f)
-                    return data.get("theme", "Light")
-                except:
-                    return "Light"
-        return "Light"
-
+import threading
+from contextlib import contextmanager, nullcontext
+
+from history import DEFAULT_BUDGET, History
+from notes import FIELDS, Note
+from order_keys import MAX_KEY_LENGTH, key_between, sequential_keys
+from perf import timed
+from search import SearchIndex
+from storage import JsonStorage
+from write_behind import WriteBehind
+
+FIRST_SCREEN_NOTES = 200   # notes parsed before the window is shown in lazy mode
+LOAD_CHUNK = 5000          # notes parsed per background step after that
+ID_BLOCK = 32              # ids claimed at a time from the counter shared with other processes
+BULK_ID_BLOCK = 1024       # the same during bulk_add, so an import takes the file lock rarely
+
+
+def insert_sorted(siblings, note):
+    # Siblings stay sorted by order key; appends (the common case) skip the search
+    key = note.order
+    if not siblings or siblings[-1].order <= key:
+        siblings.append(note)
+        return
+    lo, hi = 0, len(siblings)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if siblings[mid].order <= key:
+            lo = mid + 1
+        else:
+            hi = mid
+    siblings.insert(lo, note)
+
+
+def index_of(siblings, note):
+    # Binary search on the order key, then step over equal keys to the note itself
+    key = note.order
+    lo, hi = 0, len(siblings)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if siblings[mid].order < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    while siblings[lo] is not note:
+        lo += 1
+    return lo
+
+
+class NotesManager:
+    """
+    Notes are kept in three indexes instead of one flat list:
+    - by_id: note id -> note
+    - children: parent id (None for top level) -> notes sorted by their "order" key
+      (see order_keys.py), so a move rewrites one note and never renumbers the rest
+    - next_id: counter persisted with the notes, so adding never scans
+    `notes` flattens them back into display order (sections followed by their children).
+    Notes are Note objects (notes.py); storage and operation records see plain dicts.
+    Storage may hand over notes without their text; those ids sit in `unloaded`
+    until a lookup needs them (see load_bodies).
+    With write_delay set, writes go through WriteBehind: mutations return at once
+    and bursts of them are saved together in the background.
+    With lazy set (and a backend that can stream), only the first screen of notes
+    is parsed up front; the caller pulls the rest in chunks with load_more().
+    With a pdf_index, the text of attached PDFs is searchable too.
+    Every mutation also lands in `history` with the records that reverse it,
+    so undo()/redo() replay a few records instead of restoring copies.
+    Other processes may edit the same notes: external_changes() + merge() bring
+    their edits in as operation records, with ours re-applied on top.
+    """
+
+    def __init__(self, data_file, storage=None, write_delay=None, lazy=False, pdf_index=None,
+                 undo_budget=DEFAULT_BUDGET):
+        self.data_file = data_file
+        self.storage = storage or JsonStorage(data_file)
+        if write_delay is not None:
+            self.storage = WriteBehind(self.storage, write_delay)
+        # Held while the notes change and while a snapshot is taken, so a
+        # background writer never copies a half-applied operation
+        self.lock = threading.RLock()
+        self.by_id = {}
+        self.children = {None: []}
+        self.next_id = 1
+        self.reserved = self.reserved_end = 0   # ids claimed for this process (see get_next_id)
+        self.unloaded = set()
+        self.legacy_settings = {}
+        self.lazy = lazy
+        self.stream = None
+        # Backends with their own full-text search don't need the in-memory index
+        self.search_index = None if getattr(self.storage, "full_text", False) else SearchIndex()
+        self.pdf_index = pdf_index
+        self.history = History(undo_budget)
+        self.load_notes()
+
+    @property
+    def notes(self):
+        flat = []
+        for note in self.children[None]:
+            flat.append(note)
+            flat.extend(self.children.get(note.id, ()))
+        # Children whose section no longer exists (or is not top level) still get saved
+        for parent_id, notes in self.children.items():
+            parent = self.by_id.get(parent_id)
+            if parent_id is not None and (parent is None or parent.parent is not None):
+                flat.extend(notes)
+        return flat
+
+    @timed("load")
+    def load_notes(self):
+        self.by_id = {}
+        self.children = {None: []}
+        self.unloaded = set()
+        self.next_id = 1
+        self.history.clear()
+
+        stream = None
+        if self.lazy and hasattr(self.storage, "open_stream"):
+            stream = self.storage.open_stream()
+        if stream is None:
+            self.load_all()
+            return
+        self.stream = stream
+        self.load_more(FIRST_SCREEN_NOTES)
+
+    def load_all(self):
+        data, ops = self.storage.load()
+        self.add_loaded(data.get("notes", []))
+        self.finish_load(data, ops)
+        if self.search_index is not None:
+            self.search_index.rebuild(self.notes)
+
+    def add_loaded(self, records):
+        # Stored dicts -> Note objects in the indexes; returns the notes
+        notes = []
+        for record in records:
+            note = Note.from_dict(record)
+            if "text" not in record:
+                self.unloaded.add(note.id)
+            self.by_id[note.id] = note
+            siblings = self.children.setdefault(note.parent, [])
+            if note.order is None:
+                # Files from before order keys: the position in the file is the order
+                note.order = key_between(siblings[-1].order if siblings else None, None)
+            insert_sorted(siblings, note)
+            self.next_id = max(self.next_id, note.id + 1)
+            if self.pdf_index is not None and note.pdf_path:
+                self.pdf_index.track(note.id, note.pdf_path)
+            notes.append(note)
+        return notes
+
+    def finish_load(self, data, ops):
+        self.next_id = max(self.next_id, data.get("next_id", 1))
+        # Preferences older versions kept in the notes file; Settings takes them over
+        self.legacy_settings = {k: data[k] for k in ("theme",) if k in data}
+        # Changes recorded after the last snapshot
+        for op in ops:
+            self.apply(op)
+
+    @property
+    def loading(self):
+        return self.stream is not None
+
+    @timed("load chunk")
+    def load_more(self, count=LOAD_CHUNK):
+        """Parse the next chunk of a lazy load. Returns True once everything is in."""
+        with self.lock:
+            if self.stream is None:
+                return True
+            try:
+                records = self.stream.take(count)
+            except ValueError:
+                # Damaged file: let the regular loader deal with it
+                self.stream.close()
+                self.stream = None
+                self.load_all()
+                return True
+
+            notes = self.add_loaded(records)
+            if self.search_index is not None:
+                for note in notes:
+                    self.search_index.add(note.id, note.text)
+            if not self.stream.done:
+                return False
+
+            extra, self.stream = self.stream.extra, None
+            self.finish_load(extra, self.storage.load_ops(extra))
+            return True
+
+    def finish_loading(self):
+        while not self.load_more():
+            pass
+
+    def load_bodies(self, note_ids=None):
+        # Fetch text the storage held back at load time (all of it by default)
+        wanted = self.unloaded if note_ids is None else self.unloaded.intersection(note_ids)
+        if not wanted:
+            return
+        for note_id, text in self.storage.load_texts(list(wanted)).items():
+            self.by_id[note_id].text = text
+            if self.search_index is not None:
+                self.search_index.add(note_id, text)
+        self.unloaded -= wanted
+
+    @timed("save")
+    def save_notes(self):
+        self.storage.save(self.snapshot())
+
+    def snapshot(self):
+        # Copies, so the result can be serialised while the notes keep changing
+        with self.lock:
+            self.finish_loading()
+            self.load_bodies()
+            return {"notes": [n.to_dict() for n in self.notes], "next_id": self.next_id}
+
+    @property
+    def pending_writes(self):
+        return getattr(self.storage, "pending_writes", 0)
+
+    @property
+    def write_error(self):
+        # Why the last background write failed; None once a write goes through again
+        return getattr(self.storage, "error", None)
+
+    def flush(self):
+        # Write anything the write-behind layer is still holding
+        if hasattr(self.storage, "flush"):
+            self.storage.flush()
+
+    def batch(self):
+        # Group several mutations into one storage write / transaction
+        return self.storage.batch()
+
+    def close(self):
+        if not self.loading:
+            self.flush()
+            if self.unwritten():
+                # Changes held back behind another process's save go in on top of it
+                with self.synced():
+                    pass
+        if self.pdf_index is not None:
+            # Cache entries of notes not read yet are not stale
+            self.pdf_index.close(prune=not self.loading)
+        if self.stream is not None:
+            self.stream.close()
+        self.storage.close()
+
+    def get_note(self, note_id):
+        return self.by_id.get(note_id)
+
+    def get_children(self, parent_id):
+        children = self.children.get(parent_id, [])
+        if self.unloaded and children:
+            self.load_bodies(n.id for n in children)
+        return children
+
+    # ---------- Mutations ----------
+    # Each one is an operation record: applied to the indexes, then handed to storage.
+    def record(self, op):
+        with self.lock:
+            # Changes must land after everything already on disk
+            self.finish_loading()
+            self.history.add(op, self.inverse(op))
+            result = self.apply(op)
+            self.storage.append(op, self)
+        return result
+
+    def action(self):
+        # Mutations inside form one undo step
+        return self.history.group()
+
+    def add_note(self, text, is_section=False, parent_id=None, pdf_path=None):
+        with self.lock, self.action():
+            # Ids and keys come after the last note on disk, so finish a lazy load first
+            self.finish_loading()
+            note = Note(self.get_next_id(), text, is_section, parent_id,
+                        collapsed=True if is_section else None, pdf_path=pdf_path or None)
+            note.order = self.order_key(parent_id, None, note)
+            return self.record({"op": "add", "note": note.to_dict()})
+
+    def update_note(self, note_id, **fields):
+        if note_id not in self.by_id:
+            return None
+        return self.record({"op": "update", "id": note_id, "fields": fields})
+
+    def delete_note(self, note_id):
+        if note_id not in self.by_id:
+            return
+        self.record({"op": "delete", "id": note_id})
+
+    def move_note(self, note_id, parent_id=None, before_id=None):
+        """Move a note under parent_id, in front of before_id (None = at the end)."""
+        with self.lock, self.action():
+            self.finish_loading()
+            note = self.by_id.get(note_id)
+            if note is None or note_id == before_id:
+                return
+            before = self.by_id.get(before_id)
+            if before is None or before.parent != (parent_id or None):
+                before_id = None   # not a sibling (say, the next section's header): the end
+            if note.parent == (parent_id or None):
+                siblings = self.children[note.parent]
+                i = index_of(siblings, note)
+                if (siblings[i + 1].id if i + 1 < len(siblings) else None) == before_id:
+                    return   # already there; no record, no undo step
+            # One record carrying the note's new key; its siblings are left alone
+            order = self.order_key(parent_id, before_id, note)
+            self.record({"op": "move", "id": note_id, "parent": parent_id, "order": order})
+
+    # ---------- Bulk Import ----------
+    def bulk_add(self, records, orphans=None):
+        """
+        Add many notes at once (see bulk_io.py). Records are consumed as they come:
+        {"is_section": True, "text": title, "ref": r} opens a new section,
+        {"text": ..., "section": r} adds a note to the section opened with ref r,
+        or to the top-level section titled r (created if missing); no "section" = top level.
+        A ref that is not a title and opened no section (a JSONL parent id missing from
+        the file) leaves the note at top level; such records are added to `orphans`.
+        Everything lands in one storage batch; the search index is rebuilt once at the end.
+        Returns the number of notes (sections included) added.
+        """
+        added = 0
+        with self.lock, self.action():
+            self.finish_loading()
+            sections = {n.text: n.id for n in self.children[None] if n.is_section}
+            with self.batch():
+                for record in records:
+                    if record.get("is_section"):
+                        note = self.bulk_note(record, None)
+                        sections[record.get("ref", record["text"])] = note.id
+                    else:
+                        ref = record.get("section")
+                        parent_id = None
+                        if ref is not None:
+                            parent_id = sections.get(ref)
+                            if parent_id is None and isinstance(ref, str):
+                                parent_id = self.bulk_note({"is_section": True, "text": ref}, None).id
+                                sections[ref] = parent_id
+                                added += 1
+                            elif parent_id is None and orphans is not None:
+                                orphans.append(record)
+                        self.bulk_note(record, parent_id)
+                    added += 1
+            if self.search_index is not None:
+                self.search_index.rebuild(self.notes)
+        return added
+
+    def bulk_note(self, record, parent_id):
+        # apply(add) without the per-note search index update
+        fields = {k: v for k, v in record.items() if k not in ("ref", "section", "order")}
+        note = Note.from_dict(dict(fields, id=self.get_next_id(BULK_ID_BLOCK), parent_section_id=parent_id))
+        if note.is_section and note.collapsed is None:
+            note.collapsed = True
+        siblings = self.children.setdefault(parent_id, [])
+        note.order = key_between(siblings[-1].order if siblings else None, None)
+        self.next_id = max(self.next_id, note.id + 1)
+        self.by_id[note.id] = note
+        siblings.append(note)
+        if self.pdf_index is not None and note.pdf_path:
+            self.pdf_index.track(note.id, note.pdf_path)
+        op = {"op": "add", "note": note.to_dict()}
+        self.history.add(op, [{"op": "delete", "id": note.id}])
+        self.storage.append(op, self)
+        return note
+
+    def iter_notes(self):
+        """Display order, one note at a time (exports stream from this)."""
+        for note in self.get_children(None):
+            yield note
+            yield from self.get_children(note.id)
+
+    # ---------- Undo / Redo ----------
+    def inverse(self, op):
+        # Records that put things back the way they are before `op` is applied
+        kind = op["op"]
+        if kind == "add":
+            return [{"op": "delete", "id": op["note"]["id"]}]
+        if kind == "rebalance":
+            return [{"op": "rebalance", "parent": op["parent"],
+                     "orders": [[note_id, self.by_id[note_id].order]
+                                for note_id, _ in op["orders"] if note_id in self.by_id]}]
+        note = self.by_id.get(op["id"])
+        if note is None:
+            return []
+        if kind == "update":
+            if "text" in op["fields"]:
+                self.load_bodies([note.id])
+            extra = note.extra or {}
+            old = {k: getattr(note, k) if k in FIELDS else extra.get(k) for k in op["fields"]}
+            return [{"op": "update", "id": note.id, "fields": old}]
+        if kind == "move":
+            return [{"op": "move", "id": note.id, "parent": note.parent, "order": note.order}]
+        # delete: re-add the note and (for a section) its children, same ids and keys
+        removed = [note] + (self.children.get(note.id, []) if note.is_section else [])
+        self.load_bodies(n.id for n in removed)
+        return [{"op": "add", "note": n.to_dict()} for n in removed]
+
+    def undo(self):
+        """Reverse the last action. Returns the records applied (None if nothing to undo)."""
+        with self.lock:
+            self.finish_loading()
+            ops = self.history.undo_ops()
+            if ops is not None:
+                self.replay(ops)
+                self.history.undone()
+        return ops
+
+    def redo(self):
+        with self.lock:
+            self.finish_loading()
+            ops = self.history.redo_ops()
+            if ops is not None:
+                self.replay(ops)
+                self.history.redone()
+        return ops
+
+    def replay(self, ops):
+        # Applied and stored like any change, but not recorded as a new action
+        with self.batch():
+            for op in ops:
+                self.apply(op)
+                self.storage.append(op, self)
+
+    # ---------- Other Processes ----------
+    def external_changes(self):
+        """
+        What other processes wrote since the last merge, as (ops, token) for merge().
+        ops ends with our own changes not on disk yet, so they land on top of theirs.
+        ops is empty when nothing changed (or the notes are still loading).
+        """
+        changes = getattr(self.storage, "changes", None)
+        if changes is None or self.loading:
+            return [], None
+        with self.lock:
+            # Taken first: anything written meanwhile shows up in the storage's answer instead
+            mine = self.unwritten()
+            ops, token = changes(self)
+        return (ops + mine if ops else []), token
+
+    def merge(self, ops, token):
+        if token is None:
+            return
+        with self.lock:
+            for op in ops:
+                self.apply(op)
+            self.storage.merged(token, self)
+
+    @contextmanager
+    def synced(self):
+        """
+        Merge what other processes wrote, then keep them from saving until the block ends
+        (as far as the storage has a file lock), so the notes in memory are all there are.
+        """
+        self.flush()
+        with self.lock, getattr(self.storage, "file_lock", nullcontext()):
+            self.merge(*self.external_changes())
+            yield
+
+    def unwritten(self):
+        return getattr(self.storage, "unwritten", list)()
+
+    def watch_paths(self):
+        return getattr(self.storage, "watch_paths", list)()
+
+    def diff(self, records):
+        """Records that turn the notes in memory into `records` (stored dicts); deletes come last."""
+        ops = []
+        seen = set()
+        for record in records:
+            note_id = record["id"]
+            seen.add(note_id)
+            note = self.by_id.get(note_id)
+            if note is None:
+                ops.append({"op": "add", "note": record})
+                continue
+            theirs = Note.from_dict(record)
+            fields = {}
+            # Text not loaded yet will be read fresh anyway; collapse state is per window
+            if "text" in record and note_id not in self.unloaded and theirs.text != note.text:
+                fields["text"] = theirs.text
+            if theirs.is_section != note.is_section:
+                fields["is_section"] = theirs.is_section
+            if (theirs.pdf_path or None) != (note.pdf_path or None):
+                fields["pdf_path"] = theirs.pdf_path
+            ours_extra, theirs_extra = note.extra or {}, theirs.extra or {}
+            for key in ours_extra.keys() | theirs_extra.keys():
+                if ours_extra.get(key) != theirs_extra.get(key):
+                    fields[key] = theirs_extra.get(key)
+            if fields:
+                ops.append({"op": "update", "id": note_id, "fields": fields})
+            if theirs.parent != note.parent or (theirs.order is not None and theirs.order != note.order):
+                ops.append({"op": "move", "id": note_id, "parent": theirs.parent, "order": theirs.order})
+        ops.extend({"op": "delete", "id": note_id} for note_id in self.by_id if note_id not in seen)
+        return ops
+
+    # ---------- Order Keys ----------
+    def order_key(self, parent_id, before_id, note):
+        # Key for `note` placed under parent_id in front of before_id (None = at the end)
+        key = self.key_before(parent_id, before_id, note)
+        if key is None or len(key) > MAX_KEY_LENGTH:
+            self.rebalance(parent_id)
+            key = self.key_before(parent_id, before_id, note)
+        return key
+
+    def key_before(self, parent_id, before_id, note):
+        siblings = self.children.get(parent_id, [])
+        before = self.by_id.get(before_id)
+        if before is None or before.parent != parent_id:
+            prev = siblings[-1] if siblings else None
+            if prev is note:
+                prev = siblings[-2] if len(siblings) > 1 else None
+            return key_between(prev and prev.order, None)
+        i = index_of(siblings, before)
+        prev = siblings[i - 1] if i > 0 else None
+        if prev is note:
+            prev = siblings[i - 2] if i > 1 else None
+        if prev is not None and prev.order >= before.order:
+            return None   # duplicate keys (e.g. merged edits): needs a rebalance
+        return key_between(prev and prev.order, before.order)
+
+    def rebalance(self, parent_id):
+        # Fresh short keys for every sibling, in their current order, as one record
+        siblings = self.children.get(parent_id, [])
+        keys = sequential_keys(len(siblings))
+        self.record({"op": "rebalance", "parent": parent_id,
+                     "orders": [[n.id, key] for n, key in zip(siblings, keys)]})
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "add":
+            if op["note"]["id"] in self.by_id:
+                # Already applied (a snapshot may be newer than its journal)
+                return self.by_id[op["note"]["id"]]
+            note = Note.from_dict(op["note"])
+            if note.order is None:
+                # Recorded before order keys existed: adds went to the end
+                note.order = op["note"]["order"] = self.key_before(note.parent, None, None)
+            self.next_id = max(self.next_id, note.id + 1)
+            self.by_id[note.id] = note
+            insert_sorted(self.children.setdefault(note.parent, []), note)
+            if self.search_index is not None:
+                self.search_index.add(note.id, note.text)
+            if self.pdf_index is not None and note.pdf_path:
+                self.pdf_index.track(note.id, note.pdf_path)
+            return note
+
+        if kind == "rebalance":
+            # New keys keep the siblings' order, so the list itself doesn't change
+            for note_id, key in op["orders"]:
+                if note_id in self.by_id:
+                    self.by_id[note_id].order = key
+            return None
+
+        note = self.by_id.get(op["id"])
+        if note is None:
+            return None
+
+        if kind == "update":
+            resort = "order" in op["fields"] or "parent_section_id" in op["fields"]
+            if resort:
+                siblings = self.children[note.parent]
+                del siblings[index_of(siblings, note)]
+            note.update(op["fields"])
+            if resort:
+                insert_sorted(self.children.setdefault(note.parent, []), note)
+            if "text" in op["fields"]:
+                self.unloaded.discard(note.id)
+                if self.search_index is not None:
+                    self.search_index.update(note.id, note.text)
+            if "pdf_path" in op["fields"] and self.pdf_index is not None:
+                self.pdf_index.track(note.id, note.pdf_path)
+        elif kind == "delete":
+            if note.is_section:
+                # Remove children
+                removed = self.children.pop(note.id, [])
+            else:
+                removed = []
+            siblings = self.children[note.parent]
+            del siblings[index_of(siblings, note)]
+            removed.append(note)
+            for gone in removed:
+                del self.by_id[gone.id]
+                self.unloaded.discard(gone.id)
+                if self.search_index is not None:
+                    self.search_index.remove(gone.id)
+                if self.pdf_index is not None:
+                    self.pdf_index.untrack(gone.id)
+        elif kind == "move":
+            if "order" not in op:
+                # Recorded before order keys existed: placed by its right-hand neighbour
+                op["order"] = self.key_before(op["parent"], op.pop("before", None), note)
+            old_siblings = self.children[note.parent]
+            del old_siblings[index_of(old_siblings, note)]
+            note.parent_section_id = op["parent"]
+            note.order = op["order"] or key_between(None, None)
+            insert_sorted(self.children.setdefault(op["parent"], []), note)
+        return note
+
+    @timed("search")
+    def search(self, query, limit=None):
+        if self.search_index is None:
+            self.flush()   # the backend only finds what it has been given
+            hits = self.storage.search(query, limit=limit)
+        else:
+            hits = self.search_index.search(query, limit=limit)
+        if self.pdf_index is None or (limit is not None and len(hits) >= limit):
+            return hits
+        # Notes whose attachment matches come after notes whose own text does
+        seen = set(hits)
+        for note_id in self.pdf_index.search(query, limit=limit):
+            if note_id not in seen and note_id in self.by_id:
+                hits.append(note_id)
+        return hits if limit is None else hits[:limit]
+
+    @timed("search")
+    def match_ids(self, query):
+        """Set of the ids of the notes matching `query`, unranked: what the list filter needs."""
+        if self.search_index is None:
+            self.flush()
+            hits = set(self.storage.search(query))
+        else:
+            hits = self.search_index.match_ids(query)
+        if self.pdf_index is not None:
+            # Notes whose attachment matches count too
+            hits = hits.union(n for n in self.pdf_index.match_ids(query) if n in self.by_id)
+        return hits
+
+    def get_next_id(self, block=ID_BLOCK):
+        # With a shared counter in the storage, ids come from blocks this process claimed,
+        # so two processes adding at the same time never pick the same id
+        reserve = getattr(self.storage, "reserve_ids", None)
+        if reserve is None:
+            return self.next_id
+        start = max(self.reserved, self.next_id)
+        if start >= self.reserved_end:
+            start = reserve(self.next_id, block)
+            self.reserved_end = start + block
+        self.reserved = start
+        return start
@@ -0,0 +1,121 @@
+# Fractional order keys: strings that sort in display order, with a new key
+# available between any two. A move only rewrites the moved note's key.
+# Keys are an integer part (head letter giving its length, then base-62 digits)
+# plus an optional fraction, so appending keeps keys short (a0, a1, ..., az, b10, ...)
+# and only repeated inserts into the same gap make them grow.
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+INTEGER_ZERO = "a0"
+SMALLEST_INTEGER = "A" + "0" * 26
+MAX_KEY_LENGTH = 24   # siblings get fresh keys (rebalance) once a key grows past this
+
+
+def integer_length(head):
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"invalid order key head: {head!r}")
+
+
+def integer_part(key):
+    length = integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"invalid order key: {key!r}")
+    return key[:length]
+
+
+def increment_integer(value):
+    head, digits = value[0], list(value[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = "0"
+    # Carried out of every digit: one more digit (or one less, below zero)
+    if head == "Z":
+        return INTEGER_ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append("0")
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def decrement_integer(value):
+    head, digits = value[0], list(value[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def midpoint(a, b):
+    # Fraction strictly between fractions a and b (b None = 1); no trailing zeros
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n:
+            return b[:n] + midpoint(a[n:], b[n:])
+    da = DIGITS.index(a[0]) if a else 0
+    db = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if db - da > 1:
+        return DIGITS[(da + db + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[da] + midpoint(a[1:], None)
+
+
+def key_between(a, b):
+    """A key sorting after a and before b (either may be None for "no neighbour")."""
+    if a is None and b is None:
+        return INTEGER_ZERO
+    if a is None:
+        ib = integer_part(b)
+        if ib == SMALLEST_INTEGER:
+            return ib + midpoint("", b[len(ib):])
+        if ib < b:
+            return ib
+        result = decrement_integer(ib)
+        if result is None:
+            raise ValueError("no order key left before " + b)
+        return result
+    ia = integer_part(a)
+    fa = a[len(ia):]
+    if b is None:
+        result = increment_integer(ia)
+        return ia + midpoint(fa, None) if result is None else result
+    ib = integer_part(b)
+    if ia == ib:
+        return ia + midpoint(fa, b[len(ib):])
+    result = increment_integer(ia)
+    if result is None:
+        raise ValueError("no order key left after " + a)
+    return result if result < b else ia + midpoint(fa, None)
+
+
+def sequential_keys(count):
+    """`count` short, evenly stepped keys: what rebalancing hands out."""
+    keys = []
+    key = None
+    for _ in range(count):
+        key = key_between(key, None)
+        keys.append(key)
+    return keys
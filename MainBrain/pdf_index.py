@@ -0,0 +1,219 @@
+import importlib.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from search import SearchIndex
+from storage import read_json, write_json_atomic
+
+MAX_WORKERS = 4
+
+# Checked once: without pypdf or PyMuPDF (see pdf_utils.extract_text) no PDF has text to wait for
+HAS_PDF_READER = any(importlib.util.find_spec(name) is not None for name in ("pypdf", "fitz"))
+
+
+def pdf_cache_path_for(data_file):
+    return os.path.join(os.path.dirname(data_file), "cache", "pdf_text.json")
+
+
+def file_key(path):
+    # [mtime, size] identifies a version of the file; None if it is gone
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class PdfIndex:
+    """
+    Searchable text of attached PDFs, keyed by note id.
+    Text is extracted in a process pool and cached in `cache_file` by path,
+    mtime and size, so a PDF is only read again after it changes.
+    track() and refresh() only queue work: a background thread reads the cache
+    (on its first run, so a big cache never delays the window), checks the files
+    and indexes cached text; the pool's callback thread indexes fresh text.
+    Without a PDF reader installed no pool is started and PDFs simply have no text.
+    """
+
+    def __init__(self, cache_file, extract=None, max_workers=MAX_WORKERS):
+        self.cache_file = cache_file
+        self.extract = extract
+        self.can_extract = extract is not None or HAS_PDF_READER
+        self.max_workers = max_workers
+        self.cache = None                    # path -> {"key": [mtime_ns, size], "text": ...}, once read
+        self.index = SearchIndex()
+        self.paths = {}                      # note id -> pdf path
+        self.indexed = {}                    # note id -> (path, key) of the version in the index
+        self.queue = {}                      # note id -> path still to check
+        self.waiting = {}                    # path -> note ids waiting for its text
+        self.active = 0
+        self.extractions = 0
+        self.dirty = False
+        self.closed = False
+
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.save_lock = threading.Lock()
+        self.thread = None
+        self.executor = None
+
+    @property
+    def pending(self):
+        with self.lock:
+            return len(self.queue) + len(self.waiting) + self.active
+
+    def track(self, note_id, path):
+        """Index the PDF at `path` for note_id (path None/"" stops indexing it)."""
+        with self.lock:
+            if not path:
+                self.queue.pop(note_id, None)
+                if self.paths.pop(note_id, None) is not None:
+                    self.indexed.pop(note_id, None)
+                    self.index.remove(note_id)
+                return
+            self.paths[note_id] = path
+            self.queue[note_id] = path
+            self.wake()
+
+    def untrack(self, note_id):
+        self.track(note_id, None)
+
+    def refresh(self):
+        """Re-check every attachment; only files whose mtime or size changed are read again."""
+        with self.lock:
+            self.queue.update(self.paths)
+            self.wake()
+
+    def wake(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="pdf-index", daemon=True)
+            self.thread.start()
+        self.cond.notify()
+
+    # ---------- Background ----------
+    def run(self):
+        cache = read_json(self.cache_file)
+        with self.lock:
+            self.cache = cache
+        while True:
+            with self.lock:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                note_id = next(iter(self.queue))
+                path = self.queue.pop(note_id)
+                self.active += 1
+            try:
+                self.check(note_id, path, file_key(path))
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+    def check(self, note_id, path, key):
+        text = None
+        with self.lock:
+            if self.paths.get(note_id) != path:
+                return
+            entry = self.cache.get(path)
+            if key is None:
+                self.indexed.pop(note_id, None)
+                text = ""
+            elif entry is not None and entry["key"] == key:
+                if self.indexed.get(note_id) == (path, key):
+                    return
+                self.indexed[note_id] = (path, key)
+                text = entry["text"]
+            elif not self.can_extract:
+                # Not cached: a reader installed later still gets to read the file
+                self.indexed.pop(note_id, None)
+                text = ""
+            elif path in self.waiting:
+                self.waiting[path].add(note_id)
+            else:
+                self.waiting[path] = {note_id}
+                self.submit(path, key)
+        if text is not None:
+            self.index_text([note_id], path, text)
+
+    def submit(self, path, key):
+        if self.executor is None:
+            if self.extract is None:
+                from pdf_utils import extract_text   # first PDF that needs reading
+                self.extract = extract_text
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.extractions += 1
+        future = self.executor.submit(self.extract, path)
+        future.add_done_callback(lambda f: self.extracted(path, key, f))
+
+    def extracted(self, path, key, future):
+        try:
+            text = future.result()
+        except Exception:
+            # Unreadable PDF: remember that, so it is not retried until the file changes
+            text = ""
+        with self.lock:
+            if self.closed:
+                return
+            self.cache[path] = {"key": key, "text": text}
+            self.dirty = True
+            note_ids = [n for n in self.waiting.pop(path, ()) if self.paths.get(n) == path]
+            for note_id in note_ids:
+                self.indexed[note_id] = (path, key)
+            self.active += 1
+        try:
+            self.index_text(note_ids, path, text)
+        finally:
+            with self.lock:
+                self.active -= 1
+                done = not self.waiting
+        if done:
+            # Bulk indexing finished: one cache write for the whole batch
+            self.save()
+
+    def index_text(self, note_ids, path, text):
+        # Tokenising can take a while for big PDFs; done outside self.lock so track() never waits on it
+        for note_id in note_ids:
+            if text:
+                self.index.update(note_id, text)
+            else:
+                self.index.remove(note_id)
+            with self.lock:
+                if self.paths.get(note_id) != path:
+                    # Detached or re-pointed meanwhile
+                    self.index.remove(note_id)
+
+    # ---------- Cache File ----------
+    def save(self, prune=False):
+        with self.save_lock:
+            with self.lock:
+                if self.cache is None:
+                    return   # never read (no attachment tracked): nothing to write
+                if prune:
+                    # Drop entries for files no note points at anymore
+                    used = set(self.paths.values())
+                    stale = [path for path in self.cache if path not in used]
+                    for path in stale:
+                        del self.cache[path]
+                    self.dirty = self.dirty or bool(stale)
+                if not self.dirty:
+                    return
+                data = dict(self.cache)
+                self.dirty = False
+            write_json_atomic(self.cache_file, data)
+
+    def search(self, query, limit=None):
+        return self.index.search(query, limit=limit)
+
+    def match_ids(self, query):
+        return self.index.match_ids(query)
+
+    def close(self, prune=True):
+        with self.lock:
+            self.closed = True
+            self.cond.notify()
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.save(prune=prune)
@@ -1,10 +1,41 @@
-import os
-import subprocess
-import sys
-
-def open_pdf(path):
-    if os.path.exists(path):
-        if os.name == "nt":  # Windows
-            os.startfile(path)
-        elif os.name == "posix":  # macOS/Linux
-            subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
+import os
+import subprocess
+import sys
+
+def open_pdf(path):
+    if os.path.exists(path):
+        if os.name == "nt":  # Windows
+            os.startfile(path)
+        elif os.name == "posix":  # macOS/Linux
+            subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
+
+
+def extract_text(path):
+    # Runs in a worker process (see pdf_index.py). pypdf or PyMuPDF, whichever is installed;
+    # without either, attachments simply aren't searchable.
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        try:
+            import fitz
+        except ImportError:
+            return ""
+        with fitz.open(path) as doc:
+            return "\n".join(page.get_text() for page in doc)
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def render_first_page(path, out_path, size):
+    # Runs in a worker process (see thumbnails.py). Needs PyMuPDF; without it there are no previews.
+    try:
+        import fitz
+    except ImportError:
+        return False
+    with fitz.open(path) as doc:
+        if not doc.page_count:
+            return False
+        page = doc[0]
+        zoom = min(size[0] / page.rect.width, size[1] / page.rect.height)
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(out_path)
+    return True
@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Timings of the app's hot paths: loading, saving, rendering, search and drag.
+# Hooks always record (two clock reads per call); nothing is shown unless a
+# FrameMonitor is attached, which app.py does for PERF_OUTPUT / $WORKNOTES_PERF.
+
+PERF_ENV = "WORKNOTES_PERF"   # comma-separated: "overlay" (corner of the window), "log" (stderr)
+OVERLAY_HOOKS = 4             # hooks named in the overlay, costliest first
+
+
+class Recorder:
+    """
+    Totals per hook name (calls, seconds, worst call), plus the seconds spent in each
+    during the current frame. Hooks on worker threads (search) record too.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}   # name -> [calls, seconds, worst]
+        self.frame = {}    # name -> seconds since the last take_frame()
+        self.frame_total = 0
+        self.on_record = None
+
+    def add(self, name, seconds, outer=True):
+        with self.lock:
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, seconds, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+                total[2] = max(total[2], seconds)
+            self.frame[name] = self.frame.get(name, 0) + seconds
+            if outer:
+                # Hooks inside hooks (render -> refresh) count once in the frame's total
+                self.frame_total += seconds
+        if self.on_record is not None:
+            self.on_record()
+
+    def take_frame(self):
+        """(seconds in hooks, {name: seconds}) since the last call."""
+        with self.lock:
+            frame, self.frame = self.frame, {}
+            total, self.frame_total = self.frame_total, 0
+        return total, frame
+
+    def summary(self):
+        """{name: (calls, total ms, worst ms)}"""
+        with self.lock:
+            return {name: (calls, seconds * 1000, worst * 1000)
+                    for name, (calls, seconds, worst) in self.totals.items()}
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+            self.frame.clear()
+            self.frame_total = 0
+
+
+RECORDER = Recorder()
+nesting = threading.local()
+
+
+@contextmanager
+def measure(name):
+    depth = getattr(nesting, "depth", 0)
+    nesting.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        nesting.depth = depth
+        # A search on a worker thread isn't time the window waited for
+        outer = depth == 0 and threading.current_thread() is threading.main_thread()
+        RECORDER.add(name, time.perf_counter() - start, outer)
+
+
+def timed(name):
+    """Decorator: record every call of the function under `name`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_widgets(root):
+    # Every Tk widget alive under root, root included
+    count = 0
+    stack = [root]
+    while stack:
+        widget = stack.pop()
+        count += 1
+        stack.extend(widget.winfo_children())
+    return count
+
+
+def output_modes(default=""):
+    return {mode.strip() for mode in os.environ.get(PERF_ENV, default).split(",") if mode.strip()}
+
+
+# ---------- Per-Frame Output ----------
+class FrameMonitor:
+    """
+    Once per frame (when Tk next goes idle after a hook ran), shows what the hooks
+    cost during it and how many widgets are alive: in a label over the bottom-right
+    corner ("overlay"), on stderr ("log"), or both.
+    """
+
+    def __init__(self, root, modes, recorder=RECORDER):
+        self.root = root
+        self.recorder = recorder
+        self.log = "log" in modes
+        self.label = None
+        if "overlay" in modes:
+            import tkinter   # the command-line tools import this module too
+            self.label = tkinter.Label(root, font=("TkFixedFont", 9), fg="#E0E0E0", bg="#202020",
+                                       anchor="e", padx=4)
+            self.label.place(relx=1.0, rely=1.0, anchor="se")
+        self.main_thread = threading.current_thread()
+        self.scheduled = False
+        recorder.take_frame()
+        recorder.on_record = self.frame_touched
+
+    def frame_touched(self):
+        # Tk calls only from its own thread; a worker's timing shows up with the next frame
+        if not self.scheduled and threading.current_thread() is self.main_thread:
+            self.scheduled = True
+            self.root.after_idle(self.end_frame)
+
+    def end_frame(self):
+        self.scheduled = False
+        total, frame = self.recorder.take_frame()
+        if not frame:
+            return
+        costs = sorted(frame.items(), key=lambda item: -item[1])
+        parts = [f"frame {total * 1000:.1f} ms"]
+        parts += [f"{name} {seconds * 1000:.1f}" for name, seconds in costs[:OVERLAY_HOOKS]]
+        parts.append(f"widgets {count_widgets(self.root)}")
+        text = "  ".join(parts)
+        if self.label is not None:
+            self.label.configure(text=text)
+            self.label.lift()
+        if self.log:
+            print(text, file=sys.stderr)
+
+    def close(self):
+        if self.recorder.on_record == self.frame_touched:
+            self.recorder.on_record = None
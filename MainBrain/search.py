@@ -0,0 +1,251 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# How much a match counts depending on how the query term hit the token
+EXACT_WEIGHT = 3.0
+PREFIX_WEIGHT = 2.0
+INFIX_WEIGHT = 1.0
+MIN_PREFIX_LENGTH = 2    # single letters only match whole tokens
+MIN_INFIX_LENGTH = 3     # trigram lookups need at least one full trigram
+AVERAGE_TOKENS = 8       # rough tokens per note, to pick the cheaper way to narrow results
+CHECK_COST = 16          # match_ids: checking one note's own tokens costs about this many posting probes
+TERM_CACHE_SIZE = 32     # match_ids: hit sets of recent terms, dropped whenever the index changes
+
+
+def tokenize(text):
+    return [t.lower() for t in TOKEN_RE.findall(text or "")]
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """
+    Inverted index over note text.
+    - postings: token -> {note_id: term frequency}
+    - repeats: token -> {note_id: term frequency} for frequencies > 1 only, so scoring
+      the common tf == 1 case can stay in C (dict.fromkeys / update)
+    - doc_tokens: note id -> tuple of its distinct tokens (counts live in postings)
+    - vocabulary: sorted token list for as-you-type prefix matches (bisect)
+    - trigram_index: trigram -> tokens, for matches in the middle of a word
+    Kept up to date incrementally through add/update/remove. The lock lets the
+    search pipeline query from a worker thread while the UI thread edits notes.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = {}
+        self.repeats = {}
+        self.doc_tokens = {}
+        self.vocabulary = []
+        self.trigram_index = {}
+        self.term_ids = {}   # term -> frozenset of note ids, for match_ids
+
+    # ---------- Maintenance ----------
+    def rebuild(self, notes):
+        with self.lock:
+            self.term_ids.clear()
+            self.postings = {}
+            self.repeats = {}
+            self.doc_tokens = {}
+            self.trigram_index = {}
+            for note in notes:
+                counts = Counter(tokenize(note.text))
+                self.doc_tokens[note.id] = tuple(counts)
+                for token, count in counts.items():
+                    docs = self.postings.get(token)
+                    if docs is None:
+                        docs = self.postings[token] = {}
+                        for gram in trigrams(token):
+                            self.trigram_index.setdefault(gram, set()).add(token)
+                    docs[note.id] = count
+                    if count > 1:
+                        self.repeats.setdefault(token, {})[note.id] = count
+            self.vocabulary = sorted(self.postings)
+
+    def add(self, note_id, text):
+        with self.lock:
+            self.term_ids.clear()
+            counts = Counter(tokenize(text))
+            self.doc_tokens[note_id] = tuple(counts)
+            for token, count in counts.items():
+                docs = self.postings.get(token)
+                if docs is None:
+                    docs = self.postings[token] = {}
+                    insort(self.vocabulary, token)
+                    for gram in trigrams(token):
+                        self.trigram_index.setdefault(gram, set()).add(token)
+                docs[note_id] = count
+                if count > 1:
+                    self.repeats.setdefault(token, {})[note_id] = count
+
+    def remove(self, note_id):
+        with self.lock:
+            self.term_ids.clear()
+            own_tokens = self.doc_tokens.pop(note_id, None)
+            if not own_tokens:
+                return
+            for token in own_tokens:
+                docs = self.postings[token]
+                if docs.pop(note_id) > 1:
+                    repeated = self.repeats[token]
+                    del repeated[note_id]
+                    if not repeated:
+                        del self.repeats[token]
+                if not docs:
+                    # Last note using this token; drop it from the vocabulary too
+                    del self.postings[token]
+                    del self.vocabulary[bisect_left(self.vocabulary, token)]
+                    for gram in trigrams(token):
+                        tokens = self.trigram_index[gram]
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.trigram_index[gram]
+
+    def update(self, note_id, text):
+        with self.lock:
+            self.remove(note_id)
+            self.add(note_id, text)
+
+    # ---------- Lookup ----------
+    def expand(self, term):
+        # Vocabulary tokens a query term matches, with their weights
+        matches = {}
+        if len(term) < MIN_PREFIX_LENGTH:
+            if term in self.postings:
+                matches[term] = EXACT_WEIGHT
+            return matches
+
+        vocabulary = self.vocabulary
+        i = bisect_left(vocabulary, term)
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            token = vocabulary[i]
+            matches[token] = EXACT_WEIGHT if token == term else PREFIX_WEIGHT
+            i += 1
+
+        if len(term) >= MIN_INFIX_LENGTH:
+            grams = sorted(trigrams(term), key=lambda g: len(self.trigram_index.get(g, ())))
+            candidates = set(self.trigram_index.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= self.trigram_index.get(gram, set())
+            for token in candidates:
+                if token not in matches and term in token:
+                    matches[token] = INFIX_WEIGHT
+        return matches
+
+    def search(self, query, limit=None):
+        """Return note ids matching every query term, best first."""
+        with self.lock:
+            terms = list(dict.fromkeys(tokenize(query)))
+            if not terms:
+                return []
+
+            # Weight each term's matching tokens; start with the term that has the fewest hits
+            total = len(self.doc_tokens) or 1
+            expanded = []
+            for term in terms:
+                weighted = {}
+                for token, weight in self.expand(term).items():
+                    weighted[token] = weight * math.log(1 + total / len(self.postings[token]))
+                if not weighted:
+                    return []
+                volume = sum(len(self.postings[token]) for token in weighted)
+                expanded.append((volume, weighted))
+            expanded.sort(key=lambda item: item[0])
+
+            # Single-term top-k (as-you-type) can stop once enough notes were seen
+            early_stop = limit if len(expanded) == 1 else None
+            results = self.score_term(expanded[0][1], early_stop)
+
+            for volume, weighted in expanded[1:]:
+                if not results:
+                    return []
+                if len(results) * AVERAGE_TOKENS < volume:
+                    # Few candidates left: check their own tokens instead of walking postings
+                    scores = {}
+                    for note_id in results:
+                        best = 0.0
+                        for token in self.doc_tokens[note_id]:
+                            base = weighted.get(token)
+                            if base is not None:
+                                best = max(best, base * (1 + math.log(self.postings[token][note_id])))
+                        if best:
+                            scores[note_id] = best
+                else:
+                    scores = self.score_term(weighted)
+                results = {note_id: score + scores[note_id] for note_id, score in results.items() if note_id in scores}
+
+            if limit is not None:
+                return heapq.nlargest(limit, results, key=results.__getitem__)
+            return sorted(results, key=results.__getitem__, reverse=True)
+
+    def match_ids(self, query):
+        """
+        Set of the ids of the notes matching every query term, in no particular order.
+        What a filter needs (the note list shows hits in notebook order): no scores,
+        just unions and intersections over posting keys, which run in C.
+        """
+        with self.lock:
+            terms = list(dict.fromkeys(tokenize(query)))
+            if not terms:
+                return set()
+            expanded = []
+            for term in terms:
+                tokens = self.expand(term)
+                if not tokens:
+                    return set()
+                postings = [self.postings[token] for token in tokens]
+                expanded.append((sum(map(len, postings)), term, tokens, postings))
+            expanded.sort(key=lambda item: item[0])
+
+            # Typing adds terms at the end; the rarest term's hits stay the same between keystrokes
+            _, term, _, postings = expanded[0]
+            results = self.term_ids.get(term)
+            if results is None:
+                if len(self.term_ids) >= TERM_CACHE_SIZE:
+                    self.term_ids.clear()
+                results = self.term_ids[term] = frozenset().union(*postings)
+            for volume, _, tokens, postings in expanded[1:]:
+                if not results:
+                    break
+                if len(results) * CHECK_COST < volume:
+                    # Few candidates: look at their own tokens
+                    doc_tokens = self.doc_tokens
+                    results = {note_id for note_id in results if not tokens.keys().isdisjoint(doc_tokens[note_id])}
+                else:
+                    # Probe the candidates with every posting of the term, in one C loop
+                    results = results.intersection(chain.from_iterable(postings))
+            return results
+
+    def score_term(self, weighted, limit=None):
+        # A term counts once per note, with its best-matching token
+        ranked = sorted(weighted.items(), key=lambda item: item[1], reverse=limit is not None)
+        scores = {}
+        used = []
+        for token, base in ranked:
+            docs = self.postings[token]
+            if limit is None:
+                # Ascending bases: plain update() keeps the max, all in C
+                scores.update(dict.fromkeys(docs, base))
+            else:
+                # Descending bases: first sighting is the best; later tokens only add new notes
+                scores.update(dict.fromkeys(docs.keys() - scores.keys(), base))
+            used.append((token, base))
+            if limit is not None and len(scores) >= limit:
+                break
+        for token, base in used:
+            for note_id, count in self.repeats.get(token, {}).items():
+                score = base * (1 + math.log(count))
+                if score > scores[note_id]:
+                    scores[note_id] = score
+        return scores
@@ -0,0 +1,97 @@
+import queue
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from search import MIN_PREFIX_LENGTH
+
+DEBOUNCE_MS = 150   # wait this long after the last keystroke before searching
+POLL_MS = 15        # how often the Tk loop checks for finished searches
+
+
+class SearchPipeline:
+    """
+    Debounced search off the Tk thread.
+    Every submit() bumps a generation number; anything started for an older
+    generation is cancelled or thrown away, so only the latest query's results
+    reach on_results(query, note_ids), which always runs on the Tk thread.
+    """
+
+    def __init__(self, root, search_fn, on_results, delay_ms=DEBOUNCE_MS):
+        self.root = root
+        self.search_fn = search_fn
+        self.on_results = on_results
+        self.delay_ms = delay_ms
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.finished = queue.Queue()
+        self.generation = 0
+        self.timer = None
+        self.future = None
+        self.poll_job = None
+
+    def submit(self, query):
+        self.generation += 1
+        self.cancel_pending()
+        if len(query.strip()) < MIN_PREFIX_LENGTH:
+            # Clearing the box (or a first letter, too short to match anything) shows everything right away
+            self.on_results(query, None)
+            return
+        self.timer = self.root.after(self.delay_ms, self.start, self.generation, query)
+
+    def cancel_pending(self):
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+        if self.future is not None:
+            self.future.cancel()   # only succeeds if it has not started yet
+            self.future = None
+
+    def start(self, generation, query):
+        self.timer = None
+        if generation != self.generation:
+            return
+        self.future = self.executor.submit(self.run, generation, query)
+        if self.poll_job is None:
+            self.poll_job = self.root.after(POLL_MS, self.poll)
+
+    def run(self, generation, query):
+        # Worker thread: never touch Tk from here
+        if generation != self.generation:
+            return
+        try:
+            note_ids = self.search_fn(query)
+        except Exception as error:
+            # Handed to poll(), which reports it; otherwise it would wait for this forever
+            note_ids = error
+        if generation == self.generation:
+            self.finished.put((generation, query, note_ids))
+
+    def poll(self):
+        self.poll_job = None
+        latest = None
+        while True:
+            try:
+                latest = self.finished.get_nowait()
+            except queue.Empty:
+                break
+
+        if latest is not None and latest[0] == self.generation:
+            self.future = None
+            if isinstance(latest[2], Exception):
+                # Keep showing what is there; the next keystroke tries again
+                print(f"Search for {latest[1]!r} failed:", file=sys.stderr)
+                traceback.print_exception(type(latest[2]), latest[2], latest[2].__traceback__)
+                return
+            self.on_results(latest[1], latest[2])
+        elif self.future is not None:
+            # Still running (or a newer query is); keep polling
+            self.poll_job = self.root.after(POLL_MS, self.poll)
+
+    def shutdown(self):
+        self.generation += 1
+        self.cancel_pending()
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,109 @@
+import os
+
+from file_lock import FileLock, lock_path_for
+from storage import read_json, write_json_atomic
+
+SETTINGS_NAME = "settings.json"
+
+DEFAULTS = {
+    "theme": "Light",
+    "geometry": "1000x650",
+    "collapsed": {},      # note id (as str) -> collapsed, overrides what the notes file says
+    "last_search": "",
+}
+
+
+def settings_path_for(data_file):
+    return os.path.join(os.path.dirname(data_file), SETTINGS_NAME)
+
+
+def merge_states(old, ours, theirs):
+    # Per section: our change wins, anything we didn't touch stays as the file has it
+    merged = dict(theirs)
+    for note_id in old.keys() | ours.keys():
+        if note_id not in ours:
+            merged.pop(note_id, None)
+        elif ours[note_id] != old.get(note_id):
+            merged[note_id] = ours[note_id]
+    return merged
+
+
+class Settings:
+    """
+    UI preferences, read once at startup and kept in memory.
+    They live in their own small file, so changing one never re-serialises the notes.
+    `legacy` seeds values that older versions stored inside the notes file (e.g. "theme").
+    Another window may share the file: save() only writes the keys (and collapse
+    states) this one changed, on top of whatever is in the file by then.
+    """
+
+    def __init__(self, settings_file, legacy=None):
+        self.settings_file = settings_file
+        self.file_lock = FileLock(lock_path_for(settings_file))
+        self.values = dict(DEFAULTS)
+        self.fresh = not os.path.exists(settings_file)
+        if legacy:
+            self.values.update(legacy)
+        if not self.fresh:
+            self.values.update(read_json(settings_file))
+        self.values["collapsed"] = dict(self.values["collapsed"])   # changed in place, see set_collapsed
+        # As the file had them when we last read or wrote it
+        self.saved = dict(DEFAULTS) if self.fresh else dict(self.values, collapsed=dict(self.values["collapsed"]))
+        self.unsaved = False
+        if self.fresh and legacy:
+            # Keep migrated values even if the notes file is rewritten without them
+            self.save()
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.update(**{key: value})
+
+    def update(self, **values):
+        if not self.unsaved and all(self.values.get(k) == v for k, v in values.items()):
+            return
+        self.values.update(values)
+        self.save()
+
+    def save(self):
+        with self.file_lock:
+            values = dict(DEFAULTS, **read_json(self.settings_file))
+            for key, value in self.values.items():
+                if key == "collapsed":
+                    values[key] = merge_states(self.saved[key], value, values.get(key, {}))
+                elif value != self.saved.get(key) or key not in values:
+                    values[key] = value
+            write_json_atomic(self.settings_file, values, indent=2)
+        self.values = values
+        self.saved = dict(values, collapsed=dict(values["collapsed"]))
+        self.unsaved = False
+
+    def adopt_legacy(self, legacy):
+        # A lazy load only sees the old notes-file keys once it reaches the end of the file
+        if legacy and self.fresh:
+            self.update(**legacy)
+
+    # ---------- Collapsed Sections ----------
+    def set_collapsed(self, note_id, collapsed, save=True):
+        # save=False keeps it in memory until the next save(), so a burst of clicks is one write
+        self.values["collapsed"][str(note_id)] = collapsed
+        if save:
+            self.save()
+        else:
+            self.unsaved = True
+
+    def apply_collapsed(self, notes_manager, prune=True):
+        # Push saved collapse states onto the notes; forget ids that no longer exist
+        # (prune=False while notes are still loading, as missing ids may just not be read yet)
+        states = {}
+        for note_id, collapsed in self.values["collapsed"].items():
+            note = notes_manager.get_note(int(note_id))
+            if note is not None:
+                note.collapsed = collapsed
+                states[note_id] = collapsed
+        if prune:
+            self.values["collapsed"] = states
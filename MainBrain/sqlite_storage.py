@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from order_keys import key_between
+from search import tokenize
+from storage import read_json
+
+# Columns that have their own place in the notes table; anything else goes into "extra".
+# A note's "order" key lives in sort_key.
+COLUMNS = ("text", "is_section", "parent_section_id", "collapsed", "pdf_path")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL DEFAULT '',
+    is_section INTEGER NOT NULL DEFAULT 0,
+    parent_section_id INTEGER,
+    collapsed INTEGER,
+    pdf_path TEXT,
+    extra TEXT,
+    sort_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_parent ON notes(parent_section_id, sort_key);
+CREATE INDEX IF NOT EXISTS notes_sections ON notes(id) WHERE is_section = 1;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(text, content='notes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF text ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+
+def db_path_for(data_file):
+    return os.path.splitext(data_file)[0] + ".db"
+
+
+class SqliteStorage:
+    """
+    SQLite backend: one row per note, ordered by its order key (sort_key) within its parent.
+    - load() only pulls the text of rows the first screen can show (top level and
+      children of expanded sections); other bodies come later through load_texts().
+    - Every operation record is a small indexed UPDATE/INSERT/DELETE (a move is a
+      one-row UPDATE of parent and key); batch() groups many into one transaction.
+    - Text search goes through an FTS5 index kept in sync by triggers.
+    - Other processes may write the same database; writes only touch the rows of the
+      records, so changes() just has to read back what the others did.
+    """
+
+    full_text = True
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self.conn = self.connect()
+        # The write connection is used by one thread at a time: a read on it from another
+        # thread in the middle of a transaction could pin an old snapshot and make the write fail
+        self.conn_lock = threading.RLock()
+        self.local = threading.local()
+        self.batch_depth = 0
+        self.seen = None   # PRAGMA data_version when we last merged; moves when others commit
+
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(notes)")}
+        if columns and "sort_key" not in columns:
+            self.migrate_positions()
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+        try:
+            with self.conn:
+                self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.has_fts = False
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def migrate_positions(self):
+        # Databases from before order keys sorted by a REAL "position"; rebuild the table with keys
+        conn = self.conn
+        orders = []
+        last = {}
+        for note_id, parent_id in conn.execute(
+                "SELECT id, parent_section_id FROM notes ORDER BY parent_section_id, position"):
+            last[parent_id] = key_between(last.get(parent_id), None)
+            orders.append((last[parent_id], note_id))
+        conn.executescript(
+            "BEGIN;"
+            "ALTER TABLE notes RENAME TO notes_old;"
+            "DROP INDEX IF EXISTS notes_parent;"
+            "DROP INDEX IF EXISTS notes_sections;"
+            + SCHEMA +
+            "INSERT INTO notes (id, text, is_section, parent_section_id, collapsed, pdf_path, extra, sort_key) "
+            "SELECT id, text, is_section, parent_section_id, collapsed, pdf_path, extra, '' FROM notes_old;"
+            "DROP TABLE notes_old;"
+            "COMMIT;"
+        )
+        with conn:
+            conn.executemany("UPDATE notes SET sort_key = ? WHERE id = ?", orders)
+
+    def reader(self):
+        # Reads from the UI and search threads go through their own connection per thread
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+        return conn
+
+    # ---------- Loading ----------
+    def load(self):
+        conn = self.conn
+        self.seen = self.data_version()
+        notes = self.read_notes(
+            "CASE WHEN n.parent_section_id IS NULL OR p.collapsed = 0 THEN n.text END")
+        next_id = conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        return {"notes": notes, "next_id": int(next_id[0]) if next_id else 1}, []
+
+    def read_notes(self, text_column, conn=None):
+        rows = (conn or self.conn).execute(
+            "SELECT n.id, n.is_section, n.parent_section_id, n.collapsed, n.pdf_path, n.extra, n.sort_key, "
+            f"      {text_column} "
+            "FROM notes n LEFT JOIN notes p ON p.id = n.parent_section_id "
+            "ORDER BY n.parent_section_id IS NOT NULL, n.parent_section_id, n.sort_key"
+        ).fetchall()
+
+        notes = []
+        for note_id, is_section, parent_id, collapsed, pdf_path, extra, order, text in rows:
+            note = json.loads(extra) if extra else {}
+            note.update({"id": note_id, "is_section": bool(is_section), "parent_section_id": parent_id,
+                         "order": order})
+            if text is not None:
+                note["text"] = text
+            if collapsed is not None:
+                note["collapsed"] = bool(collapsed)
+            if pdf_path:
+                note["pdf_path"] = pdf_path
+            notes.append(note)
+        return notes
+
+    def load_texts(self, note_ids):
+        texts = {}
+        note_ids = list(note_ids)
+        for start in range(0, len(note_ids), 500):
+            chunk = note_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            texts.update(self.reader().execute(f"SELECT id, text FROM notes WHERE id IN ({marks})", chunk))
+        return texts
+
+    # ---------- Writing ----------
+    @contextmanager
+    def batch(self):
+        # Nested batches share one transaction, committed when the outermost ends
+        with self.conn_lock:
+            self.batch_depth += 1
+            try:
+                yield
+            except:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.conn.rollback()
+                raise
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.conn.commit()
+
+    def append(self, op, manager):
+        with self.conn_lock:
+            self.write(op, manager)
+
+    def write(self, op, manager):
+        kind = op["op"]
+        conn = self.conn
+        if kind == "add":
+            self.insert(op["note"])
+            self.raise_next_id(manager.next_id)
+        elif kind == "update":
+            self.update(op["id"], op["fields"])
+        elif kind == "delete":
+            row = conn.execute("SELECT is_section FROM notes WHERE id = ?", (op["id"],)).fetchone()
+            if row and row[0]:
+                conn.execute("DELETE FROM notes WHERE parent_section_id = ?", (op["id"],))
+            conn.execute("DELETE FROM notes WHERE id = ?", (op["id"],))
+        elif kind == "move":
+            conn.execute("UPDATE notes SET parent_section_id = ?, sort_key = ? WHERE id = ?",
+                         (op["parent"], op["order"], op["id"]))
+        elif kind == "rebalance":
+            conn.executemany("UPDATE notes SET sort_key = ? WHERE id = ?",
+                             [(key, note_id) for note_id, key in op["orders"]])
+        if self.batch_depth == 0:
+            conn.commit()
+
+    def insert(self, note):
+        extra = {k: v for k, v in note.items() if k not in COLUMNS and k not in ("id", "order")}
+        collapsed = note.get("collapsed")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO notes (id, text, is_section, parent_section_id, collapsed, pdf_path, extra, sort_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (note["id"], note.get("text", ""), int(bool(note.get("is_section"))), note.get("parent_section_id") or None,
+             None if collapsed is None else int(collapsed), note.get("pdf_path"),
+             json.dumps(extra) if extra else None, note["order"]),
+        )
+
+    def update(self, note_id, fields):
+        sets, values = [], []
+        extra = {}
+        for key, value in fields.items():
+            if key in COLUMNS:
+                if key in ("is_section", "collapsed") and value is not None:
+                    value = int(value)
+                sets.append(f"{key} = ?")
+                values.append(value)
+            elif key == "order":
+                sets.append("sort_key = ?")
+                values.append(value)
+            elif key != "id":
+                extra[key] = value
+        if extra:
+            row = self.conn.execute("SELECT extra FROM notes WHERE id = ?", (note_id,)).fetchone()
+            merged = json.loads(row[0]) if row and row[0] else {}
+            merged.update(extra)
+            # Same as Note.update: None removes an extra key
+            merged = {k: v for k, v in merged.items() if v is not None}
+            sets.append("extra = ?")
+            values.append(json.dumps(merged) if merged else None)
+        if sets:
+            self.conn.execute(f"UPDATE notes SET {', '.join(sets)} WHERE id = ?", values + [note_id])
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def raise_next_id(self, floor, count=0):
+        # In one statement, so two processes can't both read the same value; returns the new next_id
+        conn = self.conn
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('next_id', '1')")
+        conn.execute("UPDATE meta SET value = max(CAST(value AS INTEGER), ?) + ? WHERE key = 'next_id'",
+                     (floor, count))
+        return int(conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()[0])
+
+    def save(self, data):
+        # Full snapshot in one transaction
+        with self.batch():
+            self.conn.execute("DELETE FROM notes")
+            last = {}
+            for note in data["notes"]:
+                parent_id = note.get("parent_section_id") or None
+                if "order" not in note:
+                    # Plain JSON from before order keys: file order is the order
+                    note = dict(note, order=key_between(last.get(parent_id), None))
+                last[parent_id] = note["order"]
+                self.insert(note)
+            self.set_meta("next_id", data.get("next_id", 1))
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- Sharing ----------
+    def data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def reserve_ids(self, floor, count):
+        with self.conn_lock:
+            start = self.raise_next_id(floor, count) - count
+            if self.batch_depth == 0:
+                self.conn.commit()
+        return start
+
+    def changes(self, manager):
+        # data_version of the write connection only moves when other connections commit
+        with self.conn_lock:
+            version = self.data_version()
+        if version == self.seen:
+            return [], None
+        # Someone else committed: compare every row with the notes in memory
+        return manager.diff(self.read_notes("n.text", self.reader())), version
+
+    def merged(self, token, manager):
+        self.seen = token
+
+    def unwritten(self):
+        return []
+
+    def watch_paths(self):
+        return [self.db_file, self.db_file + "-wal"]
+
+    # ---------- Search ----------
+    def search(self, query, limit=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        conn = self.reader()
+        if self.has_fts:
+            match = " ".join('"%s"*' % term for term in terms)
+            sql = "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank"
+            params = [match]
+        else:
+            sql = "SELECT id FROM notes WHERE " + " AND ".join("text LIKE ?" for _ in terms)
+            params = ["%" + term + "%" for term in terms]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in conn.execute(sql, params)]
+
+
+def migrate_json_to_sqlite(json_file, db_file):
+    """One-shot copy of a notes JSON file into a new SQLite database."""
+    data = read_json(json_file)
+    notes = data.get("notes", [])
+    storage = SqliteStorage(db_file)
+    data["next_id"] = max([data.get("next_id", 1)] + [n["id"] + 1 for n in notes])
+    storage.save(data)
+    storage.close()
+    return len(notes)
+
+
+def open_sqlite_storage(data_file):
+    # First use of the backend migrates the existing JSON notebook
+    db_file = db_path_for(data_file)
+    if not os.path.exists(db_file) and os.path.exists(data_file):
+        migrate_json_to_sqlite(data_file, db_file)
+    return SqliteStorage(db_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy a notes JSON file into a SQLite database")
+    parser.add_argument("json_file")
+    parser.add_argument("db_file", nargs="?")
+    args = parser.parse_args()
+    db_file = args.db_file or db_path_for(args.json_file)
+    count = migrate_json_to_sqlite(args.json_file, db_file)
+    print(f"Migrated {count} notes into {db_file}")
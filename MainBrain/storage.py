@@ -0,0 +1,413 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from file_lock import NEXT_SEQ, FileLock, lock_path_for
+from lazy_loader import NotesStream
+
+# Storage backends for NotesManager.
+# Every backend has the same small interface:
+#   load()             -> (data, ops)   data = {"notes": [...], "next_id": n}, ops = records to replay on top
+#   append(op, manager)                 persist one operation record (add/update/delete/move)
+#   save(data)                          persist a full snapshot
+#   batch()                             context manager grouping several appends into one write
+#   close()
+# Backends may also leave "text" out of notes in load() and serve it later via load_texts(ids).
+# File-based backends offer open_stream() + load_ops(extra) so notes can be read a chunk at a time.
+# Several processes may open the same notes; backends then also offer
+#   reserve_ids(floor, count) -> first of `count` ids no other process hands out
+#   changes(manager)          -> (ops, token)  what other processes wrote since the last merge
+#   merged(token, manager)                     the manager applied those ops
+#   unwritten()               -> ops already applied in memory but not on disk yet
+#   watch_paths()             -> files whose change is worth a changes() call
+
+COMPACT_THRESHOLD = 1024 * 1024   # journal bytes before it is folded into the snapshot
+
+
+def read_json(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except:
+            return {}
+    return {}
+
+
+def write_json_atomic(path, data, indent=None):
+    # Write next to the target and swap it in, so a crash never leaves half a file.
+    # The temp name is per process and thread, so two writers never share one.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_version(path):
+    # Changes whenever the file is rewritten or replaced; None if it doesn't exist
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class JsonStorage:
+    """
+    The original format: one JSON file rewritten on every change.
+    Saves happen under the notes file lock and only if nobody else saved since
+    we read the file; otherwise our records wait in `deferred` until changes()
+    has merged the other version, and are saved on top of it.
+    """
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.file_lock = FileLock(lock_path_for(data_file))
+        self.batch_depth = 0
+        self.pending = []
+        self.batch_manager = None
+        self.seen = None      # lock-file generation of the notes as we last read or wrote them
+        self.deferred = []
+
+    def load(self):
+        with self.file_lock:
+            self.seen = self.file_lock.generation()
+            return read_json(self.data_file), []
+
+    def open_stream(self):
+        with self.file_lock:
+            if not os.path.exists(self.data_file):
+                return None
+            self.seen = self.file_lock.generation()
+            return NotesStream(self.data_file)
+
+    def load_ops(self, extra):
+        return []
+
+    @contextmanager
+    def batch(self):
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.pending:
+                pending, self.pending = self.pending, []
+                self.write(pending, self.batch_manager)
+
+    def append(self, op, manager):
+        if self.batch_depth:
+            self.pending.append(op)
+            self.batch_manager = manager
+            return
+        self.write([op], manager)
+
+    def write(self, ops, manager):
+        while True:
+            with manager.lock:
+                data = manager.snapshot()
+                seen = self.seen
+            with self.file_lock:
+                if self.deferred or self.file_lock.generation() != self.seen:
+                    # Another process saved since we read the file; don't overwrite its changes
+                    self.deferred.extend(ops)
+                    return
+                if seen == self.seen:
+                    self.save(data)
+                    return
+            # A merge landed while we copied the notes: copy them again
+
+    def save(self, data):
+        with self.file_lock:
+            write_json_atomic(self.data_file, data, indent=2)
+            self.seen = self.file_lock.bump()
+
+    # ---------- Sharing ----------
+    def reserve_ids(self, floor, count):
+        return self.file_lock.reserve(floor, count)
+
+    def changes(self, manager):
+        with self.file_lock:
+            generation = self.file_lock.generation()
+            if generation == self.seen or not os.path.exists(self.data_file):
+                return [], None
+            data = read_json(self.data_file)
+        # No record of what the other process did: compare its notes with ours
+        return manager.diff(data.get("notes", [])), generation
+
+    def merged(self, token, manager):
+        # Under the lock, so a save from the write-behind thread can't queue newer records first
+        with self.file_lock:
+            self.seen = token
+            if self.deferred:
+                ops, self.deferred = self.deferred, []
+                self.write(ops, manager)
+
+    def unwritten(self):
+        return list(self.deferred)
+
+    def watch_paths(self):
+        return [self.data_file, self.file_lock.path]
+
+    def close(self):
+        self.file_lock.close()
+
+
+class JournalStorage:
+    """
+    Snapshot + append-only journal.
+    The snapshot is the usual notes JSON; each change is appended to
+    `<data_file>.journal` as one JSON line carrying a sequence number.
+    Loading replays journal records newer than the snapshot's "seq".
+    A torn last line (crash mid-write) is ignored and trimmed.
+    Once the journal passes compact_threshold bytes it is folded into a new
+    snapshot on a background thread.
+    Processes sharing the notes append under the notes file lock, numbering their
+    records after the last one in the journal. changes() returns the records
+    others appended, so every process replays the same operations in the same order.
+    """
+
+    def __init__(self, data_file, journal_file=None, compact_threshold=COMPACT_THRESHOLD):
+        self.data_file = data_file
+        self.journal_file = journal_file or data_file + ".journal"
+        self.compact_threshold = compact_threshold
+        self.file_lock = FileLock(lock_path_for(data_file))
+        self.lock = threading.Lock()
+        self.compactor = None
+        self.batch_depth = 0
+        self.pending = []
+        self.batch_manager = None
+
+        self.seq = 0               # last record in the journal, as far as we have read it
+        self.applied_seq = 0       # every record up to this one is applied in memory
+        self.unmerged = []         # records after applied_seq, for the next changes()
+        self.scan_offset = 0       # bytes of the journal read so far
+        self.journal_seen = None   # lock-file generation of the journal being read
+        self.snapshot_seen = None  # lock-file generation of the snapshot we last read or wrote
+
+    def load(self):
+        with self.file_lock:
+            data = read_json(self.data_file)
+            self.snapshot_seen = self.file_lock.generation()
+            return data, self.load_ops(data)
+
+    def open_stream(self):
+        with self.file_lock:
+            if not os.path.exists(self.data_file):
+                return None
+            self.snapshot_seen = self.file_lock.generation()
+            return NotesStream(self.data_file)
+
+    def load_ops(self, extra):
+        # Journal records newer than the snapshot described by `extra`
+        with self.file_lock, self.lock:
+            self.seq = self.applied_seq = extra.get("seq", 0)
+            self.unmerged = []
+            self.scan_offset = 0
+            self.journal_seen = None
+            self.scan()
+            if self.unmerged and self.unmerged[0]["seq"] != self.applied_seq + 1:
+                # Folded into a newer snapshot while we streamed this one: changes() catches up
+                self.snapshot_seen = None
+                return []
+            ops, self.unmerged = self.unmerged, []
+            self.applied_seq = self.seq
+            return ops
+
+    def scan(self):
+        # Read records appended since the last scan (file lock held)
+        generation = self.file_lock.generation()
+        try:
+            size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            self.scan_offset, self.journal_seen = 0, generation
+            return
+        if generation != self.journal_seen or size < self.scan_offset:
+            # Rewritten by a compaction: read it again, seq tells what is new
+            self.scan_offset, self.journal_seen = 0, generation
+        if size == self.scan_offset:
+            return
+        good_bytes = self.scan_offset
+        with open(self.journal_file, "rb") as f:
+            f.seek(self.scan_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                good_bytes += len(line)
+                # Journals from before sharing have no numbers: their lines count from the snapshot
+                op.setdefault("seq", self.seq + 1)
+                if op["seq"] > self.seq:
+                    self.unmerged.append(op)
+                    self.seq = op["seq"]
+        if good_bytes != size:
+            # Torn last line from a crash (writers hold the lock, so it is no one's write in progress)
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(good_bytes)
+        self.scan_offset = good_bytes
+
+    @contextmanager
+    def batch(self):
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.pending:
+                pending, self.pending = self.pending, []
+                self.write(pending, self.batch_manager)
+
+    def append(self, op, manager):
+        if self.batch_depth:
+            self.pending.append(op)
+            self.batch_manager = manager
+            return
+        self.write([op], manager)
+
+    def write(self, ops, manager):
+        # One write + fsync for the whole group
+        with self.file_lock, self.lock:
+            self.scan()
+            generation = self.journal_seen
+            first = self.file_lock.take(NEXT_SEQ, len(ops), self.seq + 1)
+            # Skipped numbers are records another process already folded into the snapshot
+            caught_up = self.applied_seq == self.seq and first == self.seq + 1
+            lines = []
+            for seq, op in enumerate(ops, first):
+                record = dict(op, seq=seq)
+                lines.append(json.dumps(record) + "\n")
+                if not caught_up:
+                    # Lands after records we haven't merged; replayed with them
+                    self.unmerged.append(record)
+            self.seq = first + len(ops) - 1
+            os.makedirs(os.path.dirname(self.journal_file) or ".", exist_ok=True)
+            with open(self.journal_file, "a") as journal:
+                journal.write("".join(lines))
+                journal.flush()
+                os.fsync(journal.fileno())
+                size = journal.tell()
+            self.scan_offset = size
+            if caught_up:
+                self.applied_seq = self.seq
+
+        if size >= self.compact_threshold and self.compactor is None:
+            # Snapshot here (cheap copy), serialise on the background thread.
+            # Under the manager lock, so the snapshot is exactly the state at applied_seq
+            with manager.lock:
+                if self.applied_seq != self.seq:
+                    return   # memory is behind the journal; compact after the merge
+                data = manager.snapshot()
+                data["seq"] = self.applied_seq
+            self.compactor = threading.Thread(target=self.compact, args=(data, generation), daemon=True)
+            self.compactor.start()
+
+    def compact(self, data, generation):
+        try:
+            with self.file_lock:
+                if self.file_lock.generation() != generation:
+                    # Another process compacted meanwhile; ours would put back an older snapshot
+                    return
+                write_json_atomic(self.data_file, data)
+                # Keep only records the new snapshot does not cover yet
+                kept = []
+                if os.path.exists(self.journal_file):
+                    with open(self.journal_file, "r") as f:
+                        for line in f:
+                            if json.loads(line).get("seq", 0) > data["seq"]:
+                                kept.append(line)
+                tmp_path = self.journal_file + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.writelines(kept)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.journal_file)
+                generation = self.file_lock.bump()
+                with self.lock:
+                    # Kept records may include some not read yet: the next scan starts over
+                    self.snapshot_seen = self.journal_seen = generation
+                    self.scan_offset = 0
+        finally:
+            self.compactor = None
+
+    def save(self, data):
+        # Full snapshot: the journal is no longer needed afterwards
+        compactor = self.compactor   # read once: the thread clears it when done
+        if compactor is not None:
+            compactor.join()
+        with self.file_lock, self.lock:
+            data = dict(data, seq=self.seq)
+            write_json_atomic(self.data_file, data)
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self.snapshot_seen = self.journal_seen = self.file_lock.bump()
+            self.scan_offset = 0
+            self.applied_seq = self.seq
+            self.unmerged = []
+
+    # ---------- Sharing ----------
+    def reserve_ids(self, floor, count):
+        return self.file_lock.reserve(floor, count)
+
+    def changes(self, manager):
+        with self.file_lock, self.lock:
+            self.scan()
+            reload = (self.file_lock.generation() != self.snapshot_seen
+                      or (self.unmerged and self.unmerged[0]["seq"] != self.applied_seq + 1))
+            if not reload:
+                return list(self.unmerged), self.seq if self.unmerged else None
+            # Someone folded records we haven't seen into a new snapshot (or replaced the notes):
+            # compare with that snapshot, then replay the journal after it
+            data = read_json(self.data_file)
+            self.snapshot_seen = self.file_lock.generation()
+            self.seq = data.get("seq", 0)
+            self.unmerged = []
+            self.scan_offset, self.journal_seen = 0, None
+            self.scan()
+            ops, token = list(self.unmerged), self.seq
+        return manager.diff(data.get("notes", [])) + ops, token
+
+    def merged(self, token, manager):
+        with self.lock:
+            self.applied_seq = max(self.applied_seq, token)
+            self.unmerged = [op for op in self.unmerged if op["seq"] > token]
+
+    def unwritten(self):
+        return []
+
+    def watch_paths(self):
+        return [self.data_file, self.journal_file, self.file_lock.path]
+
+    def close(self):
+        compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+        self.file_lock.close()
+
+
+def open_sqlite(data_file):
+    # Imported on demand; only needed when the SQLite backend is picked
+    from sqlite_storage import open_sqlite_storage
+    return open_sqlite_storage(data_file)
+
+
+BACKENDS = {
+    "json": JsonStorage,
+    "journal": JournalStorage,
+    "sqlite": open_sqlite,
+}
+
+
+def open_storage(kind, data_file):
+    return BACKENDS[kind](data_file)
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# Run from the project root:  python -m pytest MainBrain/tests
+# The app's modules sit side by side in MainBrain/ and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notes_manager import NotesManager
+from storage import BACKENDS, JournalStorage, open_storage
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / "notes.json")
+
+
+@pytest.fixture
+def open_manager(data_file):
+    """open_manager(backend, **kwargs) -> a NotesManager on data_file, closed after the test
+    (closing twice is harmless, so tests may close and reopen)."""
+    managers = []
+
+    def opener(backend="journal", compact_threshold=None, **kwargs):
+        if compact_threshold is not None:
+            storage = JournalStorage(data_file, compact_threshold=compact_threshold)
+        else:
+            storage = open_storage(backend, data_file)
+        manager = NotesManager(data_file, storage=storage, **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield opener
+    for manager in managers:
+        manager.close()
@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+
+from bulk_io import TOP_LEVEL_FILE, detect_format, export_notes, import_notes, read_markdown
+from notes_manager import NotesManager
+
+
+def outline(manager):
+    # What an export carries: titles, texts and attachments in display order (not ids or keys)
+    return [(note.is_section, note.parent is not None, note.text, note.pdf_path or None)
+            for note in manager.iter_notes()]
+
+
+@pytest.fixture
+def notebook(open_manager, backend):
+    manager = open_manager(backend)
+    manager.add_note("loose first")
+    work = manager.add_note("Work", is_section=True)
+    manager.add_note("pump manual\nsecond line", parent_id=work.id, pdf_path="/docs/pump.pdf")
+    manager.add_note("comma, \"quotes\" and ümlauts", parent_id=work.id)
+    manager.add_note("intro\n---\nafter a rule\n  \\---  \n----", parent_id=work.id)
+    home = manager.add_note("Home/Garden: 50%", is_section=True)
+    manager.add_note("water plants", parent_id=home.id)
+    manager.add_note("Empty", is_section=True)
+    manager.add_note("loose after sections")
+    return manager
+
+
+@pytest.mark.parametrize("fmt", ["markdown", "jsonl", "csv"])
+def test_round_trip(notebook, tmp_path, fmt):
+    path = str(tmp_path / {"markdown": "export", "jsonl": "export.jsonl", "csv": "export.csv"}[fmt])
+    assert detect_format(path) == fmt
+    count = export_notes(notebook, path)
+    assert count == len(notebook.notes)
+    imported = NotesManager(str(tmp_path / "imported.json"))
+    try:
+        assert import_notes(imported, path) == count
+        expected = outline(notebook)
+        if fmt == "markdown":
+            # No attachments in markdown, and the top-level notes share one file ahead of the sections
+            expected = [(section, nested, text, None) for section, nested, text, _ in expected]
+            expected.sort(key=lambda row: row[0] or row[1])
+        assert outline(imported) == expected
+    finally:
+        imported.close()
+
+
+def test_markdown_keeps_top_level_notes_out_of_sections(notebook, tmp_path):
+    folder = str(tmp_path / "export")
+    export_notes(notebook, folder, "markdown")
+    with open(os.path.join(folder, TOP_LEVEL_FILE), encoding="utf-8") as f:
+        top = f.read()
+    assert "loose first" in top and "loose after sections" in top
+    for name in os.listdir(folder):
+        if name != TOP_LEVEL_FILE:
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                assert "loose" not in f.read()
+    records = list(read_markdown(folder))
+    assert {"text": "loose after sections", "section": None} in records
+
+
+def test_import_into_existing_section(open_manager, tmp_path):
+    manager = open_manager()
+    work = manager.add_note("Work", is_section=True)
+    path = str(tmp_path / "more.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("section,text,pdf_path\nWork,added to work,\nNew,added to new,\n")
+    assert import_notes(manager, path) == 3   # two notes and the "New" section
+    assert [n.text for n in manager.get_children(work.id)] == ["added to work"]
+    new = [n for n in manager.get_children(None) if n.text == "New"]
+    assert len(new) == 1 and new[0].is_section
+
+
+def test_jsonl_orphans_go_to_top_level(open_manager, tmp_path):
+    path = str(tmp_path / "orphans.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": 7, "text": "S", "is_section": True, "parent_section_id": None}) + "\n")
+        f.write(json.dumps({"id": 8, "text": "child", "is_section": False, "parent_section_id": 7}) + "\n")
+        f.write(json.dumps({"id": 9, "text": "lost", "is_section": False, "parent_section_id": 42}) + "\n")
+    manager = open_manager()
+    orphans = []
+    assert import_notes(manager, path, orphans=orphans) == 3
+    assert [record["text"] for record in orphans] == ["lost"]
+    assert [(n.text, n.is_section) for n in manager.get_children(None)] == [("S", True), ("lost", False)]
+    assert [n.text for n in manager.get_children(manager.get_children(None)[0].id)] == ["child"]
+
+
+def test_import_is_one_undo_step(open_manager, tmp_path):
+    manager = open_manager()
+    manager.add_note("kept")
+    path = str(tmp_path / "many.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("section,text,pdf_path\n")
+        f.writelines(f"S{i % 5},note {i},\n" for i in range(200))
+    import_notes(manager, path)
+    assert len(manager.notes) == 206
+    manager.undo()
+    assert [n.text for n in manager.notes] == ["kept"]
+
+
+def test_imported_notes_are_searchable(open_manager, tmp_path):
+    manager = open_manager()
+    path = str(tmp_path / "search.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("section,text,pdf_path\nManuals,pump valve reset,\n")
+    import_notes(manager, path)
+    assert [manager.get_note(i).text for i in manager.search("valve")] == ["pump valve reset"]
+
+
+def test_import_claims_ids_in_large_blocks(open_manager, tmp_path, monkeypatch):
+    manager = open_manager()
+    calls = []
+    reserve = manager.storage.reserve_ids
+
+    def counted(floor, count):
+        calls.append(count)
+        return reserve(floor, count)
+
+    monkeypatch.setattr(manager.storage, "reserve_ids", counted)
+    path = str(tmp_path / "many.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("section,text,pdf_path\n")
+        f.writelines(f"S{i % 10},note {i},\n" for i in range(3000))
+    import_notes(manager, path)
+    assert len(calls) <= 3
+    assert len({note.id for note in manager.notes}) == 3010
@@ -0,0 +1,137 @@
+import pytest
+
+
+def notes_of(manager):
+    return manager.snapshot()["notes"]
+
+
+def check_undo_redo(manager, change):
+    before = notes_of(manager)
+    change()
+    after = notes_of(manager)
+    assert after != before
+    assert manager.undo() is not None
+    assert notes_of(manager) == before
+    assert manager.redo() is not None
+    assert notes_of(manager) == after
+    return before, after
+
+
+@pytest.fixture
+def manager(backend, open_manager):
+    manager = open_manager(backend)
+    section = manager.add_note("Section", is_section=True)
+    for i in range(3):
+        manager.add_note(f"note {i}", parent_id=section.id)
+    manager.add_note("loose")
+    manager.history.clear()
+    return manager
+
+
+def section_id(manager):
+    return manager.get_children(None)[0].id
+
+
+def test_add(manager):
+    check_undo_redo(manager, lambda: manager.add_note("new", parent_id=section_id(manager)))
+
+
+def test_add_section(manager):
+    check_undo_redo(manager, lambda: manager.add_note("Other", is_section=True))
+
+
+def test_update(manager):
+    note = manager.get_children(section_id(manager))[1]
+    check_undo_redo(manager, lambda: manager.update_note(note.id, text="changed", pdf_path="a.pdf"))
+
+
+def test_update_unknown_field(manager):
+    # Keys the Note class doesn't know live in `extra`; undo removes them again
+    note = manager.get_children(section_id(manager))[0]
+    check_undo_redo(manager, lambda: manager.update_note(note.id, color="red"))
+    manager.undo()
+    assert "color" not in manager.get_note(note.id).to_dict()
+
+
+def test_delete_note(manager):
+    note = manager.get_children(section_id(manager))[1]
+    check_undo_redo(manager, lambda: manager.delete_note(note.id))
+
+
+def test_delete_section_with_children(manager):
+    check_undo_redo(manager, lambda: manager.delete_note(section_id(manager)))
+
+
+def test_move_within_section(manager):
+    children = manager.get_children(section_id(manager))
+    last, first = children[-1].id, children[0].id
+    check_undo_redo(manager, lambda: manager.move_note(last, parent_id=section_id(manager), before_id=first))
+
+
+def test_move_out_of_section(manager):
+    note = manager.get_children(section_id(manager))[0]
+    check_undo_redo(manager, lambda: manager.move_note(note.id))
+
+
+def test_rebalance(manager):
+    section = section_id(manager)
+    for i in range(5):
+        note = manager.add_note(f"front {i}", parent_id=section)
+        manager.move_note(note.id, parent_id=section, before_id=manager.get_children(section)[0].id)
+    check_undo_redo(manager, lambda: manager.rebalance(section))
+
+
+def test_bulk_add_is_one_step(manager):
+    records = [{"is_section": True, "text": "Imported", "ref": "r"}]
+    records += [{"text": f"imported {i}", "section": "r"} for i in range(10)]
+    records.append({"text": "into existing", "section": "Section"})
+    check_undo_redo(manager, lambda: manager.bulk_add(records))
+
+
+def test_undo_order_across_actions(manager):
+    states = [notes_of(manager)]
+    note = manager.add_note("step 1")
+    states.append(notes_of(manager))
+    manager.update_note(note.id, text="step 2")
+    states.append(notes_of(manager))
+    manager.move_note(note.id, parent_id=section_id(manager))
+    states.append(notes_of(manager))
+    manager.delete_note(note.id)
+    states.append(notes_of(manager))
+
+    for state in reversed(states[:-1]):
+        manager.undo()
+        assert notes_of(manager) == state
+    assert manager.undo() is None
+    for state in states[1:]:
+        manager.redo()
+        assert notes_of(manager) == state
+    assert manager.redo() is None
+
+
+def test_new_action_clears_redo(manager):
+    manager.add_note("a")
+    manager.undo()
+    assert manager.history.can_redo
+    manager.add_note("b")
+    assert not manager.history.can_redo
+
+
+def test_undo_is_saved(manager, backend, open_manager):
+    before = notes_of(manager)
+    manager.delete_note(section_id(manager))
+    manager.undo()
+    manager.close()
+    assert notes_of(open_manager(backend)) == before
+
+
+def test_budget_drops_oldest(open_manager):
+    manager = open_manager(undo_budget=2000)
+    for i in range(50):
+        manager.add_note(f"note {i}")
+    assert manager.history.size <= 2000
+    undone = 0
+    while manager.undo() is not None:
+        undone += 1
+    assert 0 < undone < 50
+    assert len(manager.get_children(None)) == 50 - undone
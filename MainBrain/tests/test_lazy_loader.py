@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import notes_manager
+from lazy_loader import NotesStream
+from notes_manager import NotesManager
+
+
+def write(path, data, **dump_args):
+    with open(path, "w") as f:
+        json.dump(data, f, **dump_args)
+    return str(path)
+
+
+def tricky_notes(count):
+    # Text that looks like the structure the stream scans for
+    texts = ['plain', 'has ] bracket', 'has "notes": [ inside', 'comma, {brace}', 'ümlaut \\ backslash',
+             'x' * 3000]
+    return [{"id": i + 1, "text": texts[i % len(texts)], "is_section": i % 10 == 0,
+             "parent_section_id": None if i % 10 == 0 else i - i % 10 + 1} for i in range(count)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 256 * 1024])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_stream_reads_every_note(tmp_path, chunk_size, indent):
+    data = {"version": 3, "notes": tricky_notes(50), "next_id": 51, "seq": 9}
+    stream = NotesStream(write(tmp_path / "notes.json", data, indent=indent), chunk_size)
+    assert list(stream) == data["notes"]
+    assert stream.extra == {"version": 3, "next_id": 51, "seq": 9}
+    assert stream.done
+
+
+def test_take_in_chunks(tmp_path):
+    notes = tricky_notes(25)
+    stream = NotesStream(write(tmp_path / "notes.json", {"notes": notes, "next_id": 26}), 16)
+    taken = []
+    while not stream.done:
+        taken += stream.take(10)
+    assert taken == notes
+    assert stream.extra == {"next_id": 26}
+
+
+def test_empty_and_missing_array(tmp_path):
+    stream = NotesStream(write(tmp_path / "empty.json", {"notes": [], "next_id": 1}))
+    assert list(stream) == []
+    assert stream.extra == {"next_id": 1}
+    stream = NotesStream(write(tmp_path / "none.json", {"next_id": 4}))
+    assert stream.done and list(stream) == []
+    assert stream.extra == {"next_id": 4}
+
+
+def test_truncated_file_raises(tmp_path):
+    path = tmp_path / "torn.json"
+    text = json.dumps({"notes": tricky_notes(5)})
+    path.write_text(text[:len(text) // 2])
+    with pytest.raises(ValueError):
+        list(NotesStream(str(path), 8))
+
+
+def test_close_early(tmp_path):
+    stream = NotesStream(write(tmp_path / "notes.json", {"notes": tricky_notes(10)}), 8)
+    assert len(stream.take(3)) == 3
+    stream.close()
+    assert stream.file.closed
+
+
+def test_lazy_manager_ends_up_like_a_full_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(notes_manager, "FIRST_SCREEN_NOTES", 7)
+    path = write(tmp_path / "notes.json", {"notes": tricky_notes(120), "next_id": 121})
+    full = NotesManager(path)
+    lazy = NotesManager(path, lazy=True)
+    assert lazy.loading and len(lazy.by_id) < 120
+    while not lazy.load_more(20):
+        pass
+    assert not lazy.loading
+    assert lazy.snapshot() == full.snapshot()
+    assert lazy.search("bracket") == full.search("bracket")
+    lazy.close()
+    full.close()
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from order_keys import INTEGER_ZERO, MAX_KEY_LENGTH, key_between, sequential_keys
+
+
+def test_first_key():
+    assert key_between(None, None) == INTEGER_ZERO
+
+
+@pytest.mark.parametrize("a, b", [
+    (None, "a0"), ("a0", None), ("a0", "a1"), ("a0", "a0V"), ("a0V", "a1"),
+    ("Zz", "a0"), ("az", "b10"), ("a0", "a00001"),
+])
+def test_key_between_sorts_between(a, b):
+    key = key_between(a, b)
+    assert a is None or a < key
+    assert b is None or key < b
+
+
+def test_sequential_keys_are_short_and_sorted():
+    keys = sequential_keys(5000)
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+    assert max(len(key) for key in keys) <= 4
+
+
+def test_prepending_keeps_order():
+    keys = [INTEGER_ZERO]
+    for _ in range(500):
+        keys.insert(0, key_between(None, keys[0]))
+    assert keys == sorted(keys)
+
+
+def test_random_inserts_keep_order():
+    rng = random.Random(1)
+    keys = [INTEGER_ZERO]
+    for _ in range(2000):
+        i = rng.randrange(len(keys) + 1)
+        keys.insert(i, key_between(keys[i - 1] if i else None, keys[i] if i < len(keys) else None))
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+# ---------- In the Manager ----------
+def texts(manager, parent_id=None):
+    return [note.text for note in manager.get_children(parent_id)]
+
+
+def test_move_rewrites_only_the_moved_note(open_manager):
+    manager = open_manager()
+    ids = [manager.add_note(f"n{i}").id for i in range(5)]
+    before = {note_id: manager.get_note(note_id).order for note_id in ids}
+    manager.move_note(ids[4], before_id=ids[1])
+    assert texts(manager) == ["n0", "n4", "n1", "n2", "n3"]
+    changed = [note_id for note_id in ids if manager.get_note(note_id).order != before[note_id]]
+    assert changed == [ids[4]]
+
+
+def test_move_to_same_place_records_nothing(open_manager):
+    manager = open_manager()
+    first, second = manager.add_note("a").id, manager.add_note("b").id
+    section = manager.add_note("S", is_section=True).id
+    last_child = manager.add_note("child", parent_id=section).id
+    following = manager.add_note("T", is_section=True).id
+    steps = len(manager.history.undo_stack)
+    manager.move_note(first, before_id=second)
+    manager.move_note(following)
+    # A drop on the lower half of a section's last row points at the next section's header
+    manager.move_note(last_child, parent_id=section, before_id=following)
+    assert len(manager.history.undo_stack) == steps
+
+
+def test_crowded_gap_is_rebalanced(open_manager):
+    # Inserting again and again right after the first note makes the keys grow;
+    # past MAX_KEY_LENGTH the siblings get fresh short keys
+    manager = open_manager()
+    first = manager.add_note("first").id
+    last = manager.add_note("last").id
+    expected = ["first", "last"]
+    for i in range(300):
+        note_id = manager.add_note(f"n{i}").id
+        manager.move_note(note_id, before_id=last)
+        last = note_id
+        expected.insert(1, f"n{i}")
+    assert texts(manager) == expected
+    assert max(len(note.order) for note in manager.get_children(None)) <= MAX_KEY_LENGTH
+    assert manager.get_children(None)[0].id == first
+
+    manager.close()
+    assert texts(open_manager()) == expected
+
+
+def test_rebalance_keeps_order(open_manager):
+    manager = open_manager()
+    section = manager.add_note("S", is_section=True).id
+    for i in range(20):
+        note = manager.add_note(f"n{i}", parent_id=section)
+        manager.move_note(note.id, parent_id=section, before_id=manager.get_children(section)[0].id)
+    order = texts(manager, section)
+    manager.rebalance(section)
+    assert texts(manager, section) == order
+    keys = [note.order for note in manager.get_children(section)]
+    assert keys == sequential_keys(20)
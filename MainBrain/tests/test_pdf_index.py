@@ -0,0 +1,41 @@
+import json
+import time
+
+import pdf_index
+from pdf_index import PdfIndex, file_key
+
+
+def settle(index, timeout=5):
+    deadline = time.monotonic() + timeout
+    while index.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not index.pending
+
+
+def test_cache_is_read_off_the_ui_thread(tmp_path):
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    cache_file = tmp_path / "pdf_text.json"
+    cache_file.write_text(json.dumps({str(pdf): {"key": file_key(str(pdf)), "text": "pump valve"}}))
+
+    index = PdfIndex(str(cache_file))
+    assert index.cache is None
+    index.track(7, str(pdf))
+    settle(index)
+    assert index.match_ids("valve") == {7}
+    assert index.extractions == 0
+    index.close()
+
+
+def test_no_pool_without_a_pdf_reader(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_index, "HAS_PDF_READER", False)
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    index = PdfIndex(str(tmp_path / "pdf_text.json"))
+    index.track(7, str(pdf))
+    settle(index)
+    assert index.executor is None
+    assert index.extractions == 0
+    index.close()
+    # Nothing cached, so a reader installed later still reads the file
+    assert not (tmp_path / "pdf_text.json").exists()
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from notes import Note
+from search import SearchIndex, tokenize, trigrams
+
+
+def build(texts):
+    index = SearchIndex()
+    index.rebuild([Note(i, text) for i, text in enumerate(texts, 1)])
+    return index
+
+
+def structure(index):
+    # Everything the index derives from its notes, comparable with a fresh rebuild
+    return (index.postings, index.repeats, index.doc_tokens, index.vocabulary,
+            {gram: set(tokens) for gram, tokens in index.trigram_index.items()})
+
+
+@pytest.fixture
+def index():
+    return build(["Pump manual", "valve reset guide", "pump pump valve", "Manually reset the pumping station"])
+
+
+def test_exact_prefix_and_infix(index):
+    assert set(index.search("pump")) == {1, 3, 4}
+    assert set(index.search("val")) == {2, 3}
+    assert set(index.search("anual")) == {1, 4}   # middle of a word
+    assert index.search("zebra") == []
+
+
+def test_terms_must_all_match(index):
+    assert index.search("pump valve") == [3]
+    assert set(index.search("reset man")) == {4}
+
+
+def test_single_letter_matches_whole_tokens_only(index):
+    assert index.search("p") == []
+    single = build(["a b c", "apple"])
+    assert single.search("a") == [1]
+
+
+def test_ranking(index):
+    # Exact beats prefix, a repeated token beats a single one
+    assert index.search("pump")[:2] == [3, 1]
+    assert index.search("pump", limit=1) == [3]
+
+
+def random_texts(rng, count):
+    words = ["pump", "pumping", "valve", "manual", "manually", "reset", "sensor", "motor",
+             "alpha", "alphabet", "kalo", "lomi", "ka", "mika"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(0, 6))) for _ in range(count)]
+
+
+def test_add_and_remove_keep_the_index_consistent():
+    rng = random.Random(3)
+    texts = dict(enumerate(random_texts(rng, 200), 1))
+    index = build(texts.values())
+    for _ in range(600):
+        note_id = rng.randint(1, 250)
+        if note_id in texts and rng.random() < 0.4:
+            index.remove(note_id)
+            del texts[note_id]
+        else:
+            texts[note_id] = random_texts(rng, 1)[0]
+            index.update(note_id, texts[note_id])
+    fresh = SearchIndex()
+    fresh.rebuild([Note(note_id, text) for note_id, text in texts.items()])
+    assert structure(index) == structure(fresh)
+    assert index.vocabulary == sorted(index.postings)
+    for token in index.vocabulary:
+        assert all(token in index.trigram_index[gram] for gram in trigrams(token))
+
+
+def test_removing_the_last_use_of_a_token(index):
+    index.remove(2)   # the only "guide"
+    assert "guide" not in index.postings and "guide" not in index.vocabulary
+    assert all("guide" not in tokens for tokens in index.trigram_index.values())
+    assert index.search("guid") == []
+
+
+@pytest.mark.parametrize("query", ["pu", "pump", "man", "anual", "pump val", "ka lo", "ka mi", "set sens mot",
+                                   "alp", "lph", "zebra", "", "p", "pumping alpha reset"])
+def test_match_ids_agrees_with_search(query):
+    index = build(random_texts(random.Random(5), 2000))
+    assert index.match_ids(query) == set(index.search(query))
+
+
+def test_match_ids_cache_follows_changes(index):
+    assert index.match_ids("pump") == {1, 3, 4}
+    index.remove(1)
+    assert index.match_ids("pump") == {3, 4}
+    index.add(9, "pump again")
+    assert index.match_ids("pump") == {3, 4, 9}
+    index.update(3, "nothing here")
+    assert index.match_ids("pump") == {4, 9}
+
+
+def test_tokenize():
+    assert tokenize("Pump-Valve, ÜBER_x 42") == ["pump", "valve", "über_x", "42"]
+    assert tokenize(None) == []
@@ -0,0 +1,55 @@
+import json
+
+from settings import DEFAULTS, Settings, merge_states, settings_path_for
+
+
+def test_merge_states_keeps_both_sides():
+    old = {"1": True, "2": True, "3": False}
+    ours = {"1": False, "2": True, "3": False, "4": True}    # changed 1, added 4
+    theirs = {"1": True, "2": False, "3": False, "5": True}  # changed 2, added 5
+    assert merge_states(old, ours, theirs) == {"1": False, "2": False, "3": False, "4": True, "5": True}
+
+
+def test_merge_states_our_change_wins():
+    assert merge_states({"1": True}, {"1": False}, {"1": True}) == {"1": False}
+    # Untouched by us: their value stays even if it differs from what we last saw
+    assert merge_states({"1": True}, {"1": True}, {"1": False}) == {"1": False}
+
+
+def test_merge_states_removals():
+    # Dropped by us (pruned section): gone; dropped by them and untouched by us: stays gone
+    assert merge_states({"1": True, "2": True}, {"2": True}, {"1": True, "2": True}) == {"2": True}
+    assert merge_states({"1": True, "2": True}, {"1": True, "2": True}, {"2": True}) == {"2": True}
+
+
+def test_defaults_and_legacy(tmp_path):
+    path = settings_path_for(str(tmp_path / "notes.json"))
+    settings = Settings(path, legacy={"theme": "Dark"})
+    assert settings["theme"] == "Dark"
+    assert settings["geometry"] == DEFAULTS["geometry"]
+    with open(path) as f:
+        assert json.load(f)["theme"] == "Dark"   # migrated values are kept
+
+
+def test_two_windows_keep_each_others_changes(tmp_path):
+    path = str(tmp_path / "settings.json")
+    first, second = Settings(path), Settings(path)
+    first.set("theme", "Dark")
+    second.set("geometry", "800x600")
+    first.set_collapsed(1, False)
+    second.set_collapsed(2, True)
+
+    reread = Settings(path)
+    assert reread["theme"] == "Dark"
+    assert reread["geometry"] == "800x600"
+    assert reread["collapsed"] == {"1": False, "2": True}
+
+
+def test_unsaved_collapse_states_go_out_with_the_next_save(tmp_path):
+    path = str(tmp_path / "settings.json")
+    settings = Settings(path)
+    for note_id in range(5):
+        settings.set_collapsed(note_id, True, save=False)
+    assert Settings(path)["collapsed"] == {}
+    settings.update(last_search="")   # nothing new, but the held states are written
+    assert len(Settings(path)["collapsed"]) == 5
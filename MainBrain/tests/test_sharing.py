@@ -0,0 +1,148 @@
+import multiprocessing
+import random
+import time
+
+from notes_manager import NotesManager
+from storage import JournalStorage, open_storage
+
+
+def contents(manager):
+    # Order among notes two windows appended at the same time is not fixed; contents are
+    manager.load_bodies()
+    return {note.id: (note.text, note.parent) for note in manager.notes}
+
+
+def sync(*managers):
+    # Two rounds, as the watcher would: with JSON, a window whose save was held back
+    # only writes it once it has merged the other's
+    for _ in range(2):
+        for manager in managers:
+            manager.flush()
+            manager.merge(*manager.external_changes())
+
+
+def start(open_manager, backend):
+    first = open_manager(backend)
+    section = first.add_note("Shared", is_section=True)
+    for i in range(5):
+        first.add_note(f"base {i}", parent_id=section.id)
+    second = open_manager(backend)
+    return first, second, section.id
+
+
+# ---------- Two Windows, One Process ----------
+def test_adds_from_both_sides_merge(open_manager, backend):
+    first, second, section = start(open_manager, backend)
+    ours = [first.add_note(f"first {i}", parent_id=section).id for i in range(3)]
+    theirs = [second.add_note(f"second {i}", parent_id=section).id for i in range(3)]
+    assert not set(ours) & set(theirs)
+
+    sync(first, second)
+    assert contents(first) == contents(second)
+    assert set(ours + theirs) <= set(contents(first))
+    expected = contents(first)
+    first.close()
+    second.close()
+    assert contents(open_manager(backend)) == expected
+
+
+def test_edits_moves_and_deletes_merge(open_manager, backend):
+    first, second, section = start(open_manager, backend)
+    base = [note.id for note in first.get_children(section)]
+    first.update_note(base[0], text="edited by first")
+    first.move_note(base[1])
+    second.delete_note(base[2])
+    second.update_note(base[3], text="edited by second")
+    loose = second.add_note("loose")
+
+    sync(first, second)
+    assert contents(first) == contents(second)
+    merged = contents(first)
+    assert merged[base[0]] == ("edited by first", section)
+    assert merged[base[1]] == ("base 1", None)
+    assert base[2] not in merged
+    assert merged[base[3]] == ("edited by second", section)
+    assert merged[loose.id] == ("loose", None)
+
+
+def test_nothing_to_merge_when_nobody_wrote(open_manager, backend):
+    first, second, _ = start(open_manager, backend)
+    sync(first, second)
+    assert second.external_changes() == ([], None)
+
+
+def test_merge_after_the_other_compacted(open_manager, data_file):
+    # The other window folds the journal into a new snapshot while we are behind
+    first = NotesManager(data_file, storage=JournalStorage(data_file, compact_threshold=1024))
+    second = open_manager()
+    try:
+        section = first.add_note("Shared", is_section=True).id
+        for i in range(60):
+            first.add_note(f"note {i}", parent_id=section)
+        second.add_note("second's own")
+        sync(first, second)
+        assert contents(first) == contents(second)
+    finally:
+        first.close()
+
+
+def test_synced_merges_first(open_manager, backend):
+    first, second, _ = start(open_manager, backend)
+    second.add_note("before")
+    with first.synced():
+        assert "before" in {text for text, _ in contents(first).values()}
+
+
+# ---------- Separate Processes ----------
+def editor(backend, data_file, name, edits, seed, go, results):
+    storage = open_storage(backend, data_file)
+    manager = NotesManager(data_file, storage=storage, write_delay=0.005)
+    rng = random.Random(seed)
+    sections = [note.id for note in manager.get_children(None) if note.is_section]
+    mine = []
+    go.wait()
+    for i in range(edits):
+        manager.merge(*manager.external_changes())
+        roll = rng.random()
+        if mine and roll < 0.3:
+            manager.update_note(rng.choice(mine), text=f"{name} edit {i}")
+        elif mine and roll < 0.4:
+            manager.move_note(rng.choice(mine), parent_id=rng.choice(sections))
+        elif mine and roll < 0.5:
+            manager.delete_note(mine.pop(rng.randrange(len(mine))))
+        else:
+            mine.append(manager.add_note(f"{name} add {i}", parent_id=rng.choice(sections)).id)
+        time.sleep(rng.random() * 0.002)
+    manager.flush()
+    expected = {note_id: (manager.get_note(note_id).text, manager.get_note(note_id).parent)
+                for note_id in mine}
+    manager.close()
+    results.put((name, expected))
+
+
+def test_processes_lose_no_edits(open_manager, backend, data_file):
+    manager = open_manager(backend)
+    for i in range(3):
+        manager.add_note(f"Section {i}", is_section=True)
+    manager.close()
+
+    context = multiprocessing.get_context("spawn")
+    go, results = context.Event(), context.Queue()
+    workers = [context.Process(target=editor, args=(backend, data_file, f"p{i}", 150, i, go, results))
+               for i in range(2)]
+    for worker in workers:
+        worker.start()
+    go.set()
+    outcomes = [results.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    merged = contents(open_manager(backend))
+    expected = {}
+    for _, edits in outcomes:
+        expected.update(edits)
+    assert {note_id: merged.get(note_id) for note_id in expected} == expected
+    # No deleted note came back, and nothing got copied under a second id
+    written = {note_id for note_id, (text, _) in merged.items() if text.startswith("p")}
+    assert written == set(expected)
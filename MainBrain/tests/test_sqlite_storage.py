@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+
+from notes_manager import NotesManager
+from sqlite_storage import FTS_SCHEMA, SqliteStorage, db_path_for, migrate_json_to_sqlite, open_sqlite_storage
+
+
+def legacy_notebook(path):
+    # A notes file as the JSON app wrote it: no order keys, file order is the order
+    notes = [
+        {"id": 4, "text": "Work", "is_section": True, "parent_section_id": None, "collapsed": False},
+        {"id": 2, "text": "pump manual", "is_section": False, "parent_section_id": 4, "pdf_path": "/d/p.pdf"},
+        {"id": 9, "text": "valve", "is_section": False, "parent_section_id": 4, "color": "red"},
+        {"id": 1, "text": "loose", "is_section": False, "parent_section_id": None},
+        {"id": 3, "text": "Home", "is_section": True, "parent_section_id": None, "collapsed": True},
+        {"id": 7, "text": "plants", "is_section": False, "parent_section_id": 3},
+    ]
+    with open(path, "w") as f:
+        json.dump({"notes": notes, "next_id": 5}, f)
+    return notes
+
+
+def outline(manager):
+    manager.load_bodies()
+    return [{k: v for k, v in note.to_dict().items() if k != "order"} for note in manager.notes]
+
+
+# ---------- JSON -> SQLite ----------
+def test_migration_keeps_notes_and_order(tmp_path):
+    data_file = str(tmp_path / "notes.json")
+    legacy_notebook(data_file)
+    from_json = NotesManager(data_file)
+    expected = outline(from_json)
+    from_json.close()
+
+    storage = open_sqlite_storage(data_file)
+    assert os.path.exists(db_path_for(data_file))
+    manager = NotesManager(data_file, storage=storage)
+    assert outline(manager) == expected
+    # next_id in the file was stale; ids must not be handed out twice
+    assert manager.add_note("new").id > 9
+    assert manager.search("valve") == [9]
+    manager.close()
+
+
+def test_migration_runs_once(tmp_path):
+    data_file = str(tmp_path / "notes.json")
+    legacy_notebook(data_file)
+    manager = NotesManager(data_file, storage=open_sqlite_storage(data_file))
+    manager.add_note("only in the database")
+    manager.close()
+    manager = NotesManager(data_file, storage=open_sqlite_storage(data_file))
+    assert "only in the database" in [note.text for note in manager.notes]
+    manager.close()
+
+
+def test_migrate_command_counts_notes(tmp_path):
+    data_file = str(tmp_path / "notes.json")
+    notes = legacy_notebook(data_file)
+    assert migrate_json_to_sqlite(data_file, str(tmp_path / "copy.db")) == len(notes)
+    storage = SqliteStorage(str(tmp_path / "copy.db"))
+    data, _ = storage.load()
+    storage.close()
+    assert sorted(note["id"] for note in data["notes"]) == sorted(note["id"] for note in notes)
+
+
+# ---------- Positions -> Order Keys ----------
+POSITION_SCHEMA = """
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL DEFAULT '',
+    is_section INTEGER NOT NULL DEFAULT 0,
+    parent_section_id INTEGER,
+    collapsed INTEGER,
+    pdf_path TEXT,
+    extra TEXT,
+    position REAL NOT NULL
+);
+CREATE INDEX notes_parent ON notes(parent_section_id, position);
+CREATE INDEX notes_sections ON notes(id) WHERE is_section = 1;
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def test_positions_become_order_keys(tmp_path):
+    # Databases from before order keys sorted siblings by a REAL position
+    db_file = str(tmp_path / "notes.db")
+    conn = sqlite3.connect(db_file)
+    conn.executescript(POSITION_SCHEMA + FTS_SCHEMA)
+    rows = [(1, "Work", 1, None, 2.0), (2, "Home", 1, None, 1.0),
+            (3, "third", 0, 1, 0.75), (4, "first", 0, 1, 0.125), (5, "second", 0, 1, 0.5),
+            (6, "loose", 0, None, 1.5)]
+    conn.executemany("INSERT INTO notes (id, text, is_section, parent_section_id, position) VALUES (?, ?, ?, ?, ?)",
+                     rows)
+    conn.execute("INSERT INTO meta VALUES ('next_id', '7')")
+    conn.commit()
+    conn.close()
+
+    manager = NotesManager(str(tmp_path / "notes.json"), storage=SqliteStorage(db_file))
+    assert [note.text for note in manager.get_children(None)] == ["Home", "loose", "Work"]
+    assert [note.text for note in manager.get_children(1)] == ["first", "second", "third"]
+    assert manager.search("second") == [5]
+
+    # Keys work like any others afterwards
+    manager.move_note(3, parent_id=1, before_id=4)
+    manager.close()
+    manager = NotesManager(str(tmp_path / "notes.json"), storage=SqliteStorage(db_file))
+    assert [note.text for note in manager.get_children(1)] == ["third", "first", "second"]
+    manager.close()
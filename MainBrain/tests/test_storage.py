@@ -0,0 +1,109 @@
+import json
+import os
+
+from storage import read_json
+
+
+def notes_of(manager):
+    return manager.snapshot()["notes"]
+
+
+def fill(manager, count=20):
+    section = manager.add_note("Section", is_section=True)
+    for i in range(count):
+        note = manager.add_note(f"note {i}", parent_id=section.id)
+        if i % 3 == 0:
+            manager.update_note(note.id, text=f"note {i} edited")
+        if i % 5 == 0:
+            manager.move_note(note.id, parent_id=section.id, before_id=manager.get_children(section.id)[0].id)
+    manager.delete_note(manager.get_children(section.id)[-1].id)
+    return section
+
+
+def journal_lines(data_file):
+    with open(data_file + ".journal") as f:
+        return [json.loads(line) for line in f]
+
+
+# ---------- Journal Replay ----------
+def test_journal_is_replayed_on_load(open_manager, data_file):
+    manager = open_manager()
+    fill(manager)
+    expected = notes_of(manager)
+    manager.close()
+    assert not os.path.exists(data_file)   # nothing folded into a snapshot yet
+    assert len(journal_lines(data_file)) > 20
+    assert notes_of(open_manager()) == expected
+
+
+def test_journal_records_are_numbered(open_manager, data_file):
+    manager = open_manager()
+    fill(manager, 5)
+    manager.close()
+    seqs = [record["seq"] for record in journal_lines(data_file)]
+    assert seqs == list(range(1, len(seqs) + 1))
+
+
+def test_torn_last_line_is_dropped(open_manager, data_file):
+    manager = open_manager()
+    fill(manager, 5)
+    expected = notes_of(manager)
+    manager.close()
+    size = os.path.getsize(data_file + ".journal")
+    with open(data_file + ".journal", "a") as f:
+        f.write('{"op": "add", "note": {"id": 99')   # crash in the middle of a write
+    assert notes_of(open_manager()) == expected
+    assert os.path.getsize(data_file + ".journal") == size
+
+
+def test_journal_after_snapshot(open_manager, data_file):
+    manager = open_manager()
+    fill(manager, 5)
+    manager.save_notes()
+    assert not os.path.exists(data_file + ".journal")
+    manager.add_note("after the snapshot")
+    expected = notes_of(manager)
+    manager.close()
+    assert [record["op"] for record in journal_lines(data_file)] == ["add"]
+    assert notes_of(open_manager()) == expected
+
+
+def test_legacy_journal_without_numbers(open_manager, data_file):
+    # Journals written before records carried "seq" still replay in file order
+    with open(data_file, "w") as f:
+        json.dump({"notes": [{"id": 1, "text": "old", "is_section": False, "parent_section_id": None}],
+                   "next_id": 2}, f)
+    with open(data_file + ".journal", "w") as f:
+        f.write(json.dumps({"op": "update", "id": 1, "fields": {"text": "newer"}}) + "\n")
+        f.write(json.dumps({"op": "add", "note": {"id": 2, "text": "added", "is_section": False,
+                                                  "parent_section_id": None}}) + "\n")
+    manager = open_manager()
+    assert [note.text for note in manager.get_children(None)] == ["newer", "added"]
+
+
+# ---------- Compaction ----------
+def test_compaction_folds_journal_into_snapshot(open_manager, data_file):
+    manager = open_manager(compact_threshold=2048)
+    fill(manager, 100)
+    expected = notes_of(manager)
+    manager.close()   # waits for a compaction still running
+
+    snapshot = read_json(data_file)
+    assert snapshot["seq"] > 0
+    remaining = journal_lines(data_file)
+    assert all(record["seq"] > snapshot["seq"] for record in remaining)
+    assert os.path.getsize(data_file + ".journal") < 2048 * 2
+    assert notes_of(open_manager()) == expected
+
+
+def test_compaction_keeps_counting(open_manager, data_file):
+    # Record numbers go on after a compaction emptied the journal
+    manager = open_manager(compact_threshold=1024)
+    fill(manager, 50)
+    manager.close()
+    last = read_json(data_file)["seq"]
+    manager = open_manager(compact_threshold=1024)
+    manager.add_note("later")
+    manager.close()
+    assert journal_lines(data_file)[-1]["seq"] > last
+    assert open_manager().get_children(None)[-1].text == "later"
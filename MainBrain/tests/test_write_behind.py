@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from notes_manager import NotesManager
+from write_behind import WriteBehind
+
+
+def notes_of(manager):
+    return manager.snapshot()["notes"]
+
+
+def journal_lines(data_file):
+    with open(data_file + ".journal") as f:
+        return [json.loads(line) for line in f]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FlakyStorage:
+    """Keeps written records in a list; raises OSError while `failing` is set."""
+
+    def __init__(self):
+        self.failing = False
+        self.written = []
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def append(self, op, manager):
+        if self.failing:
+            raise OSError(28, "No space left on device")
+        self.written.append(op)
+
+    def load(self):
+        return {}, []
+
+    def unwritten(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_write_behind_holds_changes_until_flush(open_manager, data_file):
+    manager = open_manager(write_delay=60)
+    manager.add_note("queued")
+    manager.add_note("queued too")
+    assert manager.pending_writes == 2
+    assert not os.path.exists(data_file + ".journal")
+
+    manager.flush()
+    assert manager.pending_writes == 0
+    assert [record["op"] for record in journal_lines(data_file)] == ["add", "add"]
+
+
+def test_write_behind_writes_after_delay(open_manager, data_file):
+    manager = open_manager(write_delay=0.01)
+    manager.add_note("soon")
+    assert wait_for(lambda: manager.storage.write_count)
+    assert manager.pending_writes == 0
+    assert len(journal_lines(data_file)) == 1
+
+
+def test_close_writes_everything(open_manager, backend):
+    manager = open_manager(backend, write_delay=60)
+    section = manager.add_note("Section", is_section=True)
+    for i in range(10):
+        note = manager.add_note(f"note {i}", parent_id=section.id)
+        manager.update_note(note.id, text=f"note {i} edited")
+    manager.delete_note(note.id)
+    expected = notes_of(manager)
+    manager.close()
+    assert notes_of(open_manager(backend)) == expected
+
+
+def test_burst_of_edits_is_one_write(open_manager, data_file):
+    manager = open_manager(write_delay=1)
+    note = manager.add_note("typing")
+    for i in range(99):
+        manager.update_note(note.id, text=f"typing {i}")
+    assert wait_for(lambda: manager.storage.write_count)
+    time.sleep(0.05)
+    assert manager.storage.write_count == 1
+    assert len(journal_lines(data_file)) == 100
+
+
+# ---------- Failed Writes ----------
+def test_failed_write_is_kept_and_retried(data_file):
+    inner = FlakyStorage()
+    inner.failing = True
+    storage = WriteBehind(inner, delay=0.01, retry_delay=0.05)
+    manager = NotesManager(data_file, storage=storage)
+    first = manager.add_note("first")
+    assert wait_for(lambda: storage.error is not None)
+    second = manager.add_note("second")
+
+    assert storage.thread.is_alive()
+    assert isinstance(manager.write_error, OSError)
+    assert manager.pending_writes == 2
+    assert [op["note"]["id"] for op in manager.unwritten()] == [first.id, second.id]
+
+    inner.failing = False
+    assert wait_for(lambda: not manager.unwritten())
+    assert [op["note"]["text"] for op in inner.written] == ["first", "second"]
+    assert manager.write_error is None
+    manager.close()
+
+
+def test_flush_raises_and_keeps_records(data_file):
+    inner = FlakyStorage()
+    storage = WriteBehind(inner, delay=60)
+    manager = NotesManager(data_file, storage=storage)
+    manager.add_note("first")
+    inner.failing = True
+    with pytest.raises(OSError):
+        manager.flush()
+    assert manager.pending_writes == 1
+    inner.failing = False
+    manager.close()
+    assert [op["note"]["text"] for op in inner.written] == ["first"]
+
+
+def test_full_text_search_sees_queued_changes(open_manager):
+    # SQLite searches on disk: a note still waiting for the writer must turn up anyway
+    manager = open_manager("sqlite", write_delay=60)
+    first = manager.add_note("zebra one")
+    second = manager.add_note("zebra two")
+    assert manager.match_ids("zebra") == {first.id, second.id}
+    manager.update_note(first.id, text="horse")
+    assert manager.search("zebra") == [second.id]
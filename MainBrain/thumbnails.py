@@ -0,0 +1,164 @@
+import hashlib
+import importlib.util
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from pdf_index import file_key
+
+THUMB_SIZE = (90, 120)         # box the first page is fitted into
+MEMORY_ITEMS = 64              # decoded previews kept in memory
+DISK_BYTES = 50 * 1024 * 1024  # on-disk cache is trimmed to this, least recently used first
+MAX_WORKERS = 2
+POLL_MS = 30
+
+# Checked once: without PyMuPDF (see pdf_utils.render_first_page) there are no previews to wait for
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+
+def thumb_cache_dir_for(data_file):
+    return os.path.join(os.path.dirname(data_file), "cache", "thumbnails")
+
+
+class ThumbnailCache:
+    """
+    First-page previews of attached PDFs, for the rows on screen.
+    get() answers from an in-memory LRU or returns None and queues the work:
+    a lookup in the on-disk cache (PNG named after path, mtime and size) and,
+    on a miss, a render in a worker process. on_ready(path, image) then runs on
+    the Tk thread. A changed file has a new mtime/size, hence a new entry.
+    Without PyMuPDF nothing is queued: every file simply has no preview.
+    """
+
+    def __init__(self, root, cache_dir, render=None, size=THUMB_SIZE,
+                 max_bytes=DISK_BYTES, memory_items=MEMORY_ITEMS):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.render = render
+        self.enabled = render is not None or HAS_PYMUPDF
+        self.size = size
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+
+        self.memory = OrderedDict()   # (path, mtime, size) -> CTkImage, or False if there is no preview
+        self.waiters = {}             # (path, mtime, size) -> on_ready callbacks
+        self.finished = queue.Queue()
+        self.disk_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.loader = None
+        self.renderer = None
+        self.poll_job = None
+
+    def get(self, path, on_ready):
+        key = file_key(path)
+        if key is None:
+            return None
+        item = (path, *key)
+        if item in self.memory:
+            self.memory.move_to_end(item)
+            return self.memory[item] or None
+        if not self.enabled:
+            self.remember(item, False)
+            return None
+
+        if item not in self.waiters:
+            self.waiters[item] = []
+            if self.loader is None:
+                self.loader = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="thumbnails")
+            self.loader.submit(self.load, item)
+        self.waiters[item].append(on_ready)
+        if self.poll_job is None:
+            self.poll_job = self.root.after(POLL_MS, self.poll)
+        return None
+
+    def disk_path(self, item):
+        path, mtime, size = item
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{digest}_{mtime}_{size}_{self.size[0]}x{self.size[1]}.png")
+
+    # ---------- Worker Threads ----------
+    def load(self, item):
+        # Never touches Tk; hands a decoded PIL image (or None) to poll()
+        image = None
+        try:
+            png = self.disk_path(item)
+            if os.path.exists(png):
+                os.utime(png)   # mark as recently used
+            elif not self.render_to(item, png):
+                png = None
+            if png is not None:
+                image = Image.open(png)
+                image.load()
+        except Exception:
+            image = None
+        self.finished.put((item, image))
+
+    def render_to(self, item, png):
+        with self.start_lock:
+            if self.renderer is None:
+                if self.render is None:
+                    from pdf_utils import render_first_page
+                    self.render = render_first_page
+                self.renderer = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = png + ".tmp.png"
+        if not self.renderer.submit(self.render, item[0], tmp_path, self.size).result():
+            return False
+        os.replace(tmp_path, png)
+        self.trim(png)
+        return True
+
+    def trim(self, newest):
+        with self.disk_lock:
+            prefix = os.path.basename(newest).split("_", 1)[0] + "_"
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                full = os.path.join(self.cache_dir, name)
+                if name.startswith(prefix) and full != newest:
+                    # Older version of the same file
+                    os.remove(full)
+                    continue
+                stat = os.stat(full)
+                entries.append((stat.st_mtime, stat.st_size, full))
+            total = sum(size for _, size, _ in entries)
+            for _, size, full in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if full != newest:
+                    os.remove(full)
+                    total -= size
+
+    # ---------- Tk Thread ----------
+    def poll(self):
+        self.poll_job = None
+        while True:
+            try:
+                item, image = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if image is not None:
+                from customtkinter import CTkImage
+                image = CTkImage(light_image=image, dark_image=image, size=image.size)
+            self.remember(item, image or False)
+            for on_ready in self.waiters.pop(item, ()):
+                on_ready(item[0], image)
+        if self.waiters:
+            self.poll_job = self.root.after(POLL_MS, self.poll)
+
+    def remember(self, item, image):
+        self.memory[item] = image
+        self.memory.move_to_end(item)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def shutdown(self):
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        for pool in (self.loader, self.renderer):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
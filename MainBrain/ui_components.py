@@ -1,187 +1,233 @@
-import customtkinter as ctk
-from tkinter import filedialog
-from pdf_utils import open_pdf
-
-# ---------- Note Popups ----------
-def create_note_popup(master, notes_manager, font, parent_id=None, note_to_edit=None):
-    popup = ctk.CTkToplevel(master)
-    popup.title("Add/Edit Note")
-    popup.geometry("650x350")  # Wider than before for long notes
-    popup.attributes("-topmost", True)  # Always on top
-
-    ctk.CTkLabel(popup, text="Note text:", font=font).pack(pady=10)
-
-    # Frame to hold textbox + scrollbar
-    text_frame = ctk.CTkFrame(popup)
-    text_frame.pack(pady=5, padx=10, fill="both", expand=True)
-
-    # Multi-line text box (keep same size)
-    text_box = ctk.CTkTextbox(text_frame, width=500, height=150, font=font)
-    text_box.pack(side="left", fill="both", expand=True)
-
-    # Vertical scrollbar
-    scrollbar = ctk.CTkScrollbar(text_frame, orientation="vertical", command=text_box.yview)
-    scrollbar.pack(side="right", fill="y")
-    text_box.configure(yscrollcommand=scrollbar.set)
-
-    if note_to_edit:
-        text_box.insert("0.0", note_to_edit["text"])
-
-    pdf_path_var = {"path": None}
-
-    def attach_pdf():
-        filepath = filedialog.askopenfilename(title="Select PDF file",
-                                              filetypes=[("PDF files", "*.pdf")])
-        if filepath:
-            pdf_path_var["path"] = filepath
-            # Optional: show PDF filename at top of text box
-            text_box.insert("0.0", f"[Attached PDF: {filepath.split('/')[-1]}]\n")
-
-    attach_btn = ctk.CTkButton(popup, text="Attach PDF", command=attach_pdf, font=font)
-    attach_btn.pack(pady=(5,5))
-
-    def confirm():
-        text = text_box.get("0.0", "end").strip()
-        if text:
-            if note_to_edit:
-                note_to_edit["text"] = text
-                if pdf_path_var["path"]:
-                    note_to_edit["pdf_path"] = pdf_path_var["path"]
-            else:
-                notes_manager.add_note(text, parent_id=parent_id, pdf_path=pdf_path_var["path"])
-            popup.destroy()
-            if hasattr(master, "render_notes"):
-                master.render_notes()
-
-    btn_text = "Update Note" if note_to_edit else "Add Note"
-    ctk.CTkButton(popup, text=btn_text, command=confirm, font=font).pack(pady=(5,10))
-
-    text_box.focus()
-
-
-
-# ---------- Collapse ----------
-def toggle_collapse(note, notes_manager, render_fn):
-    note["collapsed"] = not note.get("collapsed", True)
-    notes_manager.save_notes()
-    render_fn()
-
-
-HIGHLIGHT_COLOR = "#D0E0FF"      # ghost highlight color
-INSERT_LINE_COLOR = "#000000"    # black insertion line
-INSERT_LINE_THICKNESS = 4        # thicker line for boundary emphasis
-
-
-# ---------- Drag and Drop Helpers ----------
-def make_draggable(widget, note_id, app, is_section=False):
-    widget.bind("<Button-1>", lambda e: start_drag(e, widget, note_id, app, is_section))
-    widget.bind("<B1-Motion>", lambda e: drag_motion(e, widget, app))
-    widget.bind("<ButtonRelease-1>", lambda e: end_drag(e, widget, note_id, app, is_section))
-
-
-def start_drag(event, widget, note_id, app, is_section):
-    app.drag_data = {
-        "widget": widget,
-        "note_id": note_id,
-        "is_section": is_section,
-        "mouse_offset_y": event.y_root - widget.winfo_rooty(),
-    }
-
-    if is_section:
-        app.drag_data["child_ids"] = [
-            n["id"] for n in app.notes_manager.notes if n.get("parent_section_id") == note_id
-        ]
-
-    ghost = ctk.CTkFrame(widget.master, width=widget.winfo_width(), height=widget.winfo_height(), corner_radius=5)
-    ghost.configure(fg_color=HIGHLIGHT_COLOR)
-    ghost.place(x=widget.winfo_x(), y=widget.winfo_y())
-    app.drag_data["ghost"] = ghost
-
-    insert_line = ctk.CTkFrame(widget.master, width=widget.winfo_width(), height=2, fg_color=INSERT_LINE_COLOR)
-    insert_line.place_forget()
-    app.drag_data["insert_line"] = insert_line
-
-
-def drag_motion(event, widget, app):
-    ghost = app.drag_data.get("ghost")
-    insert_line = app.drag_data.get("insert_line")
-    if not ghost or not insert_line:
-        return
-
-    new_y = event.y_root - widget.master.winfo_rooty() - app.drag_data["mouse_offset_y"]
-    scroll_height = widget.master.winfo_height()
-    widget_height = widget.winfo_height()
-    new_y = max(0, min(new_y, scroll_height - widget_height))
-    ghost.place(y=new_y)
-
-    children = [c for c in widget.master.winfo_children() if c not in (ghost, insert_line)]
-    line_y = 0
-    thickness = 2
-
-    if new_y < children[0].winfo_y():  # top boundary
-        line_y = children[0].winfo_y() - INSERT_LINE_THICKNESS // 2
-        thickness = INSERT_LINE_THICKNESS
-    elif new_y + widget_height > children[-1].winfo_y() + children[-1].winfo_height():  # bottom boundary
-        line_y = children[-1].winfo_y() + children[-1].winfo_height() - INSERT_LINE_THICKNESS // 2
-        thickness = INSERT_LINE_THICKNESS
-    else:
-        for i, child in enumerate(children):
-            child_center = child.winfo_y() + child.winfo_height() / 2
-            if new_y < child_center:
-                line_y = child.winfo_y()
-                break
-            line_y = child.winfo_y() + child.winfo_height()
-
-    insert_line.configure(height=thickness)
-    insert_line.place(x=10, y=line_y)
-
-
-def end_drag(event, widget, note_id, app, is_section):
-    ghost = app.drag_data.get("ghost")
-    insert_line = app.drag_data.get("insert_line")
-    if ghost:
-        ghost.destroy()
-    if insert_line:
-        insert_line.destroy()
-
-    notes = app.notes_manager.notes
-    dragged_index = next((i for i, n in enumerate(notes) if n["id"] == note_id), None)
-    if dragged_index is None:
-        app.drag_data = {}
-        return
-
-    widget_y = event.y_root - app.scroll_frame.winfo_rooty()
-    positions = [(i, child.winfo_y() + child.winfo_height() / 2)
-                 for i, child in enumerate(app.scroll_frame.winfo_children())]
-    new_index = dragged_index
-    for i, pos in positions:
-        if widget_y < pos:
-            new_index = i
-            break
-        new_index = i + 1
-
-    if is_section:
-        section = notes.pop(dragged_index)
-        children = [notes.pop(next(i for i, n in enumerate(notes) if n["id"] == cid))
-                    for cid in app.drag_data.get("child_ids", [])]
-        insert_list = [section] + children
-        notes[new_index:new_index] = insert_list
-    else:
-        note = notes.pop(dragged_index)
-        notes.insert(new_index, note)
-
-    app.notes_manager.save_notes()
-    app.render_notes()
-    app.drag_data = {}
-
-def delete_note_safe(note, app):
-    """
-    Safely delete a note (section or child) using the main app instance.
-    """
-    if note.get("is_section"):
-        # Remove children first
-        child_ids = [n["id"] for n in app.notes_manager.notes if n.get("parent_section_id") == note["id"]]
-        for cid in child_ids:
-            app.notes_manager.delete_note(cid)
-    app.notes_manager.delete_note(note["id"])
-    app.render_notes()
\ No newline at end of file
+import os
+from tkinter import filedialog
+
+import customtkinter as ctk
+from perf import timed
+
+# ---------- Note Popups ----------
+def create_note_popup(master, notes_manager, font, parent_id=None, note_to_edit=None):
+    popup = ctk.CTkToplevel(master)
+    popup.title("Add/Edit Note")
+    popup.geometry("650x350")  # Wider than before for long notes
+    popup.attributes("-topmost", True)  # Always on top
+
+    ctk.CTkLabel(popup, text="Note text:", font=font).pack(pady=10)
+
+    # Frame to hold textbox + scrollbar
+    text_frame = ctk.CTkFrame(popup)
+    text_frame.pack(pady=5, padx=10, fill="both", expand=True)
+
+    # Multi-line text box (keep same size)
+    text_box = ctk.CTkTextbox(text_frame, width=500, height=150, font=font)
+    text_box.pack(side="left", fill="both", expand=True)
+
+    # Vertical scrollbar
+    scrollbar = ctk.CTkScrollbar(text_frame, orientation="vertical", command=text_box.yview)
+    scrollbar.pack(side="right", fill="y")
+    text_box.configure(yscrollcommand=scrollbar.set)
+
+    if note_to_edit:
+        text_box.insert("0.0", note_to_edit.text)
+
+    pdf_path_var = {"path": None}
+
+    def attach_pdf():
+        filepath = filedialog.askopenfilename(title="Select PDF file",
+                                              filetypes=[("PDF files", "*.pdf")])
+        if not filepath:
+            return
+        # Copied into the attachment store on a worker thread; big files take a while to hash
+        name = os.path.basename(filepath)
+        future = master.attachments.add_async(filepath)
+        status_label.configure(text=f"Attaching {name}...")
+        confirm_btn.configure(state="disabled")
+
+        def check():
+            if not popup.winfo_exists():
+                return
+            if not future.done():
+                popup.after(50, check)
+                return
+            confirm_btn.configure(state="normal")
+            try:
+                pdf_path_var["path"] = future.result()
+            except OSError as e:
+                status_label.configure(text=f"Could not attach {name}: {e.strerror}")
+                return
+            status_label.configure(text="")
+            # Optional: show PDF filename at top of text box
+            text_box.insert("0.0", f"[Attached PDF: {name}]\n")
+
+        check()
+
+    attach_btn = ctk.CTkButton(popup, text="Attach PDF", command=attach_pdf, font=font)
+    attach_btn.pack(pady=(5,5))
+    status_label = ctk.CTkLabel(popup, text="", font=font)
+    status_label.pack()
+
+    def confirm():
+        text = text_box.get("0.0", "end").strip()
+        if text:
+            if note_to_edit:
+                fields = {"text": text}
+                if pdf_path_var["path"]:
+                    fields["pdf_path"] = pdf_path_var["path"]
+                notes_manager.update_note(note_to_edit.id, **fields)
+            else:
+                notes_manager.add_note(text, parent_id=parent_id, pdf_path=pdf_path_var["path"])
+            popup.destroy()
+            if hasattr(master, "render_notes"):
+                master.render_notes()
+
+    btn_text = "Update Note" if note_to_edit else "Add Note"
+    confirm_btn = ctk.CTkButton(popup, text=btn_text, command=confirm, font=font)
+    confirm_btn.pack(pady=(5,10))
+
+    text_box.focus()
+
+
+
+HIGHLIGHT_COLOR = "#D0E0FF"      # ghost highlight color
+INSERT_LINE_COLOR = "#000000"    # black insertion line
+INSERT_LINE_THICKNESS = 4        # thicker line for boundary emphasis
+DRAG_FRAME_MS = 16               # drag feedback is redrawn at most once per frame
+
+
+# ---------- Drag and Drop Helpers ----------
+def make_draggable(widget, note_id, app, is_section=False):
+    widget.bind("<Button-1>", lambda e: start_drag(e, widget, note_id, app, is_section))
+    widget.bind("<B1-Motion>", lambda e: drag_motion(e, widget, app))
+    widget.bind("<ButtonRelease-1>", lambda e: end_drag(e, widget, note_id, app, is_section))
+
+
+@timed("drag start")
+def start_drag(event, widget, note_id, app, is_section):
+    note_list = app.note_list
+    canvas = note_list.canvas
+
+    # Geometry is read once here; motion events only do arithmetic on it
+    canvas_rooty = canvas.winfo_rooty()
+    top = canvas.canvasy(0)
+    index = note_list.index_at(widget.winfo_rooty() - canvas_rooty + top + 1)
+    count = 1
+    if is_section:
+        while index + count < len(note_list.rows) and note_list.rows[index + count][1]:
+            count += 1
+
+    app.drag_data = {
+        "widget": widget,
+        "note_id": note_id,
+        "is_section": is_section,
+        "mouse_offset_y": event.y_root - widget.winfo_rooty(),
+        "canvas_rooty": canvas_rooty,
+        "top": top,
+        "max_y": canvas.winfo_height() - widget.winfo_height(),
+        "index": index,
+        "count": count,
+        "slot": None,
+        "y_root": event.y_root,
+        "job": None,
+    }
+
+    ghost = ctk.CTkFrame(widget.master, width=widget.winfo_width(), height=widget.winfo_height(), corner_radius=5)
+    ghost.configure(fg_color=HIGHLIGHT_COLOR)
+    ghost.place(x=widget.winfo_x(), y=widget.winfo_y())
+    app.drag_data["ghost"] = ghost
+
+    insert_line = ctk.CTkFrame(widget.master, width=widget.winfo_width(), height=2, fg_color=INSERT_LINE_COLOR)
+    insert_line.place_forget()
+    app.drag_data["insert_line"] = insert_line
+
+
+def drag_motion(event, widget, app):
+    # Motion events come much faster than frames; only the latest one per frame is drawn
+    drag = app.drag_data
+    if not drag.get("ghost"):
+        return
+    drag["y_root"] = event.y_root
+    if drag["job"] is None:
+        drag["job"] = app.after(DRAG_FRAME_MS, lambda: update_drag(app))
+
+
+@timed("drag")
+def update_drag(app):
+    drag = app.drag_data
+    drag["job"] = None
+    ghost = drag.get("ghost")
+    insert_line = drag.get("insert_line")
+    if not ghost or not insert_line:
+        return
+
+    y = drag["y_root"] - drag["canvas_rooty"]
+    ghost.place(y=max(0, min(y - drag["mouse_offset_y"], drag["max_y"])))
+
+    # Bisection over the list's cached row offsets; the line only moves when the slot does
+    note_list = app.note_list
+    slot = note_list.slot_at(y + drag["top"])
+    if slot == drag["slot"]:
+        return
+    drag["slot"] = slot
+    thickness = 2
+    if slot == 0 or slot == len(note_list.rows):  # top / bottom boundary
+        thickness = INSERT_LINE_THICKNESS
+
+    insert_line.configure(height=thickness)
+    insert_line.place(x=10, y=note_list.offsets[min(slot, len(note_list.rows))] - drag["top"] - thickness // 2)
+
+
+@timed("drop")
+def end_drag(event, widget, note_id, app, is_section):
+    drag = app.drag_data
+    app.drag_data = {}
+    if drag.get("job") is not None:
+        app.after_cancel(drag["job"])
+    for key in ("ghost", "insert_line"):
+        if drag.get(key):
+            drag[key].destroy()
+
+    dragged = app.notes_manager.get_note(note_id)
+    if dragged is None or "index" not in drag:
+        return
+
+    note_list = app.note_list
+    rows = note_list.rows
+    slot = note_list.slot_at(event.y_root - drag["canvas_rooty"] + drag["top"])
+
+    if is_section:
+        # Sections only land between top-level rows (their children move with them)
+        while slot < len(rows) and rows[slot][1]:
+            slot += 1
+        parent_id = None
+    else:
+        # A note joins the section of the row it is dropped under
+        prev = rows[slot - 1][0] if slot > 0 else None
+        if prev is None:
+            parent_id = None
+        elif prev.parent_section_id:
+            parent_id = prev.parent_section_id
+        elif prev.is_section and not prev.collapsed:
+            parent_id = prev.id
+        else:
+            parent_id = None
+
+    target = rows[slot][0] if slot < len(rows) else None
+    moving = [note for note, _ in rows[drag["index"]:drag["index"] + drag["count"]]]
+    if target is not None and any(n is target for n in moving):
+        return   # dropped on itself (or a plain click): nothing moves
+    before_id = target.id if target is not None else None
+    app.notes_manager.move_note(note_id, parent_id=parent_id, before_id=before_id)
+
+    if app.search_matches is None and rows[drag["index"]][0] is dragged:
+        # One operation record in storage, one splice in the view
+        indent = 0 if parent_id is None else 30
+        note_list.move_rows(drag["index"], drag["count"], slot, indent=indent)
+    else:
+        app.render_notes()
+
+def delete_note_safe(note, app):
+    """
+    Safely delete a note (section or child) using the main app instance.
+    """
+    # delete_note drops a section's children along with it
+    app.notes_manager.delete_note(note.id)
+    app.render_notes()
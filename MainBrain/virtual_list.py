@@ -0,0 +1,276 @@
+import math
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+import customtkinter as ctk
+from ui_components import create_note_popup, make_draggable, delete_note_safe
+from thumbnails import THUMB_SIZE
+from perf import timed
+
+ROW_HEIGHT = 44          # single-line row incl. buttons
+LINE_HEIGHT = 20         # extra height per wrapped text line
+ROW_GAP = 4              # space between rows
+SECTION_GAP = 7          # sections get a bit more air above them
+WRAP_LENGTH = 500        # label wraplength in px
+WRAP_CHARS = 55          # roughly how many characters fit in WRAP_LENGTH
+OVERSCAN = 4             # rows kept alive above/below the viewport
+SCROLL_STEP = 20         # px per wheel "unit"
+
+
+def estimate_row_height(note, indent):
+    lines = sum(max(1, math.ceil(len(line) / WRAP_CHARS)) for line in note.text.split("\n"))
+    height = max(ROW_HEIGHT, lines * LINE_HEIGHT + 12)
+    if indent and note.pdf_path:
+        # Room for the first-page preview, whether or not it has loaded yet
+        height = max(height, THUMB_SIZE[1] + 12)
+    return height + (ROW_GAP if indent else SECTION_GAP)
+
+
+# ---------- Pooled Row ----------
+class NoteRow:
+    """One recyclable row; rebinding to another note only reconfigures widgets."""
+
+    def __init__(self, note_list):
+        self.note_list = note_list
+        self.app = app = note_list.app
+        canvas = note_list.canvas
+        font = app.default_font
+
+        self.note = None
+        self.signature = None
+        self.drag_id = None
+
+        self.frame = ctk.CTkFrame(canvas, corner_radius=5)
+        self.window = canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+
+        self.collapse_btn = ctk.CTkButton(self.frame, text="▶", width=30, font=font,
+                                          command=lambda: app.toggle_section_dropdown(self.note))
+        self.text_label = ctk.CTkLabel(self.frame, text="", font=font, wraplength=WRAP_LENGTH, justify="left")
+        self.pdf_btn = ctk.CTkButton(self.frame, text="Open PDF", font=font,
+                                     command=self.open_pdf)
+        self.preview = ctk.CTkLabel(self.frame, text="")
+
+        self.btn_frame = ctk.CTkFrame(self.frame)
+        self.add_btn = ctk.CTkButton(
+            self.btn_frame, text="+ Note", font=font, width=70,
+            command=lambda: create_note_popup(app, app.notes_manager, app.default_font, parent_id=self.note.id)
+        )
+        self.edit_btn = ctk.CTkButton(
+            self.btn_frame, text="Edit", font=font, width=50,
+            command=lambda: create_note_popup(app, app.notes_manager, app.default_font, note_to_edit=self.note)
+        )
+        self.del_btn = ctk.CTkButton(self.btn_frame, text="Del", font=font, width=50,
+                                     command=lambda: delete_note_safe(self.note, app))
+
+    def bind(self, note, indent):
+        signature = (indent, note.text, note.collapsed, note.pdf_path)
+        if note is self.note and signature == self.signature:
+            return
+        self.note = note
+        self.signature = signature
+
+        for widget in self.frame.pack_slaves() + self.btn_frame.pack_slaves():
+            widget.pack_forget()
+
+        is_header = indent == 0
+        expanded = is_header and not note.collapsed
+
+        if is_header:
+            self.collapse_btn.configure(text="▼" if expanded else "▶")
+            self.collapse_btn.pack(side="left", padx=(5, 2))
+        self.text_label.configure(text=note.text)
+        self.text_label.pack(side="left", padx=5, pady=5)
+
+        if not is_header and note.pdf_path:
+            self.pdf_btn.pack(side="right", padx=5)
+            # Only rows on screen get here, so only their previews are loaded
+            image = self.app.thumbnails.get(note.pdf_path, self.show_preview)
+            if image is not None:
+                self.show_preview(note.pdf_path, image)
+
+        # Headers only show their buttons while expanded
+        if expanded:
+            buttons = [self.add_btn, self.edit_btn, self.del_btn]
+        elif not is_header:
+            buttons = [self.edit_btn, self.del_btn]
+        else:
+            buttons = []
+        if buttons:
+            self.btn_frame.pack(side="right", padx=5)
+            for btn in buttons:
+                btn.pack(side="left", padx=2)
+
+        if self.drag_id != note.id:
+            make_draggable(self.frame, note.id, self.app, is_section=is_header)
+            self.drag_id = note.id
+
+    def show(self, x, y, width, height):
+        canvas = self.note_list.canvas
+        canvas.coords(self.window, x, y)
+        canvas.itemconfigure(self.window, width=width, height=height, state="normal")
+
+    def hide(self):
+        self.note_list.canvas.itemconfigure(self.window, state="hidden")
+
+    def show_preview(self, path, image):
+        # Also called from the thumbnail cache once a preview is ready; the row may have moved on
+        if image is None or self.note is None or self.note.pdf_path != path:
+            return
+        self.preview.configure(image=image)
+        if not self.preview.winfo_manager():
+            self.preview.pack(side="left", padx=5, pady=5, before=self.text_label)
+
+    def open_pdf(self):
+        from pdf_utils import open_pdf   # not needed until a PDF is opened
+        open_pdf(self.note.pdf_path)
+
+
+# ---------- Virtualized List ----------
+class VirtualNoteList(ctk.CTkFrame):
+    """
+    Scrollable note list that only keeps widgets for the rows in view (plus OVERSCAN).
+    Rows are (note, indent) tuples; a fixed pool of NoteRow widgets is recycled on scroll.
+    """
+
+    def __init__(self, master, app, **kwargs):
+        super().__init__(master, **kwargs)
+        self.app = app
+        self.rows = []
+        self.offsets = [0]   # offsets[i] = y of row i, offsets[-1] = total height
+        self.heights = []
+        self.pool = []
+
+        self.canvas = ctk.CTkCanvas(self, highlightthickness=0, yscrollincrement=SCROLL_STEP,
+                                    bg=self._apply_appearance_mode(self.cget("fg_color")))
+        self.scrollbar = ctk.CTkScrollbar(self, orientation="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.bind_all("<MouseWheel>", self.on_mousewheel, add="+")
+        self.bind_all("<Button-4>", self.on_mousewheel, add="+")
+        self.bind_all("<Button-5>", self.on_mousewheel, add="+")
+
+    def _set_appearance_mode(self, mode_string):
+        super()._set_appearance_mode(mode_string)
+        self.canvas.configure(bg=self._apply_appearance_mode(self.cget("fg_color")))
+
+    # ---------- Data ----------
+    def set_rows(self, rows):
+        self.rows = rows
+        self.heights = [estimate_row_height(note, indent) for note, indent in rows]
+        offsets = [0] * (len(rows) + 1)
+        for i, height in enumerate(self.heights):
+            offsets[i + 1] = offsets[i] + height
+        self.offsets = offsets
+        self.canvas.configure(scrollregion=(0, 0, 1, offsets[-1]))
+        self.refresh()
+
+    def splice_rows(self, start, count, rows):
+        """
+        Replace rows[start:start + count] with `rows` (undo/redo use this to touch only
+        the rows a change affects). Heights are estimated for the new rows only.
+        """
+        self.rows[start:start + count] = rows
+        self.heights[start:start + count] = [estimate_row_height(note, indent) for note, indent in rows]
+        # Offsets after the splice shift; accumulate redoes the tail in C
+        self.offsets[start:] = accumulate(self.heights[start:], initial=self.offsets[start])
+        self.canvas.configure(scrollregion=(0, 0, 1, self.offsets[-1]))
+        self.refresh()
+
+    def index_at(self, y):
+        # Row under content y (clamped to the list)
+        return max(0, min(bisect_right(self.offsets, y) - 1, len(self.rows) - 1))
+
+    # ---------- Viewport ----------
+    def visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, self.index_at(top) - OVERSCAN)
+        last = min(len(self.rows), bisect_left(self.offsets, bottom) + OVERSCAN)
+        return first, last
+
+    @timed("refresh")
+    def refresh(self):
+        if not self.rows:
+            for row in self.pool:
+                row.hide()
+            return
+
+        first, last = self.visible_range()
+        needed = last - first
+
+        # Grow the pool to fit the viewport; it never grows with the note count
+        while len(self.pool) < needed:
+            self.pool.append(NoteRow(self))
+
+        width = self.canvas.winfo_width()
+        for slot, row in enumerate(self.pool):
+            i = first + slot
+            if i >= last:
+                row.hide()
+                continue
+            note, indent = self.rows[i]
+            gap = ROW_GAP if indent else SECTION_GAP
+            x = indent + 10
+            row.bind(note, indent)
+            row.show(x, self.offsets[i] + gap, max(1, width - x - 10), self.heights[i] - gap)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def on_mousewheel(self, event):
+        # Only scroll when the pointer is over this list
+        if not str(event.widget).startswith(str(self)):
+            return
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        elif abs(event.delta) >= 120:
+            step = -3 * int(event.delta / 120)
+        else:
+            step = -int(event.delta)
+        self.canvas.yview_scroll(step, "units")
+
+    # ---------- Drag Support ----------
+    def slot_at(self, y):
+        # Slot i means "before row i"; len(rows) means "after the last row"
+        if not self.rows or y < 0:
+            return 0
+        i = self.index_at(y)
+        if y > self.offsets[i] + self.heights[i] / 2:
+            i += 1
+        return i
+
+    def move_rows(self, start, count, slot, indent=None):
+        """
+        Move rows[start:start + count] to drop slot `slot` (counted before the move),
+        giving the first row a new indent if one is passed. Only the offsets between
+        the old and the new place are recomputed, unless the row height changes.
+        """
+        block = self.rows[start:start + count]
+        heights = self.heights[start:start + count]
+        if indent is not None and block[0][1] != indent:
+            block[0] = (block[0][0], indent)
+            heights[0] = estimate_row_height(block[0][0], indent)
+        height_changed = sum(heights) != sum(self.heights[start:start + count])
+
+        del self.rows[start:start + count]
+        del self.heights[start:start + count]
+        if slot > start:
+            slot = max(start, slot - count)
+        self.rows[slot:slot] = block
+        self.heights[slot:slot] = heights
+
+        first = min(start, slot)
+        last = len(self.rows) if height_changed else max(start, slot) + count
+        offsets = self.offsets
+        for i in range(first, last):
+            offsets[i + 1] = offsets[i] + self.heights[i]
+        if height_changed:
+            self.canvas.configure(scrollregion=(0, 0, 1, offsets[-1]))
+        self.refresh()
+        return slot
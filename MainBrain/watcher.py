@@ -0,0 +1,39 @@
+import threading
+import time
+
+from config import WATCH_INTERVAL
+from storage import file_version
+
+
+class ChangeWatcher:
+    """
+    Notices when another process writes the notes.
+    A background thread stats the files every `interval` seconds (inode, mtime, size);
+    that works the same on every platform and on network shares, where change
+    notifications don't arrive. It only raises `changed`: the UI thread picks that
+    up and does the merge itself (NotesManager.external_changes / merge).
+    Our own writes raise it too; the merge then finds nothing new, which costs a stat or two.
+    """
+
+    def __init__(self, paths, interval=WATCH_INTERVAL):
+        self.paths = list(paths)
+        self.interval = interval
+        self.versions = {}   # empty, so the first look always reports a change
+        self.changed = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="change-watcher", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            versions = {path: file_version(path) for path in self.paths}
+            # Timestamps only tick every few ms: a write right after the last look can leave
+            # the same stat behind, so anything touched that recently is looked at again
+            recent = time.time() - self.interval * 2
+            if versions != self.versions or any(v and v[1] / 1e9 > recent for v in versions.values()):
+                self.versions = versions
+                self.changed.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from config import WRITE_DELAY
+from perf import timed
+
+RETRY_DELAY = 2.0   # seconds before a failed background write is tried again
+
+
+class WriteBehind:
+    """
+    Wraps a storage backend so mutations never wait on the disk.
+    append() only queues the operation record; a background thread writes
+    everything queued once no new change arrived for `delay` seconds, as one
+    batch (one JSON save, one journal fsync or one SQLite transaction).
+    flush() writes whatever is pending right away, e.g. on window close.
+    A write that fails (disk full, no permission) puts its records back in front of
+    `pending` and leaves the exception in `error` until a later write succeeds;
+    the thread tries again after retry_delay.
+    Anything not overridden here (load, load_texts, search, ...) goes to the wrapped backend.
+    """
+
+    def __init__(self, inner, delay=WRITE_DELAY, retry_delay=RETRY_DELAY):
+        self.inner = inner
+        self.delay = delay
+        self.retry_delay = retry_delay
+        self.pending = []
+        self.writing = []   # taken off `pending` by flush() and not written yet
+        self.manager = None
+        self.last_change = 0.0
+        self.retry_at = 0.0
+        self.error = None
+        self.batch_depth = 0
+        self.write_count = 0
+        self.closed = False
+
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    @property
+    def pending_writes(self):
+        with self.cond:
+            return len(self.pending)
+
+    def append(self, op, manager):
+        with self.cond:
+            self.pending.append(op)
+            self.manager = manager
+            self.last_change = time.monotonic()
+            self.cond.notify()
+
+    @contextmanager
+    def batch(self):
+        # Hold the writer back so a batch lands in a single write
+        with self.cond:
+            self.batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.batch_depth -= 1
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed:
+                    if not self.pending or self.batch_depth:
+                        self.cond.wait()
+                        continue
+                    remaining = max(self.last_change + self.delay, self.retry_at) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if self.closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Kept in `pending` by flush(); the thread must live on to write them later
+                with self.cond:
+                    self.retry_at = time.monotonic() + self.retry_delay
+
+    @timed("write")
+    def flush(self):
+        with self.write_lock:
+            with self.cond:
+                ops, self.pending = self.pending, []
+                self.writing = ops
+                manager = self.manager
+            if not ops:
+                return
+            try:
+                with self.inner.batch():
+                    for op in ops:
+                        self.inner.append(op, manager)
+            except Exception as exc:
+                with self.cond:
+                    # Still unwritten, and older than anything queued meanwhile
+                    self.pending[:0] = ops
+                    self.error = exc
+                raise
+            finally:
+                with self.cond:
+                    self.writing = []
+            self.write_count += 1
+            self.error = None
+
+    def unwritten(self):
+        # Applied in memory but not on disk, oldest first: held back by the backend, then queued here
+        held = self.inner.unwritten()
+        with self.cond:
+            return held + self.writing + self.pending
+
+    def save(self, data):
+        self.flush()
+        with self.write_lock:
+            self.inner.save(data)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+        self.inner.close()